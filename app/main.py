@@ -1,8 +1,6 @@
 # app/main.py
 import streamlit as st
 import pandas as pd
-import folium
-from streamlit_folium import st_folium
 import json
 import numpy as np
 
@@ -11,135 +9,22 @@ from pathlib import Path
 
 sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
 from config import (CITIES_GEOJSON, LAD_GEOJSON, REGION_GEOJSON, COUNTY_GEOJSON, HOMECARE_AGENCIES_BY_LAD,
-                    LAD_POP_CSV, LAD_POP_CSV_AGG, LAD_TO_REGION_MAPPING, LAD_TO_COUNTY_MAPPING)
-from analysis import load_lad_population
+                    LAD_POP_CSV, LAD_POP_CSV_AGG, LAD_TO_REGION_MAPPING, LAD_TO_COUNTY_MAPPING,
+                    MAP_CENTER, ZOOM_START, VECTOR_TILE_ZOOMS)
+from data_cache import invalidate
+from instrumentation import start_run, finish_run, stage, describe_output, stages_frame
+from frame_schema import memory_report
+from dashboard_data import AGE_GROUPS, POPULATION_COLS, RATING_COLS, METRIC_DICT, LEVELS
+from dashboard_state import load_startup, prepared_areas, prepared_payload, prepared_band_index
+from age_bands import BAND_COLS, band_frame, band_label, parse_band
+from metrics_cube import DASHBOARD_LEVELS, cube_level
+from snapshot_store import list_snapshots, metric_series, period_change
+from vector_tiles import tiles_available
+from area_index import area_bounds
+from drilldown import DRILL_ORDER, CHILD_LEVELS, drilldown_available, load_children, child_keys
+from tile_server import start_tile_server, tile_url_template
 
 
-# =============================
-# 2. Load GeoJSON & Prepare Data
-# =============================
-def aggregate_lad_to_level(lad_df, level_map, metric_col):
-    """
-    Aggregate LAD-level data to counties or regions based on a mapping dict.
-    level_map: dict mapping LAD25NM -> County/Region
-    """
-    df = lad_df.copy()
-    df[level_map['name']] = df['LAD23NM'].map(level_map['map'])
-    agg_df = df.groupby(level_map['name'])[metric_col].mean().reset_index()
-    agg_df = df.groupby(level_map['name'])[metric_col].sum().reset_index()
-
-    agg_df.rename(columns={level_map['name']: level_map['name'], metric_col: metric_col}, inplace=True)
-    return agg_df
-
-# Function to aggregate LAD metrics to region
-def aggregate_lad_to_region(lad_df, metric_col):
-    """
-    lad_df: DataFrame with LAD-level data
-    metric_col: the column to aggregate (e.g., 'Total', 'over80_ratio')
-    """
-    df = lad_df.copy()
-    df["Region"] = df["LAD23NM"].map(lad_region_dict)
-    # agg_df = df.groupby("Region")[metric_col].mean().reset_index()
-    agg_df = df.groupby("Region")[metric_col].sum().reset_index()
-    return agg_df
-
-# Function to aggregate LAD metrics to region
-def aggregate_lad_to_county(lad_df, metric_col):
-    """
-    lad_df: DataFrame with LAD-level data
-    metric_col: the column to aggregate (e.g., 'Total', 'over80_ratio')
-    """
-    df = lad_df.copy()
-    # --- Normalize LAD names to match the mapping keys ---
-    df["LAD23NM"] = df["LAD23NM"].replace({
-        "Herefordshire": "Herefordshire, County of",
-        "Bristol": "Bristol, City of",
-        "Kingston upon Hull": "Kingston upon Hull, City of"
-    })
-
-    df["County"] = df["LAD23NM"].map(lad_county_dict)
-
-    # --- Handle special cases ---
-    # Example: aggregate all Hertfordshire LADs into one value
-
-    # """
-    # herts_value = df.loc[df['LAD23NM'].str.contains("Hertfordshire"), metric_col].mean()  # or sum()
-    # # Remove individual Hertfordshire LADs
-    # df = df[~df['LAD23NM'].str.contains("Hertfordshire")]
-    # # Add aggregated row
-    # df = pd.concat([df, pd.DataFrame({"County": ["Hertfordshire"], metric_col: [herts_value]})], ignore_index=True)
-    # """
-
-    # agg_df = df.groupby("County")[metric_col].mean().reset_index()
-    agg_df = df.groupby("County")[metric_col].sum().reset_index()
-
-    return agg_df
-
-
-def aggregate_lad_metrics(lad_df, level_map, level_name, population_cols, rating_cols, agency_col="num_agencies"):
-    """
-    Aggregate LAD-level data to counties or regions.
-
-    Parameters
-    ----------
-    lad_df : pd.DataFrame
-        LAD-level DataFrame containing populations, agencies, and CQC ratings
-    level_map : dict
-        Mapping from LAD name to higher level name (e.g., Region/County)
-        Format: {"LAD23NM": "RegionName"}
-    level_name : str
-        Name of the aggregation level (e.g., "Region" or "County")
-    population_cols : list
-        List of population columns to sum (e.g., ['Population_70plus', 'Population_75plus'])
-    rating_cols : list
-        List of rating count columns (Good, Outstanding, Requires Improvement, Inadequate)
-    agency_col : str
-        Column name for total agencies (including rated and unrated)
-
-    Returns
-    -------
-    agg_df : pd.DataFrame
-        Aggregated DataFrame with:
-            - summed populations
-            - summed agency counts
-            - summed CQC rating counts
-            - recalculated agencies per 10k for age groups
-            - CQC rating percentages
-    """
-    df = lad_df.copy()
-    # print(df.columns)
-    if level_name == "County":
-        df["LAD23NM"] = df["LAD23NM"].replace({
-        "Herefordshire": "Herefordshire, County of",
-        "Bristol": "Bristol, City of",
-        "Kingston upon Hull": "Kingston upon Hull, City of"
-        })
-
-    df[level_name] = df["LAD23NM"].map(level_map)
-
-    # Columns to sum
-    sum_cols = population_cols + [agency_col] + rating_cols + ["Not Rated"] + ['Total']
-
-    # Aggregate by sum
-    agg_df = df.groupby(level_name)[sum_cols].sum().reset_index()
-
-    # Compute agencies per 10k for each age group
-    for pop_col in population_cols:
-        age_suffix = pop_col.split("_")[-1]  # e.g., '70plus'
-        agg_df[f"agencies_per_10k_{age_suffix}"] = (agg_df[agency_col] / agg_df[pop_col]) * 10000
-        agg_df[f"agencies_per_10k_{age_suffix}"] = agg_df[f"agencies_per_10k_{age_suffix}"].fillna(0)
-
-    # Compute CQC rating percentages based on rated agencies only
-    agg_df["Rated_Total"] = agg_df[rating_cols].sum(axis=1)
-    for col in rating_cols:
-        pct_col = f"{col}_pct"
-        agg_df[pct_col] = (agg_df[col] / agg_df["Rated_Total"] * 100).fillna(0)
-
-    # Compute Unrated percentage (of total agencies)
-    agg_df["Unrated_pct"] = (agg_df["Not Rated"] / agg_df[agency_col] * 100).fillna(0)
-
-    return agg_df
-
 # =============================
 # 1. Sample Data
 # =============================
@@ -171,119 +56,53 @@ def aggregate_lad_metrics(lad_df, level_map, level_name, population_cols, rating
 # Streamlit page config
 st.set_page_config(page_title="England & Wales Market Analysis", layout="wide")
 
-# Load aggregated data at LAD level
-lad_df = load_lad_population(LAD_POP_CSV_AGG)
-# columns ['LAD23NM', 'Total', 'Aged 4 years and under', 'Aged 5 to 9 years',
-#        'Aged 10 to 14 years', 'Aged 15 to 19 years', 'Aged 20 to 24 years',
-#        'Aged 25 to 29 years', 'Aged 30 to 34 years', 'Aged 35 to 39 years',
-#        'Aged 40 to 44 years', 'Aged 45 to 49 years', 'Aged 50 to 54 years',
-#        'Aged 55 to 59 years', 'Aged 60 to 64 years', 'Aged 65 to 69 years',
-#        'Aged 70 to 74 years', 'Aged 75 to 79 years', 'Aged 80 to 84 years',
-#        'Aged 85 years and over', 'over80_ratio'
+# Per-stage timings of this rerun (src/instrumentation.py), logged to STAGE_LOG; the panel also
+# measures serialised payload sizes, which costs an extra serialisation
+debug = st.sidebar.checkbox("Debug: stage timings")
+start_run("main", detail=debug)
+
+# Prepared data is cached per input file version; this forces a full reload
+if st.sidebar.button("Reload data"):
+    invalidate()
+
+# Load aggregated data at LAD level, merged with CQC home care agency counts.
+# Restored from the prepared state (src/dashboard_state.py) when current, else built from the
+# inputs, read concurrently; cached across reruns/sessions either way: copy before mutating.
+startup = load_startup(zoom=st.session_state.get("map_zoom", ZOOM_START))
+lad_df = startup["lad_metrics"]
+if startup["warning"]:  # prepared state file present but unreadable: running on the live loaders
+    st.sidebar.warning(startup["warning"])
+# columns ['LAD23NM', 'Total', 'Aged 4 years and under', ..., 'Aged 85 years and over', 'over80_ratio',
+#          'ladnm', <CQC rating counts / pct>, 'Total_Agencies', 'num_agencies',
+#          'Population_70plus', 'agencies_per_10k_70', ...]  (compact dtypes, see src/frame_schema.py)
 # print(lad_df.columns)
 
-# Load CQC home care agency counts by LAD
-cqc_counts = pd.read_csv(HOMECARE_AGENCIES_BY_LAD)  # columns: ladnm, Agency_Count
-# print(cqc_counts.columns)
-
-# Merge additional columns to the population stats
-lad_df = lad_df.merge(cqc_counts, left_on="LAD23NM", right_on="ladnm", how="left")
-
-# Fill LADs with no agencies with 0
-lad_df["num_agencies"] = lad_df["Total_Agencies"].fillna(0)
-
-# Optional: compute agencies per 10,000 people
-# Define age group mappings with correct column names
-age_groups = {
-    "70plus": ["Aged 70 to 74 years", "Aged 75 to 79 years", "Aged 80 to 84 years", "Aged 85 years and over"],
-    "75plus": ["Aged 75 to 79 years", "Aged 80 to 84 years", "Aged 85 years and over"],
-    "80plus": ["Aged 80 to 84 years", "Aged 85 years and over"],
-    "85plus": ["Aged 85 years and over"]
-}
-population_cols = ["Population_70plus", "Population_75plus", "Population_80plus", "Population_85plus"]
-rating_cols = ["Good", "Outstanding", "Requires Improvement", "Inadequate"]
+age_groups = AGE_GROUPS
+population_cols = POPULATION_COLS
+rating_cols = RATING_COLS
 
-# Calculate Population Totals & LAD level stats
-
-# Loop through each age group
-for group_name, columns in age_groups.items():
-    # Compute population for the age group
-    lad_df[f"Population_{group_name}"] = lad_df[columns].sum(axis=1)
-
-    # Compute agencies per 10,000 people in that age group
-    lad_df[f"agencies_per_10k_{group_name}"] = (lad_df["num_agencies"] / lad_df[f"Population_{group_name}"]) * 10000
-
-# Fill NaNs in case any LAD has zero population
-lad_df[[f"agencies_per_10k_{g}" for g in age_groups.keys()]] = \
-    lad_df[[f"agencies_per_10k_{g}" for g in age_groups.keys()]].fillna(0)
-
-
-# Compute agencies per 10k for each age group
-lad_df["agencies_per_10k_70"] = (lad_df["num_agencies"] / lad_df["Population_70plus"]) * 10000
-lad_df["agencies_per_10k_75"] = (lad_df["num_agencies"] / lad_df["Population_75plus"]) * 10000
-lad_df["agencies_per_10k_80"] = (lad_df["num_agencies"] / lad_df["Population_80plus"]) * 10000
-lad_df["agencies_per_10k_85"] = (lad_df["num_agencies"] / lad_df["Population_85plus"]) * 10000
-
-# Fill NaNs in case any LAD has zero population
-lad_df[["agencies_per_10k_70","agencies_per_10k_75","agencies_per_10k_80","agencies_per_10k_85"]] = \
-    lad_df[["agencies_per_10k_70","agencies_per_10k_75","agencies_per_10k_80","agencies_per_10k_85"]].fillna(0)
-
-
-# Load LAD-to-region mapping
-lad_region_map = pd.read_csv(LAD_TO_REGION_MAPPING)  # your CSV path
-lad_region_dict = dict(zip(lad_region_map["LAD23NM"], lad_region_map["RGN23NM"]))
-
-lad_county_map = pd.read_csv(LAD_TO_COUNTY_MAPPING)  # your CSV path
-lad_county_dict = dict(zip(lad_county_map["LTLA23NM"], lad_county_map["UTLA23NM"]))
-
-region_df = aggregate_lad_metrics(
-    lad_df,
-    level_map=lad_region_dict,
-    level_name="Region",
-    population_cols=population_cols,
-    rating_cols=rating_cols,
-    agency_col="num_agencies"
-)
-
-county_df = aggregate_lad_metrics(
-    lad_df,
-    level_map=lad_county_dict,
-    level_name="County",
-    population_cols=population_cols,
-    rating_cols=rating_cols,
-    agency_col="num_agencies"
-)
+# Region / County rollups come precomputed from the metrics cube (src/metrics_cube.py)
+metrics_cube = startup["metrics_cube"]
+region_df = cube_level(metrics_cube, "Region")
+county_df = cube_level(metrics_cube, "County")
 
 
 # =============================
 # 1. Select metric to map
 # =============================
-# metrics dict: old column -> new name
-metric_dict = {
-    "Total": "Total Population",
-    "Population_70plus": "Population 70+",
-    "Population_75plus": "Population 75+",
-    "Population_80plus": "Population 80+",
-    "Population_85plus": "Population 85+",
-    "num_agencies": "Number of Homecare Agencies",
-    "agencies_per_10k_70": "Agencies per 10k (70+)",
-    "agencies_per_10k_75": "Agencies per 10k (75+)",
-    "agencies_per_10k_80": "Agencies per 10k (80+)",
-    "agencies_per_10k_85": "Agencies per 10k (85+)"
-}
+# Any age band of the census columns, computed per area from the prepared running totals
+# (src/age_bands.py) and offered next to the fixed metrics
+age_band = st.sidebar.text_input("Age band (e.g. 65+, 75-84, under 20)", value="65+")
+try:
+    band_name = band_label(*parse_band(age_band))
+except ValueError as e:
+    st.sidebar.error(str(e))
+    band_name = None
 
-metric_dict.update({
-    "Good": "Agencies Rated Good",
-    "Outstanding": "Agencies Rated Outstanding",
-    "Requires Improvement": "Agencies Requires Improvement",
-    "Inadequate": "Agencies Rated Inadequate",
-    "Not Rated": "Agencies Not Rated",
-    "Good_pct": "% Agencies Good",
-    "Outstanding_pct": "% Agencies Outstanding",
-    "Requires Improvement_pct": "% Agencies Requires Improvement",
-    "Inadequate_pct": "% Agencies Inadequate",
-    "Unrated_pct": "% Agencies Not Rated"
-})
+# metrics dict: old column -> new name
+metric_dict = dict(METRIC_DICT)
+if band_name:
+    metric_dict.update(dict(zip(BAND_COLS, [f"Population {band_name}", f"Agencies per 10k ({band_name})"])))
 # Clean metrics list for selection
 clean_metrics = list(metric_dict.keys())
 # Streamlit selectbox for a single metric
@@ -298,10 +117,22 @@ lad_metrics = [c for c in lad_df.columns if c != "LAD23NM"]  # exclude LAD name
 # metric_col = st.selectbox("Choose metric to display on map:", lad_metrics)
 legend_name = metric_col.replace("_", " ").title()
 
-level = st.selectbox(
-    "Choose map level:",
-    ("Regions", "Counties", "Local Authority Districts") #"Cities" can be added separately
-)
+# Drill-down (once src/drilldown.py has built the store): click a Region to map its Counties,
+# then a County to map its LADs. Only the clicked parent's child boundaries are read and drawn.
+drilldown = drilldown_available() and st.sidebar.checkbox("Drill down (click an area)", value=False)
+if drilldown:
+    # [(parent level, parent name), ...] from the top
+    drill_path = st.session_state.get("drill_path", [])
+    if drill_path and st.sidebar.button("⬆ Up one level"):
+        drill_path = st.session_state["drill_path"] = drill_path[:-1]
+    level = DRILL_ORDER[len(drill_path)]
+    st.sidebar.caption("Showing: " + " › ".join(["All regions"] + [name for _, name in drill_path]))
+else:
+    drill_path = []
+    level = st.selectbox(
+        "Choose map level:",
+        ("Regions", "Counties", "Local Authority Districts") #"Cities" can be added separately
+    )
 
 # =============================
 # 1. Header & Dropdown
@@ -337,78 +168,125 @@ elif level == "Counties":
 
 else:  # LADs
     geojson_path = LAD_GEOJSON
-    df = lad_df.copy()  # use original LAD-level df
-    df["LAD23NM"] = df["LAD23NM"].replace({
-        "Herefordshire": "Herefordshire, County of",
-        "Bristol": "Bristol, City of",
-        "Kingston upon Hull": "Kingston upon Hull, City of"
-    })
-    # Make sure the column matches GeoJSON
-    if "LAD23NM" in df.columns:
-        df.rename(columns={"LAD23NM": "LAD25NM"}, inplace=True)
+    # LAD rows of the cube (names already match the ONS lookups); key column matches the GeoJSON
+    df = cube_level(metrics_cube, "LAD", "LAD25NM")
     key_col = "LAD25NM"
     geojson_key = "feature.properties.LAD25NM"
     geojson_prop = "LAD25NM"
 
-with open(geojson_path, "r") as f:
-    geojson_data = json.load(f)
-
-if level == "Regions":
-    for feature in geojson_data["features"]:
-        if feature["properties"]["eer17nm"] == "Eastern":
-            feature["properties"]["eer17nm"] = "East of England"
-# elif level == "Counties":
-#     # Normalize GeoJSON names
-#     for feature in geojson_data["features"]:
-#         name = feature["properties"]["CTYUA23NM"]
-#         if name == "Bristol, City of":
-#             feature["properties"]["CTYUA23NM"] = "Bristol"
-#         elif name == "Kingston upon Hull, City of":
-#             feature["properties"]["CTYUA23NM"] = "Kingston upon Hull"
-#         elif name == "Herefordshire, County of":
-#             feature["properties"]["CTYUA23NM"] = "Herefordshire"
+if metric_col in BAND_COLS:
+    df = df.merge(band_frame(prepared_band_index(), DASHBOARD_LEVELS[level], age_band, key_col),
+                  on=key_col, how="left")
+
+# Current map view (fed back from st_folium) picks the simplified boundaries for the zoom level.
+# Parsed and reduced to the join key with quantised coordinates (src/geojson_payload.py) once per
+# file version, shared across reruns (region names already normalised).
+map_center = st.session_state.get("map_center", MAP_CENTER)
+map_zoom = st.session_state.get("map_zoom", ZOOM_START)
+areas = prepared_areas(level)
+# Vector-tile mode (once src/vector_tiles.py has built the tiles): boundaries are fetched per
+# viewport from the local tile server instead of being embedded in the page as GeoJSON
+use_tiles = not drilldown and tiles_available(level) and st.sidebar.checkbox("Vector tiles (local tile server)",
+                                                                             value=False)
+if use_tiles:
+    start_tile_server()
+elif drill_path:
+    # Children of the selected parent only: one partition of the drill-down store
+    geojson_data = load_children(*drill_path[-1])
+    children = set(child_keys(geojson_data, level))
+    df = df[df[key_col].isin(children)]
+    areas = {name: entry for name, entry in areas.items() if name in children}
+else:
+    geojson_data = prepared_payload(level, zoom=map_zoom)
+zoom_area = st.sidebar.selectbox("Zoom to area", [None] + sorted(areas), format_func=lambda a: a or "All")
 
-    # print([f["properties"]["CTYUA23NM"] for f in geojson_data["features"]])
 # =================================
 # 3. Create Folium Map & Data Table
 # =================================
+# folium and streamlit_folium take about half a second to import: imported here, once the
+# header and selectors are on screen, so a cold start paints those first
+import folium
+from streamlit_folium import st_folium
+from choropleth import add_choropleth, add_vector_choropleth
 col1, col2 = st.columns([2, 1])  # map gets more space than table
 with col1:
-    m = folium.Map(location=[54.5, -3], zoom_start=5)
-    # Add Choropleth directly
-    folium.Choropleth(
-        geo_data=geojson_data,
-        name="choropleth",
-        data=df,
-        columns=[key_col, metric_col],
-        key_on=geojson_key,
-        fill_color="Reds",
-        fill_opacity=0.7,
-        line_opacity=0.2,
-        legend_name=metric_col
-    ).add_to(m)
-    # Add hover tooltip
-    for feature in geojson_data["features"]:
-        area_name = feature["properties"].get(geojson_prop) if geojson_prop in feature["properties"] else None
-        # area_name = feature["properties"][key_col] if key_col in feature["properties"] else None
-        # print(area_name)
-        if area_name:
-            value = df.loc[df[key_col] == area_name, metric_col]
-            val = float(value.values[0]) if not value.empty else 0
-            folium.GeoJson(
-                feature,
-                style_function=lambda x: {
-                    'fillColor': 'transparent',
-                    'color': 'black',  # or transparent
-                    'weight': 0.5,  # thin border
-                    'fillOpacity': 0
-                },
-                tooltip=f"{area_name}: {val:.2f}"
-            ).add_to(m)
-
-    # Display map
-    st_folium(m, width=900, height=750)
+    m = folium.Map(location=map_center, zoom_start=map_zoom)
+    if use_tiles:
+        # Metric joined client-side onto the tile features by area name
+        add_vector_choropleth(m, tile_url_template(level), LEVELS[level]["slug"], df, key_col=key_col,
+                              metric_col=metric_col, legend_name=metric_col, max_native_zoom=VECTOR_TILE_ZOOMS[1])
+    else:
+        # Choropleth + hover tooltip as a single GeoJson layer (metric joined onto the features)
+        add_choropleth(m, geojson_data, df, key_col=key_col, geojson_prop=geojson_prop,
+                       metric_col=metric_col, legend_name=metric_col)
+    if zoom_area:
+        # Precomputed bbox and label point (src/area_index.py): no pass over the geometry
+        m.fit_bounds(area_bounds(areas[zoom_area]))
+        folium.Marker([areas[zoom_area]["label_lat"], areas[zoom_area]["label_lon"]], tooltip=zoom_area).add_to(m)
+    elif drill_path and drill_path[-1][1] in prepared_areas(drill_path[-1][0]):
+        m.fit_bounds(area_bounds(prepared_areas(drill_path[-1][0])[drill_path[-1][1]]))
+
+    # Display map (page size measured first: st_folium restructures the map while rendering it).
+    # In drill-down mode every view is its own component (fresh click state) and reports the clicked area.
+    with stage("st_folium") as record:
+        record.update(describe_output(m, record["detail"]))
+        map_state = st_folium(m, width=900, height=750,
+                              returned_objects=["zoom", "center"] + (["last_active_drawing"] if drilldown else []),
+                              key="drill:" + "/".join(name for _, name in drill_path) if drilldown else None)
+    if map_state and map_state.get("zoom") is not None:
+        st.session_state["map_zoom"] = map_state["zoom"]
+    if map_state and map_state.get("center"):
+        st.session_state["map_center"] = [map_state["center"]["lat"], map_state["center"]["lng"]]
+    clicked = (map_state or {}).get("last_active_drawing") if drilldown else None
+    if clicked and level in CHILD_LEVELS and clicked.get("properties", {}).get(geojson_prop):
+        st.session_state["drill_path"] = drill_path + [(level, clicked["properties"][geojson_prop])]
+        st.rerun()
 
 with col2:
     st.subheader("📊 Data Table")
-    st.dataframe(df)
\ No newline at end of file
+    st.dataframe(df)
+
+# =================================
+# 4. Change between CQC snapshots
+# =================================
+# Only once the snapshot store (src/snapshot_store.py) holds at least two dated exports, and
+# for the stored metrics (age bands are not kept per snapshot)
+snapshots = list_snapshots()
+if len(snapshots) >= 2 and metric_col in METRIC_DICT:
+    st.subheader("📈 Change between CQC snapshots")
+    from_col, to_col = st.columns(2)
+    period_start = from_col.selectbox("From snapshot", snapshots, index=len(snapshots) - 2)
+    period_end = to_col.selectbox("To snapshot", snapshots, index=len(snapshots) - 1)
+    change_df = period_change(metric_col, DASHBOARD_LEVELS[level], period_start, period_end, key_col=key_col)
+    if drill_path:
+        change_df = change_df[change_df[key_col].isin(df[key_col])]
+
+    col3, col4 = st.columns([2, 1])
+    with col3:
+        change_map = folium.Map(location=MAP_CENTER, zoom_start=ZOOM_START)
+        if use_tiles:
+            add_vector_choropleth(change_map, tile_url_template(level), LEVELS[level]["slug"], change_df,
+                                  key_col=key_col, metric_col="change", legend_name=f"Change in {legend_name}",
+                                  fill_color="RdBu", max_native_zoom=VECTOR_TILE_ZOOMS[1])
+        else:
+            add_choropleth(change_map, geojson_data, change_df, key_col=key_col, geojson_prop=geojson_prop,
+                           metric_col="change", legend_name=f"Change in {legend_name}", fill_color="RdBu")
+        with stage("st_folium") as record:
+            record.update(describe_output(change_map, record["detail"]))
+            st_folium(change_map, width=900, height=600, key="change_map", returned_objects=[])
+    with col4:
+        # Trend over every stored snapshot for the areas that moved most
+        movers = change_df.reindex(change_df["change"].abs().sort_values(ascending=False).index)[key_col].head(5)
+        st.markdown(f"**{legend_name} over time (largest changes)**")
+        st.line_chart(metric_series(metric_col, DASHBOARD_LEVELS[level], areas=movers))
+        st.dataframe(change_df.sort_values("change", ascending=False))
+
+# =================================
+# 5. Stage timings
+# =================================
+run = finish_run(level=level, metric=metric_col, vector_tiles=use_tiles)
+if debug:
+    with st.expander(f"⏱ Stage timings ({run['total_s']:.2f} s)", expanded=True):
+        st.dataframe(stages_frame(run))
+        st.markdown("**Memory per frame**")
+        st.dataframe(memory_report({"lad_df": lad_df, "metrics_cube": metrics_cube, "map data": df}))
@@ -1,8 +1,6 @@
 # app/mainMulti.py
 import streamlit as st
 import pandas as pd
-import folium
-from streamlit_folium import st_folium
 import json
 import numpy as np
 from pathlib import Path
@@ -12,58 +10,71 @@ sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
 from config import (
     CITIES_GEOJSON, LAD_GEOJSON, REGION_GEOJSON, COUNTY_GEOJSON,
     HOMECARE_AGENCIES_BY_LAD, LAD_POP_CSV_AGG,
-    LAD_TO_REGION_MAPPING, LAD_TO_COUNTY_MAPPING
+    LAD_TO_REGION_MAPPING, LAD_TO_COUNTY_MAPPING, MAP_CENTER, ZOOM_START, VECTOR_TILE_ZOOMS
 )
-from analysis import load_lad_population
+from data_cache import invalidate
+from instrumentation import start_run, finish_run, stage, describe_output, stages_frame
+from frame_schema import memory_report
+from dashboard_data import LEVELS
+from dashboard_state import load_startup, prepared_hierarchy, prepared_areas, prepared_payload
+from analysis import aggregate_lad_columns, add_over80_ratio
+from metrics_cube import DASHBOARD_LEVELS, cube_level
+from vector_tiles import tiles_available
+from area_index import area_bounds
+from tile_server import start_tile_server, tile_url_template
 
 # =============================
 # 0. Load Data
 # =============================
 st.set_page_config(page_title="England & Wales Market Analysis", layout="wide")
 
-lad_df = load_lad_population(LAD_POP_CSV_AGG)
-cqc_counts = pd.read_csv(HOMECARE_AGENCIES_BY_LAD)
-lad_df = lad_df.merge(cqc_counts, left_on="LAD23NM", right_on="ladnm", how="left")
-lad_df["num_agencies"] = lad_df["Agency_Count"].fillna(0)
-
-# Age groups
-age_groups = {
-    "70plus": ["Aged 70 to 74 years", "Aged 75 to 79 years", "Aged 80 to 84 years", "Aged 85 years and over"],
-    "75plus": ["Aged 75 to 79 years", "Aged 80 to 84 years", "Aged 85 years and over"],
-    "80plus": ["Aged 80 to 84 years", "Aged 85 years and over"],
-    "85plus": ["Aged 85 years and over"]
-}
-for group, cols in age_groups.items():
-    lad_df[f"Population_{group}"] = lad_df[cols].sum(axis=1)
-    lad_df[f"agencies_per_10k_{group}"] = (lad_df["num_agencies"] / lad_df[f"Population_{group}"] * 10000).fillna(0)
-
-# LAD-to-region/county mapping
-lad_region_dict = dict(zip(pd.read_csv(LAD_TO_REGION_MAPPING)["LAD23NM"],
-                           pd.read_csv(LAD_TO_REGION_MAPPING)["RGN23NM"]))
-lad_county_dict = dict(zip(pd.read_csv(LAD_TO_COUNTY_MAPPING)["LTLA23NM"],
-                           pd.read_csv(LAD_TO_COUNTY_MAPPING)["UTLA23NM"]))
+# Per-stage timings of this rerun (src/instrumentation.py), logged to STAGE_LOG
+debug = st.sidebar.checkbox("Debug: stage timings")
+start_run("mainMulti", detail=debug)
+
+# Prepared data is cached per input file version; this forces a full reload
+if st.sidebar.button("Reload data"):
+    invalidate()
+
+# Restored from the prepared state (src/dashboard_state.py) when current, else built from the
+# inputs, read concurrently; cached across reruns/sessions either way: copy before mutating.
+startup = load_startup()
+lad_df = startup["lad_metrics"]
+if startup["warning"]:  # prepared state file present but unreadable: running on the live loaders
+    st.sidebar.warning(startup["warning"])
+# Region / County metrics precomputed from the summed counts (src/metrics_cube.py)
+metrics_cube = startup["metrics_cube"]
 
 # =============================
 # 1. Aggregation Functions
 # =============================
-def aggregate_lad(lad_df, metric_col, level="LAD"):
-    if level == "Regions":
-        df = lad_df.copy()
-        df["Region"] = df["LAD23NM"].map(lad_region_dict)
-        return df.groupby("Region")[metric_col].sum().reset_index()
-    elif level == "Counties":
-        df = lad_df.copy()
-        df["LAD23NM"] = df["LAD23NM"].replace({
-            "Herefordshire": "Herefordshire, County of",
-            "Bristol": "Bristol, City of",
-            "Kingston upon Hull": "Kingston upon Hull, City of"
-        })
-        df["County"] = df["LAD23NM"].map(lad_county_dict)
-        return df.groupby("County")[metric_col].sum().reset_index()
-    else:  # LADs
-        df = lad_df.copy()
-        df.rename(columns={"LAD23NM": "LAD25NM"}, inplace=True)
-        return df[["LAD25NM", metric_col]]
+# Inputs of over80_ratio, the one LAD ratio the metrics cube does not hold
+OVER80_INPUTS = ["Aged 80 to 84 years", "Aged 85 years and over", "Total"]
+
+
+def aggregate_lad(lad_df, metric_cols, level="LAD"):
+    """
+    All selected metrics at the chosen level as one frame (shared by maps, tables and charts).
+    Ratios are never summed: the cube's are recomputed from the summed counts, over80_ratio
+    from the summed population columns; only count columns are summed here.
+    """
+    metric_cols = list(dict.fromkeys(metric_cols))
+    if level not in ("Regions", "Counties"):  # LADs
+        return lad_df[["LAD23NM"] + metric_cols].rename(columns={"LAD23NM": "LAD25NM"})
+
+    level_name = DASHBOARD_LEVELS[level]
+    level_df = cube_level(metrics_cube, level_name)
+    df = level_df[[level_name] + [c for c in metric_cols if c in level_df.columns]]
+    summed = [c for c in metric_cols if c not in level_df.columns and c != "over80_ratio"]
+    if "over80_ratio" in metric_cols:
+        summed += [c for c in OVER80_INPUTS if c not in summed]
+    if summed:
+        sums = aggregate_lad_columns(lad_df, level_name, summed, hierarchy=prepared_hierarchy())
+        if "over80_ratio" in metric_cols:
+            sums = add_over80_ratio(sums)
+        df = df.merge(sums[[level_name] + [c for c in metric_cols if c in sums.columns and c not in df.columns]],
+                      on=level_name, how="left")
+    return df[[level_name] + metric_cols]
 
 # =============================
 # 2. UI: Metric & Level Selection
@@ -71,70 +82,71 @@ def aggregate_lad(lad_df, metric_col, level="LAD"):
 st.markdown("<h2>🏴 UK Market Analysis</h2>", unsafe_allow_html=True)
 st.markdown("<h4>Interactive Map & Multi-Metrics</h4>", unsafe_allow_html=True)
 
-lad_metrics = [c for c in lad_df.columns if c not in ["LAD23NM","ladnm","Agency_Count","num_agencies"]]
+lad_metrics = [c for c in lad_df.columns if c not in ["LAD23CD","LAD23NM","ladnm","Agency_Count","num_agencies"]]
 selected_metrics = st.multiselect("Choose metric(s) to display:", lad_metrics, default=lad_metrics[:1])
 level = st.selectbox("Choose map level:", ("Regions", "Counties", "Local Authority Districts"))
 
 # =============================
 # 3. Load GeoJSON
 # =============================
-if level == "Regions":
-    geojson_path = REGION_GEOJSON
-    geojson_key = "feature.properties.eer17nm"
-    key_col = "Region"
-elif level == "Counties":
-    geojson_path = COUNTY_GEOJSON
-    geojson_key = "feature.properties.CTYUA23NM"
-    key_col = "County"
+geojson_prop = LEVELS[level]["geojson_prop"]
+key_col = LEVELS[level]["key_col"]
+# Bounding boxes precomputed per area (src/area_index.py) for instant zoom-to-area
+areas = prepared_areas(level)
+zoom_area = st.sidebar.selectbox("Zoom to area", [None] + sorted(areas), format_func=lambda a: a or "All")
+# Vector-tile mode (once src/vector_tiles.py has built the tiles) keeps the boundaries out of
+# every map's HTML; otherwise the simplified national-view GeoJSON (src/simplify_geometry.py)
+use_tiles = tiles_available(level) and st.sidebar.checkbox("Vector tiles (local tile server)", value=False)
+if use_tiles:
+    start_tile_server()
 else:
-    geojson_path = LAD_GEOJSON
-    geojson_key = "feature.properties.LAD25NM"
-    key_col = "LAD25NM"
-
-with open(geojson_path) as f:
-    geojson_data = json.load(f)
+    geojson_data = prepared_payload(level, zoom=ZOOM_START)
 
 # =============================
 # 4. Map & Table
 # =============================
+# folium and streamlit_folium take about half a second to import: imported here, once the
+# header and selectors are on screen, so a cold start paints those first
+import folium
+from streamlit_folium import st_folium
+from choropleth import add_choropleth, add_vector_choropleth
 col1, col2 = st.columns([2,1])
 
+# One aggregation for every selected metric, reused by the maps and the Top Values column
+df_level = aggregate_lad(lad_df, selected_metrics, level)
+
 with col1:
     for metric in selected_metrics:
         st.markdown(f"**{metric.replace('_',' ').title()}**")
-        df_map = aggregate_lad(lad_df, metric, level)
-
-        m = folium.Map(location=[54.5, -3], zoom_start=5)
-        folium.Choropleth(
-            geo_data=geojson_data,
-            name="choropleth",
-            data=df_map,
-            columns=[key_col, metric],
-            key_on=geojson_key,
-            fill_color="Reds",
-            fill_opacity=0.7,
-            line_opacity=0.2,
-            legend_name=metric
-        ).add_to(m)
-
-        # Hover tooltip
-        for feature in geojson_data["features"]:
-            area_name = feature["properties"].get(key_col) or feature["properties"].get(key_col.replace("NM","nm"))
-            if area_name:
-                val = df_map.loc[df_map[key_col]==area_name, metric]
-                val = float(val.values[0]) if not val.empty else 0
-                folium.GeoJson(
-                    feature,
-                    style_function=lambda x: {'fillColor': 'transparent','color':'black','weight':0.5,'fillOpacity':0},
-                    tooltip=f"{area_name}: {val:.2f}"
-                ).add_to(m)
-        st_folium(m, width=900, height=600)
+        df_map = df_level[[key_col, metric]]
+
+        m = folium.Map(location=MAP_CENTER, zoom_start=ZOOM_START)
+        if use_tiles:
+            add_vector_choropleth(m, tile_url_template(level), LEVELS[level]["slug"], df_map, key_col=key_col,
+                                  metric_col=metric, legend_name=metric, max_native_zoom=VECTOR_TILE_ZOOMS[1])
+        else:
+            add_choropleth(m, geojson_data, df_map, key_col=key_col, geojson_prop=geojson_prop,
+                           metric_col=metric, legend_name=metric)
+        if zoom_area:
+            m.fit_bounds(area_bounds(areas[zoom_area]))
+        with stage("st_folium") as record:
+            record.update(describe_output(m, record["detail"]))
+            st_folium(m, width=900, height=600)
 
 with col2:
     st.subheader("📊 Top Values")
     for metric in selected_metrics:
-        df_map = aggregate_lad(lad_df, metric, level)
-        top5 = df_map[[key_col, metric]].sort_values(metric, ascending=False).head(5)
+        top5 = df_level[[key_col, metric]].sort_values(metric, ascending=False).head(5)
         st.markdown(f"**Top 5 {metric.replace('_',' ').title()}**")
         st.dataframe(top5)
-        st.bar_chart(top5.set_index(key_col))
\ No newline at end of file
+        st.bar_chart(top5.set_index(key_col))
+
+# =============================
+# 5. Stage timings
+# =============================
+run = finish_run(level=level, metrics=selected_metrics, vector_tiles=use_tiles)
+if debug:
+    with st.expander(f"⏱ Stage timings ({run['total_s']:.2f} s)", expanded=True):
+        st.dataframe(stages_frame(run))
+        st.markdown("**Memory per frame**")
+        st.dataframe(memory_report({"lad_df": lad_df, "df_level": df_level}))
@@ -7,70 +7,176 @@ from pathlib import Path
 # =============================
 sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
 from config import POSTCODE_MAPPING, HOMECARE_AGENCIES
+import catalog
+from location_geocoder import resolve_unmatched
 
-# =============================
-# Load datasets
-# =============================
-cqc = pd.read_csv(HOMECARE_AGENCIES)
-postcode_map = pd.read_csv(POSTCODE_MAPPING)
+# Columns kept from the ONS postcode directory; everything else is never parsed
+POSTCODE_LOOKUP_COLS = ["pcds", "oa21cd", "lsoa21cd", "lsoa21nm", "msoa21cd", "msoa21nm", "ladcd", "ladnm"]
+# Rows of the postcode directory parsed at a time (bounds peak memory)
+POSTCODE_CHUNKSIZE = 250_000
 
-# Normalize postcodes
-cqc["Postcode"] = cqc["Postcode"].str.upper().str.strip()
-postcode_map["pcds"] = postcode_map["pcds"].str.upper().str.strip()
 
-# Optional: check duplicates before merge
-dup_counts = cqc.duplicated(subset=["Name"], keep=False).sum()
-print("Duplicate agencies before merge:", dup_counts)
+def normalise_postcodes(postcodes: pd.Series) -> pd.Series:
+    """Join key for postcodes: upper case with all whitespace removed ('sw1a 1aa ' -> 'SW1A1AA')."""
+    return postcodes.astype("string").str.upper().str.replace(r"\s+", "", regex=True)
 
-# =============================
-# Merge on postcode to get LADs
-# =============================
-cqc_geo = cqc.merge(
-    postcode_map[["pcds","oa21cd","lsoa21cd","lsoa21nm",
-                  "msoa21cd","msoa21nm","ladcd","ladnm"]],
-    left_on="Postcode", right_on="pcds", how="left"
-)
 
-dup_counts = cqc_geo.duplicated(subset=["Name"], keep=False).sum()
-print("Duplicate agencies due to merge:", dup_counts)
+def _postcode_chunks(mapping_csv: str, columns: list, chunksize: int):
+    """Chunks of the postcode directory: from the catalog when it is a catalogued source, else parsed from the CSV."""
+    dataset = catalog.dataset_for_source(mapping_csv)
+    if dataset is not None:
+        return catalog.iter_batches(dataset, columns=columns, batch_size=chunksize)
+    return pd.read_csv(mapping_csv, usecols=columns, dtype=str, chunksize=chunksize)
 
-# =============================
-# Aggregate number of agencies per LAD
-# =============================
-agg_lad = cqc_geo.groupby("ladnm")["Name"].count().reset_index(name="Total_Agencies")
 
-# =============================
-# Aggregate number of agencies per LAD per CQC rating
-# =============================
-agg_lad_cqc = cqc_geo.pivot_table(
-    index="ladnm",
-    columns="CQC_Rating",
-    values="Name",
-    aggfunc="count",
-    fill_value=0
-).reset_index()
-
-# Optional: compute percentages per rating
-rating_cols = [col for col in agg_lad_cqc.columns if col != "ladnm"]
-for col in rating_cols:
-    agg_lad_cqc[f"{col}_pct"] = (agg_lad_cqc[col] / agg_lad_cqc[rating_cols].sum(axis=1)) * 100
-
-# Merge total agencies for completeness
-agg_lad_cqc = agg_lad_cqc.merge(agg_lad, on="ladnm", how="left")
+def stream_postcode_lookup(postcodes: pd.Series, mapping_csv: str = POSTCODE_MAPPING,
+                           chunksize: int = POSTCODE_CHUNKSIZE, columns: list = None) -> pd.DataFrame:
+    """
+    Stream the postcode directory in chunks and keep only the rows for the given postcodes.
 
-# =============================
-# Save outputs
-# =============================
-raw_path = Path(HOMECARE_AGENCIES)
-data_folder = raw_path.parent.parent / 'data'  # assuming raw_path is in "src"
+    Only `columns` are read (from the catalog's Parquet copy when mapping_csv is the
+    catalogued directory, see catalog.py), and each chunk is filtered to the wanted postcodes before
+    it is kept, so memory stays proportional to the chunk size plus the number of matches,
+    not to the size of the directory. Returns one row per postcode with a 'pc_key'
+    join column (see normalise_postcodes) and categorical code/name columns.
+    """
+    columns = POSTCODE_LOOKUP_COLS if columns is None else columns
+    wanted = pd.Index(normalise_postcodes(postcodes).dropna().unique())
+
+    matches = []
+    for chunk in _postcode_chunks(mapping_csv, columns, chunksize):
+        keys = normalise_postcodes(chunk["pcds"])
+        # Index lookup reuses the hash table built on the first chunk (Series.isin rebuilds it every call)
+        hit = wanted.get_indexer(keys) >= 0
+        if hit.any():
+            matches.append(chunk.loc[hit].assign(pc_key=keys[hit]))
+
+    if matches:
+        lookup = pd.concat(matches, ignore_index=True)
+    else:
+        lookup = pd.DataFrame(columns=columns + ["pc_key"], dtype=str)
+    lookup = lookup.drop_duplicates(subset="pc_key")
+
+    for col in columns:
+        if col != "pcds":
+            lookup[col] = lookup[col].astype("category")
+    return lookup
+
+
+def geocode_agencies(cqc: pd.DataFrame, mapping_csv: str = POSTCODE_MAPPING,
+                     chunksize: int = POSTCODE_CHUNKSIZE) -> pd.DataFrame:
+    """Attach OA/LSOA/MSOA/LAD codes to each agency by postcode (left join: unmatched rows keep NaN)."""
+    cqc = cqc.copy()
+    cqc["Postcode"] = cqc["Postcode"].str.upper().str.strip()
+    cqc["pc_key"] = normalise_postcodes(cqc["Postcode"])
+
+    lookup = stream_postcode_lookup(cqc["Postcode"], mapping_csv, chunksize)
+    cqc_geo = cqc.merge(lookup, on="pc_key", how="left")
+    return cqc_geo.drop(columns="pc_key")
+
+
+# Rating value used internally for agencies without a CQC rating (counted in the totals only)
+NO_RATING = "__no_rating__"
+
+
+def rating_counts(cqc_geo: pd.DataFrame) -> pd.Series:
+    """Number of agencies per (ladnm, CQC_Rating); agencies without a LAD are skipped."""
+    df = cqc_geo.dropna(subset=["ladnm", "Name"])
+    return (df.assign(ladnm=df["ladnm"].astype(str), CQC_Rating=df["CQC_Rating"].fillna(NO_RATING))
+              .groupby(["ladnm", "CQC_Rating"]).size())
+
+
+def lad_outputs_from_counts(counts: pd.Series):
+    """
+    Build the LAD-level outputs from (ladnm, CQC_Rating) counts.
+    Returns (agg_lad, agg_lad_cqc).
+    """
+    wide = counts[counts != 0].unstack(fill_value=0).sort_index(axis=0).sort_index(axis=1)
+    wide.index.name = "ladnm"
+    wide.columns.name = None
+
+    # =============================
+    # Aggregate number of agencies per LAD
+    # =============================
+    agg_lad = wide.sum(axis=1).rename("Total_Agencies").reset_index()
+
+    # =============================
+    # Aggregate number of agencies per LAD per CQC rating
+    # =============================
+    agg_lad_cqc = wide.drop(columns=NO_RATING, errors="ignore").reset_index()
+
+    # Optional: compute percentages per rating
+    rating_cols = [col for col in agg_lad_cqc.columns if col != "ladnm"]
+    rating_total = agg_lad_cqc[rating_cols].sum(axis=1)
+    for col in rating_cols:
+        agg_lad_cqc[f"{col}_pct"] = (agg_lad_cqc[col] / rating_total) * 100
+
+    # Merge total agencies for completeness
+    agg_lad_cqc = agg_lad_cqc.merge(agg_lad, on="ladnm", how="left")
+    return agg_lad, agg_lad_cqc
+
+
+def counts_from_lad_outputs(agg_lad_cqc: pd.DataFrame) -> pd.Series:
+    """Inverse of lad_outputs_from_counts: recover (ladnm, CQC_Rating) counts from a saved LAD x rating file."""
+    rating_cols = [c for c in agg_lad_cqc.columns
+                   if c not in ("ladnm", "Total_Agencies") and not c.endswith("_pct")]
+    wide = agg_lad_cqc.set_index("ladnm")[rating_cols]
+    wide[NO_RATING] = agg_lad_cqc.set_index("ladnm")["Total_Agencies"] - wide.sum(axis=1)
+    counts = wide.stack()
+    counts.index.names = ["ladnm", "CQC_Rating"]
+    return counts[counts != 0].astype("int64")
+
+
+def aggregate_agencies(cqc_geo: pd.DataFrame):
+    """
+    Count agencies per LAD and per LAD x CQC rating.
+    Returns (agg_lad, agg_lad_cqc).
+    """
+    return lad_outputs_from_counts(rating_counts(cqc_geo))
+
+
+def output_paths(raw_csv: str = HOMECARE_AGENCIES) -> dict:
+    """Paths of the postcode-level, LAD-level and LAD x rating outputs for a CQC export."""
+    raw_path = Path(raw_csv)
+    data_folder = raw_path.parent.parent / 'data'  # assuming raw_path is in "src"
+    return {
+        "postcodes": data_folder / f"{raw_path.stem}_postcodes{raw_path.suffix}",
+        "lad": data_folder / f"{raw_path.stem}_LAD{raw_path.suffix}",
+        "lad_cqc": data_folder / f"{raw_path.stem}_LAD_CQC_counts{raw_path.suffix}",
+    }
+
+
+if __name__ == "__main__":
+    # =============================
+    # Load datasets
+    # =============================
+    cqc = pd.read_csv(HOMECARE_AGENCIES)
+
+    # Optional: check duplicates before merge
+    dup_counts = cqc.duplicated(subset=["Name"], keep=False).sum()
+    print("Duplicate agencies before merge:", dup_counts)
+
+    # =============================
+    # Merge on postcode to get LADs (streamed, see stream_postcode_lookup)
+    # =============================
+    cqc_geo = geocode_agencies(cqc)
+
+    dup_counts = cqc_geo.duplicated(subset=["Name"], keep=False).sum()
+    print("Duplicate agencies due to merge:", dup_counts)
+    print("Agencies without a LAD match:", cqc_geo["ladnm"].isna().sum())
+
+    # Agencies with an unknown postcode: fall back to their coordinates (point in LAD polygon)
+    cqc_geo, fallback_report = resolve_unmatched(cqc_geo)
+    print("Location fallback:", fallback_report)
 
-CQCDataPostCodeFileName = data_folder / f"{raw_path.stem}_postcodes{raw_path.suffix}"
-CQCDataLADFileName = data_folder / f"{raw_path.stem}_LAD{raw_path.suffix}"
-CQCDataLADCQCFileName = data_folder / f"{raw_path.stem}_LAD_CQC_counts{raw_path.suffix}"
+    agg_lad, agg_lad_cqc = aggregate_agencies(cqc_geo)
 
-# Save
-cqc_geo.to_csv(CQCDataPostCodeFileName, index=False)
-agg_lad.to_csv(CQCDataLADFileName, index=False)
-agg_lad_cqc.to_csv(CQCDataLADCQCFileName, index=False)
+    # =============================
+    # Save outputs
+    # =============================
+    paths = output_paths(HOMECARE_AGENCIES)
+    cqc_geo.to_csv(paths["postcodes"], index=False)
+    agg_lad.to_csv(paths["lad"], index=False)
+    agg_lad_cqc.to_csv(paths["lad_cqc"], index=False)
 
-print("Saved postcode-level, LAD-level, and LAD-CQC-level aggregates.")
\ No newline at end of file
+    print("Saved postcode-level, LAD-level, and LAD-CQC-level aggregates.")
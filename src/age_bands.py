@@ -0,0 +1,139 @@
+import re
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+from hierarchy import load_hierarchy, lad_ids_for, rollup
+from frame_schema import compact_frame
+
+# =============================
+# Age-band engine
+# =============================
+# The census population comes in 18 five-year columns. Per area we keep the running total
+# over those columns with a leading zero (prefix[:, k] = people in the first k columns), so
+# the population of any band of whole columns is one subtraction for every area at once:
+#
+#   people aged lo..hi = prefix[:, (hi + 1) // 5] - prefix[:, lo // 5]
+#
+# Bands are written "65+", "75-84" (or "75–84", "75 to 84") and "under 20"; their edges
+# must fall on the census columns (start at a multiple of 5, end one below one).
+
+AGE_COLUMNS = [
+    "Aged 4 years and under", "Aged 5 to 9 years", "Aged 10 to 14 years", "Aged 15 to 19 years",
+    "Aged 20 to 24 years", "Aged 25 to 29 years", "Aged 30 to 34 years", "Aged 35 to 39 years",
+    "Aged 40 to 44 years", "Aged 45 to 49 years", "Aged 50 to 54 years", "Aged 55 to 59 years",
+    "Aged 60 to 64 years", "Aged 65 to 69 years", "Aged 70 to 74 years", "Aged 75 to 79 years",
+    "Aged 80 to 84 years", "Aged 85 years and over",
+]
+BAND_WIDTH = 5
+# Youngest age of the open-ended last column
+OPEN_AGE = BAND_WIDTH * (len(AGE_COLUMNS) - 1)
+# Levels the band index is rolled up to (as in the metrics cube)
+BAND_LEVELS = ["LAD", "County", "Region", "Country"]
+# Columns of band_frame() besides the area key
+BAND_COLS = ["band_population", "band_agencies_per_10k"]
+
+_PLUS = re.compile(r"^(\d+)\s*(?:\+|plus|and over)$")
+_RANGE = re.compile(r"^(\d+)\s*(?:-|–|to)\s*(\d+)$")
+_UNDER = re.compile(r"^under\s*(\d+)$")
+
+
+def parse_band(text: str):
+    """
+    (lo, hi) ages of a band ("65+", "75-84", "under 20"); hi is None for an open band.
+    Raises ValueError for anything that does not fall on the census five-year columns.
+    """
+    band = text.strip().lower()
+    if match := _PLUS.match(band):
+        lo, hi = int(match[1]), None
+    elif match := _RANGE.match(band):
+        lo, hi = int(match[1]), int(match[2])
+    elif match := _UNDER.match(band):
+        lo, hi = 0, int(match[1]) - 1
+    else:
+        raise ValueError(f"Unrecognised age band {text!r}: use e.g. '65+', '75-84' or 'under 20'")
+    if lo % BAND_WIDTH or lo > OPEN_AGE or (hi is not None and ((hi + 1) % BAND_WIDTH or hi < lo)):
+        raise ValueError(f"Age band {text!r} does not follow the census {BAND_WIDTH}-year columns "
+                         f"(start at a multiple of {BAND_WIDTH}, end one below one)")
+    if hi is not None and hi >= OPEN_AGE:
+        # "80-89" reaches into the open column: only expressible as "80+"
+        raise ValueError(f"Age band {text!r} ends inside the {OPEN_AGE}+ column: use '{lo}+'")
+    return lo, hi
+
+
+def band_label(lo: int, hi=None) -> str:
+    """Display name of a band: '65+', '75–84', 'under 20'."""
+    if hi is None:
+        return f"{lo}+"
+    if lo == 0:
+        return f"under {hi + 1}"
+    return f"{lo}–{hi}"
+
+
+def prefix_sums(counts: np.ndarray) -> np.ndarray:
+    """(n, 18) population columns -> (n, 19) running totals starting at 0."""
+    counts = np.asarray(counts, dtype=np.float64)
+    prefix = np.zeros((counts.shape[0], counts.shape[1] + 1))
+    np.cumsum(counts, axis=1, out=prefix[:, 1:])
+    return prefix
+
+
+def band_population(prefix: np.ndarray, lo: int, hi=None) -> np.ndarray:
+    """Population of the band lo..hi (hi None: lo and over) of every row of a prefix matrix."""
+    stop = prefix.shape[1] - 1 if hi is None else (hi + 1) // BAND_WIDTH
+    return prefix[:, stop] - prefix[:, lo // BAND_WIDTH]
+
+
+def per_10k(counts: np.ndarray, population: np.ndarray) -> np.ndarray:
+    """counts per 10,000 people, 0 where the population is 0."""
+    population = np.asarray(population, dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(population > 0, np.asarray(counts, dtype=np.float64) / population * 10000, 0.0)
+
+
+def build_band_index(lad_df: pd.DataFrame, hierarchy: dict = None, agency_col: str = "num_agencies",
+                     levels=BAND_LEVELS) -> dict:
+    """
+    Per level: {"areas": area names, "prefix": (n, 19) running population totals,
+    "agencies": agency counts}, rolled up from the LAD rows of lad_df.
+    """
+    hierarchy = load_hierarchy() if hierarchy is None else hierarchy
+    values = lad_df[AGE_COLUMNS + [agency_col]].to_numpy(dtype=float)
+    ids = lad_ids_for(hierarchy, lad_df)
+    index = {}
+    for level in levels:
+        totals, counts = rollup(hierarchy, values, ids, "LAD", level)
+        present = counts > 0
+        index[level] = {"areas": hierarchy[level]["names"][present],
+                        "prefix": prefix_sums(totals[present, :-1]),
+                        "agencies": totals[present, -1]}
+    return index
+
+
+def band_frame(index: dict, level: str, band: str, key_col: str = None) -> pd.DataFrame:
+    """
+    Population and agencies per 10k of an age band for every area of a level:
+    [key_col (default "area"), *BAND_COLS].
+    """
+    lo, hi = parse_band(band)
+    entry = index[level]
+    population = band_population(entry["prefix"], lo, hi)
+    return compact_frame(pd.DataFrame({
+        key_col or "area": entry["areas"],
+        "band_population": population,
+        "band_agencies_per_10k": per_10k(entry["agencies"], population),
+    }), count_cols=["band_population"])
+
+
+if __name__ == "__main__":
+    # Imported here: dashboard_data imports this module
+    from dashboard_data import load_lad_metrics
+
+    bands = sys.argv[1:] or ["65+", "75-84", "under 20"]
+    index = build_band_index(load_lad_metrics())
+    for band in bands:
+        print(f"\n{band_label(*parse_band(band))}")
+        print(band_frame(index, "Region", band, "Region").to_string(index=False))
@@ -1,5 +1,18 @@
+import numpy as np
 import pandas as pd
 
+from config import LSOA_POP
+from hierarchy import ancestor_ids, load_hierarchy, lookup_ids, rollup_frame
+from instrumentation import instrumented
+from frame_schema import compact_frame
+from age_bands import AGE_COLUMNS, band_population, per_10k, prefix_sums
+
+# An LSOA is under-served when its catchment saturation is below this fraction of the
+# national (70+-population-weighted) mean
+UNDERSERVED_FRACTION = 0.5
+# Levels LSOA metrics are rolled up to
+LSOA_ROLLUP_LEVELS = ["Ward", "LAD", "County", "Region"]
+
 def merge_demand_supply(demand_df: pd.DataFrame, supply_df: pd.DataFrame):
     """Merge demand and supply dataframes on 'region'"""
     return demand_df.merge(supply_df, on="region", how="left")
@@ -9,13 +22,219 @@ def compute_saturation(df: pd.DataFrame):
     df["companies_per_1k"] = df["num_companies"] / (df["target_population"] / 1000)
     return df
 
+def add_over80_ratio(df: pd.DataFrame) -> pd.DataFrame:
+    """Add the over-80 share of the population to a LAD population frame."""
+    df['over80_ratio'] = (df['Aged 80 to 84 years'] + df['Aged 85 years and over']) / df['Total']
+    return df
+
 def load_lad_population(csv_path: str) -> pd.DataFrame:
     """Load aggregated LAD population and compute metrics."""
     df = pd.read_csv(csv_path)
-    # Compute over-80 ratio
-    df['over80_ratio'] = (df['Aged 80 to 84 years'] + df['Aged 85 years and over']) / df['Total']
-    return df
+    return add_over80_ratio(df)
 
 def get_top_areas_by_over80_ratio(df: pd.DataFrame, n: int = 10) -> pd.DataFrame:
     """Return top n LADs by over-80 ratio."""
-    return df.sort_values('over80_ratio', ascending=False).head(n)
\ No newline at end of file
+    return df.sort_values('over80_ratio', ascending=False).head(n)
+
+@instrumented()
+def aggregate_lad_columns(lad_df: pd.DataFrame, level: str, columns: list, key_col: str = None,
+                          hierarchy: dict = None) -> pd.DataFrame:
+    """
+    Sum several LAD columns up to a hierarchy level ("LAD", "County", "Region" or "Country").
+
+    LADs are resolved through the geography index (by LAD23CD, or by LAD23NM and its
+    aliases) and summed with integer bincounts; LADs missing from the lookups are dropped.
+    lad_df is not copied or modified. Returns one row per area: [key_col or level, *columns].
+    hierarchy defaults to load_hierarchy().
+    """
+    return compact_frame(rollup_frame(lad_df, level, columns, key_col=key_col, hierarchy=hierarchy))
+
+@instrumented()
+def aggregate_lad_metrics(lad_df: pd.DataFrame, level_name: str, population_cols: list,
+                          rating_cols: list, agency_col: str = "num_agencies") -> pd.DataFrame:
+    """
+    Aggregate LAD-level data to counties, regions or countries.
+
+    Parameters
+    ----------
+    lad_df : pd.DataFrame
+        LAD-level DataFrame containing populations, agencies, and CQC ratings
+    level_name : str
+        Hierarchy level to aggregate to ("LAD", "County", "Region" or "Country", see
+        hierarchy.py); also the name of the area column in the result
+    population_cols : list
+        List of population columns to sum (e.g., ['Population_70plus', 'Population_75plus'])
+    rating_cols : list
+        List of rating count columns (Good, Outstanding, Requires Improvement, Inadequate)
+    agency_col : str
+        Column name for total agencies (including rated and unrated)
+
+    Returns
+    -------
+    agg_df : pd.DataFrame
+        Aggregated DataFrame with:
+            - summed populations
+            - summed agency counts
+            - summed CQC rating counts
+            - recalculated agencies per 10k for age groups
+            - CQC rating percentages
+    """
+    # Columns to sum
+    sum_cols = population_cols + [agency_col] + rating_cols + ["Not Rated"] + ['Total']
+
+    # Aggregate by sum
+    agg_df = aggregate_lad_columns(lad_df, level_name, sum_cols)
+
+    # Compute agencies per 10k for each age group
+    for pop_col in population_cols:
+        age_suffix = pop_col.split("_")[-1]  # e.g., '70plus'
+        # Named as in the metric selector, e.g. 'agencies_per_10k_70'
+        agg_df[f"agencies_per_10k_{age_suffix[:2]}"] = ((agg_df[agency_col] / agg_df[pop_col]) * 10000).fillna(0)
+
+    # Compute CQC rating percentages based on rated agencies only
+    agg_df["Rated_Total"] = agg_df[rating_cols].sum(axis=1)
+    for col in rating_cols:
+        pct_col = f"{col}_pct"
+        agg_df[pct_col] = (agg_df[col] / agg_df["Rated_Total"] * 100).fillna(0)
+
+    # Compute Unrated percentage (of total agencies)
+    agg_df["Unrated_pct"] = (agg_df["Not Rated"] / agg_df[agency_col] * 100).fillna(0)
+
+    return compact_frame(agg_df)
+
+def load_lsoa_population(parquet_path: str = LSOA_POP) -> pd.DataFrame:
+    """LSOA census population written by populationLADFix.py (LSOA21CD, ward / LAD columns, Total, age columns)."""
+    return pd.read_parquet(parquet_path)
+
+def weighted_percentiles(values: np.ndarray, weights: np.ndarray, groups: np.ndarray, n_groups: int,
+                         percentiles=(10, 50, 90)) -> np.ndarray:
+    """
+    Weighted percentiles of values within every group, for all groups at once: (n_groups,
+    len(percentiles)), NaN for groups without weight. The p-th percentile is the smallest
+    value whose cumulative weight within its group reaches p% (inverted CDF). Rows with a
+    negative group, a NaN value or no weight are ignored.
+    """
+    values, weights, groups = np.asarray(values, dtype=float), np.asarray(weights, dtype=float), np.asarray(groups)
+    keep = (groups >= 0) & np.isfinite(values) & (weights > 0)
+    values, weights, groups = values[keep], weights[keep], groups[keep].astype(np.int64)
+    out = np.full((n_groups, len(percentiles)), np.nan)
+    if values.size == 0:
+        return out
+
+    # Sort by group, then value: each group is a contiguous run in ascending value order
+    order = np.lexsort((values, groups))
+    values, weights, groups = values[order], weights[order], groups[order]
+    total = np.bincount(groups, weights=weights, minlength=n_groups)
+    present = np.flatnonzero(total > 0)
+    first = np.searchsorted(groups, present, side="left")
+    last = np.searchsorted(groups, present, side="right") - 1
+
+    # Cumulative weight share within the group, offset by the group id: one sorted key for all groups
+    cumulative = np.cumsum(weights)
+    before = np.zeros(n_groups)
+    before[present] = cumulative[first] - weights[first]
+    key = groups + (cumulative - before[groups]) / total[groups]
+    for j, p in enumerate(percentiles):
+        idx = np.minimum(np.searchsorted(key, present + p / 100, side="left"), last)
+        out[present, j] = values[idx]
+    return out
+
+@instrumented()
+def lsoa_metrics(lsoa_pop: pd.DataFrame, agencies: pd.DataFrame = None, centroids: pd.DataFrame = None,
+                 radius_km: float = 5, underserved_fraction: float = UNDERSERVED_FRACTION) -> pd.DataFrame:
+    """
+    Demand and supply per LSOA: [LSOA21CD, Total, population_70plus, population_80plus,
+    agencies, saturation, underserved (nullable boolean)].
+
+    agencies is a postcode-level CQC frame (lsoa21cd per agency, see CQCPostCodeLADMapping);
+    each agency is counted in its LSOA. With centroids (catchment.load_lsoa_centroids),
+    saturation is catchment-based: agencies within radius_km of the LSOA's population-weighted
+    centroid per 10k people aged 70+ living within radius_km. Without, it is the LSOA's own
+    agencies per 10k of its 70+ population.
+
+    An LSOA is under-served when its catchment saturation is below underserved_fraction x the
+    national mean weighted by 70+ population. The flag is NA without centroids (and for LSOAs
+    without one): most LSOAs have no agency inside them, so the LSOA-local rate would flag
+    "no agency in this LSOA" rather than poor access.
+    """
+    codes = lsoa_pop["LSOA21CD"].astype(object).to_numpy()
+    prefix = prefix_sums(lsoa_pop[AGE_COLUMNS].to_numpy(dtype=float))
+    pop70, pop80 = band_population(prefix, 70), band_population(prefix, 80)
+
+    counts = np.zeros(len(codes))
+    if agencies is not None:
+        pos = pd.Index(codes).get_indexer(agencies["lsoa21cd"].astype(object))
+        counts = np.bincount(pos[pos >= 0], minlength=len(codes)).astype(float)
+
+    if centroids is not None and agencies is not None:
+        # Imported here: only the catchment variant needs it
+        from catchment import agency_points, grid_counts
+        xy = centroids.set_index("LSOA21CD")[["x", "y"]].reindex(codes).to_numpy()
+        located = np.isfinite(xy).all(axis=1)
+        points = agency_points(agencies, centroids)[["x", "y"]].to_numpy()
+        supply = np.full(len(codes), np.nan)
+        demand = np.full(len(codes), np.nan)
+        supply[located] = grid_counts(xy[located], points, [radius_km * 1000])[:, 0]
+        demand[located] = grid_counts(xy[located], xy[located], [radius_km * 1000], pop70[located])[:, 0]
+        saturation = np.where(located, per_10k(supply, demand), np.nan)
+        valued = np.isfinite(saturation) & (pop70 > 0)
+        national = np.average(saturation[valued], weights=pop70[valued]) if valued.any() else np.nan
+        underserved = pd.array(np.where(valued, saturation < underserved_fraction * national, None), dtype="boolean")
+    else:
+        saturation = per_10k(counts, pop70)
+        underserved = pd.array([pd.NA] * len(codes), dtype="boolean")
+
+    return compact_frame(pd.DataFrame({
+        "LSOA21CD": codes,
+        "Total": lsoa_pop["Total"].to_numpy(),
+        "population_70plus": pop70,
+        "population_80plus": pop80,
+        "agencies": counts,
+        "saturation": saturation,
+        "underserved": underserved,
+    }), count_cols=["population_70plus", "population_80plus", "agencies"])
+
+@instrumented()
+def rollup_lsoa_metrics(lsoa_df: pd.DataFrame, levels=LSOA_ROLLUP_LEVELS, value_col: str = "saturation",
+                        weight_col: str = "population_70plus", percentiles=(10, 50, 90),
+                        hierarchy: dict = None) -> dict:
+    """
+    Roll lsoa_metrics() up to each level ("Ward", "LAD", "County", "Region", "Country").
+    Returns level -> one row per area with LSOAs: [level (area name), lsoas, Total,
+    population_70plus, population_80plus, agencies, <value_col>_mean and _p<N> (weighted by
+    weight_col), underserved_share (share of weight_col, among LSOAs with an under-served
+    flag, living in under-served LSOAs; NaN where no LSOA is flagged either way)].
+    Every statistic is a bincount or a sorted-key search over all LSOAs at once.
+    """
+    hierarchy = load_hierarchy() if hierarchy is None else hierarchy
+    lsoa_ids = lookup_ids(hierarchy, "LSOA", codes=lsoa_df["LSOA21CD"])
+    values = lsoa_df[value_col].to_numpy(dtype=float)
+    weights = lsoa_df[weight_col].to_numpy(dtype=float)
+    valued = np.isfinite(values)
+    flags = lsoa_df["underserved"].astype("Float64").to_numpy(dtype=float, na_value=np.nan)
+    flagged = np.isfinite(flags)
+    sum_cols = ["Total", "population_70plus", "population_80plus", "agencies"]
+
+    out = {}
+    for level in levels:
+        ids = ancestor_ids(hierarchy, "LSOA", level, lsoa_ids)
+        known = ids >= 0
+        g, n = ids[known], len(hierarchy[level]["codes"])
+        lsoas = np.bincount(g, minlength=n)
+        present = lsoas > 0
+
+        frame = {level: hierarchy[level]["names"][present], "lsoas": lsoas[present]}
+        for col in sum_cols:
+            frame[col] = np.bincount(g, weights=lsoa_df[col].to_numpy(dtype=float)[known], minlength=n)[present]
+        w, v = np.where(valued, weights, 0)[known], np.nan_to_num(values)[known]
+        weight_total = np.bincount(g, weights=w, minlength=n)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            frame[f"{value_col}_mean"] = (np.bincount(g, weights=w * v, minlength=n) / weight_total)[present]
+            frame["underserved_share"] = (
+                np.bincount(g, weights=(weights * np.nan_to_num(flags))[known], minlength=n)
+                / np.bincount(g, weights=np.where(flagged, weights, 0)[known], minlength=n))[present]
+        pcts = weighted_percentiles(values[known], weights[known], g, n, percentiles)
+        for j, p in enumerate(percentiles):
+            frame[f"{value_col}_p{p}"] = pcts[present, j]
+        out[level] = compact_frame(pd.DataFrame(frame), count_cols=sum_cols)
+    return out
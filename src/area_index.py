@@ -0,0 +1,159 @@
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+from config import AREA_INDEX
+from dashboard_data import LEVELS, GEOJSON_NAME_FIXES
+from data_cache import cached_by_files, cached_file_sha256
+from instrumentation import instrumented
+
+# =============================
+# Area geometry index
+# =============================
+# Per Region, County and LAD: true centroid, a label point guaranteed to fall inside the
+# area, the bounding box (WGS84) and the area in km². Computed once with vectorised
+# shapely calls in British National Grid and stored as Parquet, so zooming a map to an
+# area is a dictionary lookup instead of a walk over the boundary coordinates.
+# geopandas, shapely and pyproj are only imported to build the index, not to read it.
+
+AREA_INDEX_VERSION = 1
+AREA_INDEX_METADATA_KEY = b"area_index"
+
+
+def source_hashes() -> dict:
+    """Content hashes of every level's boundary source."""
+    return {level: cached_file_sha256(spec["boundary_source"]) for level, spec in LEVELS.items()}
+
+
+def build_level_index(level: str) -> pd.DataFrame:
+    """Geometry metadata of one level: one row per area, keyed by the name the dashboards join on."""
+    import shapely
+    from pyproj import Transformer
+    from simplify_geometry import load_boundaries, PROJECTED_CRS, OUTPUT_CRS
+
+    to_wgs84 = Transformer.from_crs(PROJECTED_CRS, OUTPUT_CRS, always_xy=True)
+    spec = LEVELS[level]
+    boundaries = load_boundaries(level)
+    geometries = boundaries.geometry.values
+
+    centroids = shapely.centroid(geometries)
+    # Centroids of crescent-shaped or multi-part areas can fall outside them (or in the sea)
+    label_points = shapely.point_on_surface(geometries)
+    centroid_lon, centroid_lat = to_wgs84.transform(shapely.get_x(centroids), shapely.get_y(centroids))
+    label_lon, label_lat = to_wgs84.transform(shapely.get_x(label_points), shapely.get_y(label_points))
+    bounds = boundaries.to_crs(OUTPUT_CRS).bounds
+
+    name_prop = spec["geojson_prop"]
+    return pd.DataFrame({
+        "level": level,
+        "area": boundaries[name_prop].replace(GEOJSON_NAME_FIXES.get(name_prop, {})).to_numpy(dtype=object),
+        "code": boundaries[spec["code_prop"]].to_numpy(dtype=object),
+        "centroid_lat": centroid_lat,
+        "centroid_lon": centroid_lon,
+        "label_lat": label_lat,
+        "label_lon": label_lon,
+        "min_lon": bounds["minx"].to_numpy(),
+        "min_lat": bounds["miny"].to_numpy(),
+        "max_lon": bounds["maxx"].to_numpy(),
+        "max_lat": bounds["maxy"].to_numpy(),
+        "area_km2": shapely.area(geometries) / 1e6,
+        "centroid_inside": shapely.contains(geometries, centroids),
+    })
+
+
+def build_area_index(levels=None) -> pd.DataFrame:
+    """Geometry metadata of every dashboard level as one long frame."""
+    index = pd.concat([build_level_index(level) for level in levels or LEVELS], ignore_index=True)
+    index["level"] = pd.Categorical(index["level"], categories=list(LEVELS))
+    return index
+
+
+def write_area_index(index: pd.DataFrame, index_path: str = AREA_INDEX) -> str:
+    """Write the index as Parquet with its version and source hashes in the schema metadata."""
+    table = pa.Table.from_pandas(index, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[AREA_INDEX_METADATA_KEY] = json.dumps({"version": AREA_INDEX_VERSION,
+                                                    "sources": source_hashes()}).encode()
+    # Unique temp file: dashboard sessions rebuilding a stale index may write at once
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(index_path), prefix=f"{os.path.basename(index_path)}.",
+                                    suffix=".tmp")
+    os.close(fd)
+    try:
+        pq.write_table(table.replace_schema_metadata(metadata), tmp_path)
+        os.replace(tmp_path, index_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return index_path
+
+
+@cached_by_files("index_path")
+def _read_area_index(index_path: str):
+    table = pq.read_table(index_path)
+    return table.to_pandas(), json.loads(table.schema.metadata[AREA_INDEX_METADATA_KEY])
+
+
+def is_area_index_current(index_path: str = AREA_INDEX) -> bool:
+    """True when the index file exists and was built from the current boundary files."""
+    if not os.path.exists(index_path):
+        return False
+    _, meta = _read_area_index(index_path)
+    return meta.get("version") == AREA_INDEX_VERSION and meta.get("sources") == source_hashes()
+
+
+def load_area_index(index_path: str = AREA_INDEX) -> pd.DataFrame:
+    """The persisted index, rebuilt (and written back when possible) if missing or stale. Shared: do not mutate."""
+    if is_area_index_current(index_path):
+        index, _ = _read_area_index(index_path)
+        return index
+    index = build_area_index()
+    try:
+        write_area_index(index, index_path)
+    except OSError as e:
+        print(f"Could not write area index to {index_path}: {e}")
+    return index
+
+
+def _lookup_from(index: pd.DataFrame, level: str) -> dict:
+    rows = index[index["level"] == level].drop(columns="level").drop_duplicates("area").set_index("area")
+    return rows.to_dict("index")
+
+
+@cached_by_files("index_path")
+def _level_lookup(index_path: str, level: str) -> dict:
+    index, _ = _read_area_index(index_path)
+    return _lookup_from(index, level)
+
+
+@instrumented()
+def area_lookup(level: str, index_path: str = AREA_INDEX) -> dict:
+    """
+    Area name -> {"code", "centroid_lat", "centroid_lon", "label_lat", "label_lon",
+    "min_lon", "min_lat", "max_lon", "max_lat", "area_km2", "centroid_inside"} for one
+    dashboard level. Place markers and labels at the label point: it is always inside the area.
+    """
+    index = load_area_index(index_path)
+    if not os.path.exists(index_path):  # could not be written back
+        return _lookup_from(index, level)
+    return _level_lookup(index_path, level)
+
+
+def area_bounds(entry: dict) -> list:
+    """Leaflet fit_bounds box [[south, west], [north, east]] of an area_lookup entry."""
+    return [[entry["min_lat"], entry["min_lon"]], [entry["max_lat"], entry["max_lon"]]]
+
+
+if __name__ == "__main__":
+    index = build_area_index()
+    path = write_area_index(index)
+    for level, rows in index.groupby("level", observed=True):
+        print(f"{level:<26} {len(rows):>4} areas  {rows['area_km2'].sum():>9.0f} km²  "
+              f"centroid outside the area: {int((~rows['centroid_inside']).sum())}")
+    print(f"Wrote {path}")
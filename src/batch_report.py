@@ -0,0 +1,184 @@
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import folium
+import matplotlib
+
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from matplotlib.patches import Patch
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+from config import MAP_CENTER, ZOOM_START
+from dashboard_data import LEVELS, METRIC_DICT, GEOJSON_NAME_FIXES, tolerance_for_zoom
+from metrics_cube import DASHBOARD_LEVELS, load_metrics_cube, cube_level
+from simplify_geometry import load_boundaries, simplify_coverage, drop_small_parts, OUTPUT_CRS
+from choropleth import add_choropleth, step_colormap, fill_colors
+from geojson_payload import shape_geojson
+
+# =============================
+# Batch map report
+# =============================
+# Renders every metric in METRIC_DICT at every map level as a static PNG and a standalone
+# folium HTML page, plus a summary table, without going through the Streamlit UI.
+# Maps are spread over a process pool; each worker loads the metrics cube and the
+# boundaries of every level once (simplified for the national view) and reuses them.
+#
+#   python src/batch_report.py --output reports/maps
+#   python src/batch_report.py --levels Regions Counties --metrics Total num_agencies --workers 4
+
+FORMATS = ["png", "html"]
+PNG_SIZE_INCHES = (6, 8)
+PNG_DPI = 120
+
+# Per worker process: level -> {"gdf", "geojson", "figure", "data"} (filled by _init_worker)
+_WORKER = {}
+
+
+def load_level_state(level: str, cube: pd.DataFrame, formats=FORMATS) -> dict:
+    """
+    Boundaries of a level simplified for the national view (as a GeoDataFrame, parsed
+    GeoJSON and a base figure for the PNGs) plus the level's metrics.
+    """
+    spec = LEVELS[level]
+    tolerance = tolerance_for_zoom(ZOOM_START)
+    boundaries = drop_small_parts(simplify_coverage(load_boundaries(level), tolerance), tolerance ** 2)
+    gdf = boundaries[[spec["geojson_prop"], "geometry"]].to_crs(OUTPUT_CRS)
+    gdf[spec["geojson_prop"]] = gdf[spec["geojson_prop"]].replace(GEOJSON_NAME_FIXES.get(spec["geojson_prop"], {}))
+    return {
+        "gdf": gdf,
+        "geojson": shape_geojson(json.loads(gdf.to_json(drop_id=True)), spec["geojson_prop"])
+                   if "html" in formats else None,
+        "figure": base_figure(gdf) if "png" in formats else None,
+        "data": cube_level(cube, DASHBOARD_LEVELS[level], spec["key_col"]),
+    }
+
+
+def _init_worker(levels: list, formats: list):
+    cube = load_metrics_cube()
+    for level in levels:
+        _WORKER[level] = load_level_state(level, cube, formats)
+
+
+def _slug(metric: str) -> str:
+    return "".join(c if c.isalnum() else "_" for c in metric).strip("_").lower()
+
+
+def base_figure(gdf: pd.DataFrame) -> tuple:
+    """Figure with the level's polygons drawn once: (figure, axes, polygon collection)."""
+    fig, ax = plt.subplots(figsize=PNG_SIZE_INCHES)
+    gdf.plot(ax=ax, color="white", edgecolor="black", linewidth=0.2)
+    ax.set_axis_off()
+    return fig, ax, ax.collections[0]
+
+
+def write_png(figure: tuple, values: np.ndarray, path: str, title: str, legend_name: str):
+    """
+    Static choropleth with the same bins and colours as the interactive map. Only the
+    fill colours, legend and title change between metrics; the polygons are reused.
+    """
+    fig, ax, polygons = figure
+    _, bin_edges, colors = step_colormap(values, legend_name=legend_name)
+    polygons.set_facecolor(fill_colors(values, bin_edges, colors))
+    handles = [Patch(facecolor=color, edgecolor="black", label=f"{lo:,.2f} – {hi:,.2f}")
+               for color, lo, hi in zip(colors, bin_edges[:-1], bin_edges[1:])]
+    if np.isnan(values).any():
+        handles.append(Patch(facecolor="black", edgecolor="black", label="No data"))
+    ax.legend(handles=handles, title=legend_name, loc="upper left", fontsize=7, title_fontsize=8)
+    ax.set_title(title)
+    fig.savefig(path, dpi=PNG_DPI, bbox_inches="tight")
+
+
+def write_html(geojson: dict, df: pd.DataFrame, key_col: str, geojson_prop: str, metric: str, path: str):
+    """Standalone interactive map, as drawn by the dashboards."""
+    m = folium.Map(location=MAP_CENTER, zoom_start=ZOOM_START)
+    add_choropleth(m, geojson, df, key_col=key_col, geojson_prop=geojson_prop, metric_col=metric, legend_name=metric)
+    m.save(path)
+
+
+def render_map(level: str, metric: str, output_dir: str, formats=FORMATS) -> dict:
+    """Render one metric at one level (in a worker). Returns its summary row."""
+    start = time.perf_counter()
+    state = _WORKER[level]
+    spec = LEVELS[level]
+    df = state["data"][[spec["key_col"], metric]]
+    lookup = df.drop_duplicates(subset=spec["key_col"]).set_index(spec["key_col"])[metric]
+    values = pd.to_numeric(state["gdf"][spec["geojson_prop"]].map(lookup), errors="coerce").to_numpy(dtype=float)
+
+    base = os.path.join(output_dir, spec["slug"], _slug(metric))
+    os.makedirs(os.path.dirname(base), exist_ok=True)
+    row = {
+        "level": level,
+        "metric": metric,
+        "title": METRIC_DICT.get(metric, metric),
+        "areas": len(values),
+        "matched": int(np.isfinite(values).sum()),
+        "min": float(np.nanmin(values)) if np.isfinite(values).any() else None,
+        "median": float(np.nanmedian(values)) if np.isfinite(values).any() else None,
+        "max": float(np.nanmax(values)) if np.isfinite(values).any() else None,
+    }
+    if "png" in formats:
+        write_png(state["figure"], values, f"{base}.png", f"{row['title']} – {level}", row["title"])
+        row["png"] = f"{base}.png"
+    if "html" in formats:
+        write_html(state["geojson"], df, spec["key_col"], spec["geojson_prop"], metric, f"{base}.html")
+        row["html"] = f"{base}.html"
+        row["html_bytes"] = os.path.getsize(f"{base}.html")
+    row["seconds"] = round(time.perf_counter() - start, 3)
+    return row
+
+
+def run_batch(output_dir: str, levels=None, metrics=None, formats=FORMATS, workers: int = None) -> pd.DataFrame:
+    """Render every (level, metric) map over a process pool and write summary.csv. Returns the summary."""
+    levels = list(levels or LEVELS)
+    metrics = list(metrics or METRIC_DICT)
+    tasks = [(level, metric) for level in levels for metric in metrics]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(tasks)))
+    os.makedirs(output_dir, exist_ok=True)
+    # Build the cube once here so workers only read it
+    load_metrics_cube()
+
+    rows = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(levels, formats)) as pool:
+        futures = {pool.submit(render_map, level, metric, output_dir, formats): (level, metric)
+                   for level, metric in tasks}
+        for future in as_completed(futures):
+            level, metric = futures[future]
+            try:
+                rows.append(future.result())
+            except Exception as e:
+                rows.append({"level": level, "metric": metric, "error": repr(e)})
+
+    order = {task: i for i, task in enumerate(tasks)}
+    summary = pd.DataFrame(sorted(rows, key=lambda r: order[(r["level"], r["metric"])]))
+    summary.to_csv(os.path.join(output_dir, "summary.csv"), index=False)
+    return summary
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render every metric x level map as PNG and HTML.")
+    parser.add_argument("--output", default="reports/maps", help="Output folder")
+    parser.add_argument("--levels", nargs="+", choices=list(LEVELS), help="Map levels (default: all)")
+    parser.add_argument("--metrics", nargs="+", choices=list(METRIC_DICT), help="Metrics (default: all)")
+    parser.add_argument("--formats", nargs="+", choices=FORMATS, default=FORMATS)
+    parser.add_argument("--workers", type=int, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    summary = run_batch(args.output, args.levels, args.metrics, args.formats, args.workers)
+    elapsed = time.perf_counter() - start
+
+    columns = [c for c in ["level", "metric", "matched", "areas", "min", "median", "max", "seconds", "error"]
+               if c in summary.columns]
+    print(summary[columns].to_string(index=False, float_format="{:,.2f}".format))
+    failed = int(summary["error"].notna().sum()) if "error" in summary.columns else 0
+    print(f"\n{len(summary) - failed} maps in {elapsed:.1f} s ({failed} failed) -> {args.output}")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,402 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import folium
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+from config import (HOMECARE_AGENCIES, POSTCODE_MAPPING, LAD_POP_CSV, WARD_TO_LAD_MAPPING, MAP_CENTER, ZOOM_START)
+from data_cache import invalidate
+from dashboard_data import LEVELS, POPULATION_COLS, RATING_COLS, load_geojson, load_lad_metrics
+from analysis import aggregate_lad_metrics
+from choropleth import add_choropleth
+from CQCPostCodeLADMapping import geocode_agencies, aggregate_agencies
+from population import ingest_census_population
+
+# =============================
+# Benchmark suite
+# =============================
+# Times and memory-profiles the pipeline stages and the dashboard rendering path on the
+# real data/ files and on synthetic inputs scaled 10x / 100x, and writes a JSON report.
+# A previous report can be passed as --baseline to fail on regressions.
+#
+#   python src/benchmark.py --scales 10 100 --output reports/benchmark.json
+#   python src/benchmark.py --baseline reports/benchmark.json --tolerance 0.25
+
+REPORT_VERSION = 1
+
+# Synthetic sizes at scale 1 (multiplied by the scale factor)
+SYNTHETIC_POSTCODES = 50_000
+SYNTHETIC_AGENCIES = 16_000
+# Synthetic GeoJSON is skipped above this size: json parsing needs ~10x the file size in RAM
+MAX_SYNTHETIC_GEOJSON_MB = 100
+
+# Runs are repeated up to `repeat` times, but not once a single run is slower than this
+MAX_REPEAT_SECONDS = 5.0
+
+STAGES = ["geocode", "census_lsoa", "aggregate_lad_metrics", "geojson_load", "choropleth_html"]
+AGGREGATE_LEVELS = ["Region", "County", "Country"]
+MAP_LEVELS = {"Regions": "Region", "Counties": "County", "Local Authority Districts": "LAD"}
+CENSUS_AGE_COLS = [
+    "Aged 4 years and under", "Aged 5 to 9 years", "Aged 10 to 14 years", "Aged 15 to 19 years",
+    "Aged 20 to 24 years", "Aged 25 to 29 years", "Aged 30 to 34 years", "Aged 35 to 39 years",
+    "Aged 40 to 44 years", "Aged 45 to 49 years", "Aged 50 to 54 years", "Aged 55 to 59 years",
+    "Aged 60 to 64 years", "Aged 65 to 69 years", "Aged 70 to 74 years", "Aged 75 to 79 years",
+    "Aged 80 to 84 years", "Aged 85 years and over",
+]
+
+
+# =============================
+# Measurement
+# =============================
+def measure(func, setup=None, repeat: int = 3) -> dict:
+    """
+    Time func() (best and median of up to `repeat` runs) and record its peak traced
+    Python/numpy allocation in one extra run under tracemalloc. setup() runs untimed
+    before every call. Returns the timings plus whatever func returned under 'info'.
+    """
+    timings = []
+    info = None
+    for _ in range(max(repeat, 1)):
+        if setup:
+            setup()
+        start = time.perf_counter()
+        info = func()
+        timings.append(time.perf_counter() - start)
+        if timings[-1] > MAX_REPEAT_SECONDS:
+            break
+
+    if setup:
+        setup()
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {
+        "status": "ok",
+        "seconds": round(statistics.median(timings), 4),
+        "seconds_min": round(min(timings), 4),
+        "runs": len(timings),
+        "peak_mb": round(peak / 1e6, 2),
+        "info": info or {},
+    }
+
+
+def skipped(reason: str) -> dict:
+    return {"status": "skipped", "reason": reason}
+
+
+# =============================
+# Synthetic inputs
+# =============================
+def _lsoa_lookup() -> pd.DataFrame:
+    return pd.read_csv(WARD_TO_LAD_MAPPING, usecols=["LSOA21CD", "LSOA21NM", "LAD23CD", "LAD23NM"])
+
+
+def write_synthetic_postcodes(workdir: Path, scale: int, seed: int = 0):
+    """
+    Synthetic postcode directory (SYNTHETIC_POSTCODES x scale rows, real LSOAs/LADs) and a
+    CQC export whose agencies sit in a subset of those postcodes. Returns (cqc_csv, directory_csv).
+    """
+    rng = np.random.default_rng(seed)
+    lookup = _lsoa_lookup()
+    n_postcodes = SYNTHETIC_POSTCODES * scale
+    rows = lookup.iloc[np.arange(n_postcodes) % len(lookup)].reset_index(drop=True)
+    outward = pd.Series(np.arange(n_postcodes) // 4000).map(lambda i: f"ZZ{i}")
+    inward = pd.Series(np.arange(n_postcodes) % 4000).map(lambda i: f"{i % 10}{chr(65 + i // 10 % 20)}{chr(65 + i // 200)}")
+    directory = pd.DataFrame({
+        "pcds": outward + " " + inward,
+        "oa21cd": "E00" + pd.Series(np.arange(n_postcodes) % 999_999).astype(str).str.zfill(6),
+        "lsoa21cd": rows["LSOA21CD"], "lsoa21nm": rows["LSOA21NM"],
+        "msoa21cd": rows["LSOA21CD"].str[:6], "msoa21nm": rows["LSOA21NM"].str[:-1],
+        "ladcd": rows["LAD23CD"], "ladnm": rows["LAD23NM"],
+        "lat": 51.5, "long": -0.1,
+    })
+    directory_csv = workdir / f"postcodes_{scale}x.csv"
+    directory.to_csv(directory_csv, index=False)
+
+    n_agencies = SYNTHETIC_AGENCIES * scale
+    postcodes = directory["pcds"].to_numpy()[rng.integers(0, n_postcodes, n_agencies)]
+    # ~2% of agencies have a postcode the directory does not know
+    unknown = rng.random(n_agencies) < 0.02
+    postcodes[unknown] = "XX9 9XX"
+    cqc = pd.DataFrame({
+        "Name": [f"Agency {i}" for i in range(n_agencies)],
+        "Postcode": pd.Series(postcodes).str.lower(),
+        "CQC_Rating": rng.choice(RATING_COLS + [None], n_agencies, p=[0.6, 0.05, 0.15, 0.02, 0.18]),
+    })
+    cqc_csv = workdir / f"cqc_{scale}x.csv"
+    cqc.to_csv(cqc_csv, index=False)
+    return cqc_csv, directory_csv
+
+
+def write_synthetic_census(workdir: Path, scale: int, seed: int = 0) -> Path:
+    """Synthetic census age-band file in the ONS layout: 5 preamble lines, then one row per LSOA, repeated scale times."""
+    rng = np.random.default_rng(seed)
+    lookup = _lsoa_lookup()
+    rows = lookup.iloc[np.tile(np.arange(len(lookup)), scale)].reset_index(drop=True)
+    ages = pd.DataFrame(rng.integers(20, 200, (len(rows), len(CENSUS_AGE_COLS))), columns=CENSUS_AGE_COLS)
+    census = pd.concat([
+        pd.DataFrame({"Area": "lsoa2021:" + rows["LSOA21CD"] + " : " + rows["LSOA21NM"], "Total": ages.sum(axis=1)}),
+        ages,
+    ], axis=1)
+    census_csv = workdir / f"census_{scale}x.csv"
+    with open(census_csv, "w") as f:
+        f.write("Synthetic census extract\n\n\n\n\n")
+        census.to_csv(f, index=False)
+    return census_csv
+
+
+def tile_lad_frame(lad_df: pd.DataFrame, scale: int) -> pd.DataFrame:
+    """Repeat the LAD frame scale times (same LAD codes, so the rollups see scale x the rows)."""
+    if scale == 1:
+        return lad_df
+    return pd.concat([lad_df] * scale, ignore_index=True)
+
+
+def tile_geojson(geojson_data: dict, scale: int) -> dict:
+    """FeatureCollection with every feature repeated scale times (distinct ids, shared geometry)."""
+    features = [
+        {**feature, "id": f"{k}-{i}"}
+        for k in range(scale) for i, feature in enumerate(geojson_data["features"])
+    ]
+    return {"type": "FeatureCollection", "features": features}
+
+
+# =============================
+# Stages
+# =============================
+def bench_geocode(cqc_csv, directory_csv, repeat):
+    cqc = pd.read_csv(cqc_csv)
+
+    def run():
+        cqc_geo = geocode_agencies(cqc, str(directory_csv))
+        agg_lad, _ = aggregate_agencies(cqc_geo)
+        return {"agencies": len(cqc), "matched": int(cqc_geo["ladnm"].notna().sum()), "lads": len(agg_lad),
+                "directory_mb": round(os.path.getsize(directory_csv) / 1e6, 2)}
+
+    return measure(run, repeat=repeat)
+
+
+def bench_census(census_csv, repeat):
+    def run():
+        lsoa_df, lad_df = ingest_census_population(str(census_csv))
+        return {"lsoas": len(lsoa_df), "lads": len(lad_df), "input_mb": round(os.path.getsize(census_csv) / 1e6, 2)}
+
+    return measure(run, repeat=repeat)
+
+
+def bench_aggregate(lad_df, level_name, scale, repeat):
+    lad_df = tile_lad_frame(lad_df, scale)
+
+    def run():
+        agg = aggregate_lad_metrics(lad_df, level_name, POPULATION_COLS, RATING_COLS)
+        return {"lads": len(lad_df), "areas": len(agg)}
+
+    return measure(run, repeat=repeat)
+
+
+def bench_geojson_load(path, repeat):
+    def run():
+        geojson_data = load_geojson(str(path))
+        return {"features": len(geojson_data["features"]), "file_mb": round(os.path.getsize(path) / 1e6, 2)}
+
+    # load_geojson is memoised: drop the cache so every run parses the file
+    return measure(run, setup=invalidate, repeat=repeat)
+
+
+def bench_choropleth(geojson_data, df, key_col, geojson_prop, metric_col, repeat):
+    def run():
+        m = folium.Map(location=MAP_CENTER, zoom_start=ZOOM_START)
+        add_choropleth(m, geojson_data, df, key_col=key_col, geojson_prop=geojson_prop, metric_col=metric_col)
+        html = m.get_root().render()
+        return {"features": len(geojson_data["features"]), "html_mb": round(len(html.encode()) / 1e6, 2)}
+
+    return measure(run, repeat=repeat)
+
+
+# =============================
+# Suite
+# =============================
+def _metric_frame(lad_df, level):
+    """Per-area agencies_per_10k_70 frame for a dashboard map level."""
+    key_col = LEVELS[level]["key_col"]
+    if MAP_LEVELS[level] == "LAD":
+        return lad_df.rename(columns={"LAD23NM": key_col})
+    level_name = MAP_LEVELS[level]
+    return aggregate_lad_metrics(lad_df, level_name, POPULATION_COLS, RATING_COLS)
+
+
+def run_suite(scales, stages, repeat: int = 3, workdir: str = None, keep_data: bool = False) -> list:
+    """Run the selected stages on the real data (scale 'real') and on each synthetic scale. Returns result rows."""
+    results = []
+    workdir = Path(workdir or tempfile.mkdtemp(prefix="geo_bench_"))
+    workdir.mkdir(parents=True, exist_ok=True)
+
+    def record(stage, dataset, scale, variant, result):
+        row = {"stage": stage, "dataset": dataset, "scale": scale, "variant": variant, **result}
+        results.append(row)
+        timing = f"{row['seconds']:.3f}s  peak {row['peak_mb']} MB" if row["status"] == "ok" else row["reason"]
+        print(f"{stage:<22} {dataset:<9} {str(scale):>4}x {variant or '':<26} {timing}", flush=True)
+
+    lad_df = load_lad_metrics()
+    runs = [("real", 1)] + [("synthetic", s) for s in scales]
+    geojson_stages = [stage for stage in ("geojson_load", "choropleth_html") if stage in stages]
+
+    try:
+        for dataset, scale in runs:
+            real = dataset == "real"
+            if "geocode" in stages:
+                if real:
+                    if os.path.exists(HOMECARE_AGENCIES) and os.path.exists(POSTCODE_MAPPING):
+                        record("geocode", dataset, scale, None, bench_geocode(HOMECARE_AGENCIES, POSTCODE_MAPPING, repeat))
+                    else:
+                        record("geocode", dataset, scale, None, skipped("CQC export or postcode directory not in data/"))
+                else:
+                    cqc_csv, directory_csv = write_synthetic_postcodes(workdir, scale)
+                    record("geocode", dataset, scale, None, bench_geocode(cqc_csv, directory_csv, repeat))
+
+            if "census_lsoa" in stages:
+                if real:
+                    if os.path.exists(LAD_POP_CSV):
+                        record("census_lsoa", dataset, scale, None, bench_census(LAD_POP_CSV, repeat))
+                    else:
+                        record("census_lsoa", dataset, scale, None, skipped("raw census file not in data/"))
+                else:
+                    record("census_lsoa", dataset, scale, None,
+                           bench_census(write_synthetic_census(workdir, scale), repeat))
+
+            if "aggregate_lad_metrics" in stages:
+                for level_name in AGGREGATE_LEVELS:
+                    record("aggregate_lad_metrics", dataset, scale, level_name,
+                           bench_aggregate(lad_df, level_name, scale, repeat))
+
+            for level, spec in LEVELS.items():
+                path = spec["geojson_path"]
+                if not os.path.exists(path):
+                    for stage in geojson_stages:
+                        record(stage, dataset, scale, level, skipped(f"{Path(path).name} not in data/"))
+                    continue
+                file_mb = os.path.getsize(path) / 1e6 * scale
+                if not real and file_mb > MAX_SYNTHETIC_GEOJSON_MB:
+                    for stage in geojson_stages:
+                        record(stage, dataset, scale, level,
+                               skipped(f"synthetic GeoJSON would be ~{file_mb:.0f} MB (> {MAX_SYNTHETIC_GEOJSON_MB} MB)"))
+                    continue
+
+                geojson_data = load_geojson(path)
+                if not real:
+                    geojson_data = tile_geojson(geojson_data, scale)
+                if "geojson_load" in stages:
+                    if real:
+                        geojson_path = path
+                    else:
+                        geojson_path = workdir / f"{spec['slug']}_{scale}x.geojson"
+                        with open(geojson_path, "w") as f:
+                            json.dump(geojson_data, f)
+                    record("geojson_load", dataset, scale, level, bench_geojson_load(geojson_path, repeat))
+                if "choropleth_html" in stages:
+                    df = _metric_frame(lad_df, level)
+                    record("choropleth_html", dataset, scale, level,
+                           bench_choropleth(geojson_data, df, spec["key_col"], spec["geojson_prop"],
+                                            "agencies_per_10k_70", repeat))
+                invalidate()
+
+            # Synthetic files of this scale are no longer needed
+            if not keep_data:
+                for path in workdir.glob(f"*_{scale}x.*"):
+                    path.unlink()
+    finally:
+        if not keep_data:
+            shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=Path(__file__).resolve().parent).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "pandas": pd.__version__,
+        "numpy": np.__version__,
+        "folium": folium.__version__,
+    }
+
+
+def _result_key(row: dict) -> tuple:
+    return row["stage"], row["dataset"], str(row["scale"]), row.get("variant") or ""
+
+
+def compare_to_baseline(results: list, baseline: dict, tolerance: float = 0.25, min_seconds: float = 0.05) -> list:
+    """
+    Regressions against a previous report: stages whose median time or peak memory grew by
+    more than `tolerance` (relative). Timings below min_seconds are too noisy and are ignored.
+    """
+    previous = {_result_key(row): row for row in baseline.get("results", []) if row.get("status") == "ok"}
+    regressions = []
+    for row in results:
+        old = previous.get(_result_key(row))
+        if row["status"] != "ok" or old is None:
+            continue
+        for field, floor in (("seconds", min_seconds), ("peak_mb", 1.0)):
+            if max(old[field], row[field]) >= floor and row[field] > old[field] * (1 + tolerance):
+                regressions.append({"stage": row["stage"], "dataset": row["dataset"], "scale": row["scale"],
+                                    "variant": row.get("variant"), "field": field,
+                                    "baseline": old[field], "current": row[field]})
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages and dashboard rendering.")
+    parser.add_argument("--scales", type=int, nargs="*", default=[10, 100],
+                        help="Synthetic data scale factors (the real data/ files are always benchmarked)")
+    parser.add_argument("--stages", nargs="*", default=STAGES, choices=STAGES)
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage (fewer for slow stages)")
+    parser.add_argument("--output", default=str(Path(__file__).resolve().parent.parent / "reports" / "benchmark.json"))
+    parser.add_argument("--baseline", help="Previous report: exit with status 1 on regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed relative slowdown vs the baseline")
+    parser.add_argument("--workdir", help="Where synthetic inputs are written (default: a temp directory)")
+    parser.add_argument("--keep-data", action="store_true", help="Keep the synthetic inputs")
+    args = parser.parse_args()
+
+    results = run_suite(args.scales, args.stages, args.repeat, args.workdir, args.keep_data)
+    report = {"version": REPORT_VERSION, "environment": environment(), "results": results}
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_to_baseline(results, json.load(f), args.tolerance)
+        report["baseline"] = {"path": args.baseline, "tolerance": args.tolerance, "regressions": regressions}
+
+    Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+    with open(args.output, "w") as f:
+        json.dump(report, f, indent=2)
+    print(f"Report written to {args.output}")
+
+    if regressions:
+        print(f"{len(regressions)} regression(s) vs {args.baseline}:")
+        for r in regressions:
+            print(f"  {r['stage']} {r['dataset']} {r['scale']}x {r['variant'] or ''}: "
+                  f"{r['field']} {r['baseline']} -> {r['current']}")
+        sys.exit(1)
@@ -0,0 +1,222 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+from config import CATALOG_DIR, DATASETS
+from data_cache import cached_by_files, file_sha256
+from instrumentation import instrumented
+
+# =============================
+# Dataset catalog
+# =============================
+# Every source in config.DATASETS is converted once into a typed Parquet file under
+# CATALOG_DIR. catalog.json records, per dataset, the source's size/mtime/SHA-256, the
+# row count and the schema. load() re-converts a dataset only when its source changed,
+# then reads just the requested columns (memory-mapped, no text parsing).
+
+MANIFEST_NAME = "catalog.json"
+# Bytes of CSV parsed per block while converting (bounds memory for large sources)
+CONVERT_BLOCK_SIZE = 64 << 20
+
+_MANIFEST_LOCK = threading.Lock()
+
+
+def manifest_path() -> str:
+    return os.path.join(CATALOG_DIR, MANIFEST_NAME)
+
+
+def read_manifest() -> dict:
+    """Catalog manifest: dataset name -> metadata (empty if nothing has been built)."""
+    try:
+        with open(manifest_path()) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def _temp_path(target: str) -> str:
+    """A new, uniquely named file next to target (concurrent builds never share one)."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target), prefix=f"{os.path.basename(target)}.",
+                                    suffix=".tmp")
+    os.close(fd)
+    return tmp_path
+
+
+def _write_manifest(manifest: dict):
+    os.makedirs(CATALOG_DIR, exist_ok=True)
+    tmp_path = _temp_path(manifest_path())
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path())
+
+
+def dataset_path(name: str) -> str:
+    """Parquet file of a dataset (may not exist yet, see ensure)."""
+    return os.path.join(CATALOG_DIR, f"{name}.parquet")
+
+
+def _open_csv(source: str, column_types: dict = None):
+    return pacsv.open_csv(
+        source,
+        read_options=pacsv.ReadOptions(block_size=CONVERT_BLOCK_SIZE),
+        convert_options=pacsv.ConvertOptions(column_types=column_types or {}, strings_can_be_null=True),
+    )
+
+
+def _convert_csv(source: str, target: str) -> pa.Schema:
+    """
+    Stream a CSV into Parquet one block at a time. Column types are inferred from the
+    first block; if a later block does not fit them, the file is converted again with
+    every column read as a string. Written to a temporary file of its own and moved into
+    place, so concurrent builds of the same dataset each publish a complete file.
+    """
+    tmp_target = _temp_path(target)
+    try:
+        try:
+            reader = _open_csv(source)
+            schema = reader.schema
+            with pq.ParquetWriter(tmp_target, schema) as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+        except pa.ArrowInvalid:
+            schema = _open_csv(source).schema
+            reader = _open_csv(source, {field.name: pa.string() for field in schema})
+            schema = reader.schema
+            with pq.ParquetWriter(tmp_target, schema) as writer:
+                for batch in reader:
+                    writer.write_batch(batch)
+        os.replace(tmp_target, target)
+    finally:
+        if os.path.exists(tmp_target):
+            os.remove(tmp_target)
+    return schema
+
+
+def build(name: str) -> dict:
+    """Convert one dataset from its source and record it in the manifest. Returns its metadata."""
+    source = DATASETS[name]
+    os.makedirs(CATALOG_DIR, exist_ok=True)
+    start = time.perf_counter()
+    stat = os.stat(source)
+    schema = _convert_csv(source, dataset_path(name))
+    meta = {
+        "source": os.path.abspath(source),
+        "source_size": stat.st_size,
+        "source_mtime_ns": stat.st_mtime_ns,
+        "source_sha256": file_sha256(source),
+        "rows": pq.ParquetFile(dataset_path(name)).metadata.num_rows,
+        "schema": {field.name: str(field.type) for field in schema},
+        "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "build_seconds": round(time.perf_counter() - start, 3),
+    }
+    with _MANIFEST_LOCK:
+        manifest = read_manifest()
+        manifest[name] = meta
+        _write_manifest(manifest)
+    return meta
+
+
+def is_current(name: str, manifest: dict = None) -> bool:
+    """True when the dataset has been built from the current version of its source."""
+    meta = (read_manifest() if manifest is None else manifest).get(name)
+    if meta is None or not os.path.exists(dataset_path(name)):
+        return False
+    source = DATASETS[name]
+    if meta["source"] != os.path.abspath(source):
+        return False
+    stat = os.stat(source)
+    if stat.st_size != meta["source_size"]:
+        return False
+    if stat.st_mtime_ns == meta["source_mtime_ns"]:
+        return True
+    # Same size, touched since the build: only the content hash can tell
+    if file_sha256(source) != meta["source_sha256"]:
+        return False
+    # Unchanged content: record the new mtime so later calls skip the hash
+    with _MANIFEST_LOCK:
+        manifest = read_manifest()
+        if name in manifest and manifest[name]["source_sha256"] == meta["source_sha256"]:
+            manifest[name]["source_mtime_ns"] = stat.st_mtime_ns
+            _write_manifest(manifest)
+    return True
+
+
+def ensure(name: str) -> str:
+    """Build the dataset if it is missing or stale; return its Parquet path."""
+    if name not in DATASETS:
+        raise KeyError(f"Unknown dataset {name!r}. Known: {sorted(DATASETS)}")
+    if not is_current(name):
+        build(name)
+    return dataset_path(name)
+
+
+@cached_by_files("path")
+def _read(path: str, columns: tuple, as_category: bool) -> pd.DataFrame:
+    table = pq.read_table(path, columns=list(columns) if columns else None, memory_map=True)
+    if as_category:
+        table = pa.table({
+            field.name: (col.dictionary_encode() if pa.types.is_string(field.type) else col)
+            for field, col in zip(table.schema, table.columns)
+        })
+    return table.to_pandas()
+
+
+@instrumented("catalog.load")
+def load(name: str, columns=None, as_category: bool = False) -> pd.DataFrame:
+    """
+    Load a catalogued dataset, reading only `columns` (all if None).
+
+    String columns come back as object strings, or as pandas categoricals with
+    as_category=True. The frame is cached and shared: copy before mutating.
+    """
+    return _read(ensure(name), tuple(columns) if columns else None, as_category)
+
+
+def iter_batches(name: str, columns=None, batch_size: int = 250_000):
+    """Yield a dataset as pandas frames of up to batch_size rows (for sources too large to load whole)."""
+    parquet_file = pq.ParquetFile(ensure(name), memory_map=True)
+    for batch in parquet_file.iter_batches(batch_size=batch_size, columns=list(columns) if columns else None):
+        yield batch.to_pandas()
+
+
+def dataset_for_source(source: str):
+    """Name of the dataset built from a given source file, or None if it is not catalogued."""
+    source = os.path.abspath(source)
+    for name, path in DATASETS.items():
+        if os.path.abspath(path) == source:
+            return name
+    return None
+
+
+def schema(name: str) -> dict:
+    """Column name -> Arrow type of a dataset, from the manifest."""
+    ensure(name)
+    return read_manifest()[name]["schema"]
+
+
+def build_all(names=None) -> dict:
+    """Convert every (or the given) dataset whose source exists. Returns name -> metadata."""
+    built = {}
+    for name in names or DATASETS:
+        if not os.path.exists(DATASETS[name]):
+            print(f"Skipping {name}: source not found ({DATASETS[name]})")
+            continue
+        built[name] = build(name) if not is_current(name) else read_manifest()[name]
+    return built
+
+
+if __name__ == "__main__":
+    for name, meta in build_all().items():
+        parquet_bytes = os.path.getsize(dataset_path(name))
+        print(f"{name:<20} {meta['rows']:>9} rows  {meta['source_size'] / 1e6:8.2f} MB CSV -> "
+              f"{parquet_bytes / 1e6:8.2f} MB Parquet  ({len(meta['schema'])} columns)")
@@ -0,0 +1,215 @@
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+from config import CATCHMENT_RADII_KM, HOMECARE_AGENCIES, LSOA_CENTROIDS
+from data_cache import cached_by_files
+from frame_schema import compact_frame
+from instrumentation import instrumented
+
+# =============================
+# Catchment supply engine
+# =============================
+# Agencies per 10k within a LAD ignore that people near a boundary are served from the
+# other side of it. Here supply is counted around each LSOA's population-weighted centroid:
+# every agency within r km, for several radii, optionally weighted by its CQC rating.
+#
+# Points are in British National Grid metres (planar distances are accurate to well under
+# 1% across England and Wales). Agencies are hashed into square cells as wide as the
+# largest radius, so every agency within that radius of an LSOA lies in the 3 x 3 cells
+# around the LSOA's own cell. Candidate pairs are found with one searchsorted over the
+# sorted cell keys and expanded with np.repeat, then all radii are counted from the same
+# squared distances with np.bincount. There is no loop over LSOAs or agencies: the work is
+# proportional to the candidate pairs, done a chunk of LSOAs at a time to bound memory.
+
+BNG_CRS = "EPSG:27700"
+# Weight of an agency in the weighted counts, by CQC rating (unrated and unknown: "Not Rated")
+RATING_WEIGHTS = {"Outstanding": 1.0, "Good": 1.0, "Requires Improvement": 0.5, "Inadequate": 0.0,
+                  "Not Rated": 0.5}
+# LSOAs per chunk: bounds the candidate pairs held at once (dense cities have ~1k candidates per LSOA)
+CATCHMENT_CHUNK = 2048
+
+
+def _cell_keys(cx: np.ndarray, cy: np.ndarray) -> np.ndarray:
+    # Cell indices are small (hundreds across Great Britain): pack them into one int64
+    return cx.astype(np.int64) * (1 << 32) + cy.astype(np.int64)
+
+
+def grid_counts(targets: np.ndarray, points: np.ndarray, radii, weights: np.ndarray = None,
+                chunk: int = CATCHMENT_CHUNK) -> np.ndarray:
+    """
+    (n, len(radii)) sums of point weights (1 without weights) within each radius of each
+    target; targets (n, 2) and points (m, 2) in the same planar units as radii.
+    """
+    radii = np.asarray(radii, dtype=float)
+    targets = np.asarray(targets, dtype=float)
+    points = np.asarray(points, dtype=float)
+    weights = np.ones(len(points)) if weights is None else np.asarray(weights, dtype=float)
+    out = np.zeros((len(targets), len(radii)))
+    if len(targets) == 0 or len(points) == 0:
+        return out
+
+    cell = radii.max()
+    point_cells = np.floor(points / cell).astype(np.int64)
+    order = np.argsort(_cell_keys(point_cells[:, 0], point_cells[:, 1]), kind="stable")
+    points, weights = points[order], weights[order]
+    sorted_keys = _cell_keys(point_cells[order, 0], point_cells[order, 1])
+    radii_sq = radii ** 2
+
+    offsets = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)])
+    for start in range(0, len(targets), chunk):
+        block = targets[start:start + chunk]
+        cells = np.floor(block / cell).astype(np.int64)
+        # (len(block) * 9) neighbouring cells and their runs of points in sorted_keys
+        keys = _cell_keys((cells[:, None, 0] + offsets[:, 0]).ravel(), (cells[:, None, 1] + offsets[:, 1]).ravel())
+        lo = np.searchsorted(sorted_keys, keys, side="left")
+        sizes = np.searchsorted(sorted_keys, keys, side="right") - lo
+        total = int(sizes.sum())
+        if total == 0:
+            continue
+        target_idx = np.repeat(np.arange(len(keys)) // len(offsets), sizes)
+        run_starts = np.repeat(lo - (np.cumsum(sizes) - sizes), sizes)
+        point_idx = run_starts + np.arange(total)
+
+        d = block[target_idx] - points[point_idx]
+        d_sq = np.einsum("ij,ij->i", d, d)
+        w = weights[point_idx]
+        for k, r_sq in enumerate(radii_sq):
+            inside = d_sq <= r_sq
+            out[start:start + len(block), k] = np.bincount(target_idx[inside], weights=w[inside],
+                                                           minlength=len(block))
+    return out
+
+
+def to_bng(lat: np.ndarray, lon: np.ndarray):
+    """WGS84 latitude/longitude -> British National Grid (x, y) in metres."""
+    from pyproj import Transformer  # only needed for exports carrying WGS84 coordinates
+    return Transformer.from_crs("EPSG:4326", BNG_CRS, always_xy=True).transform(
+        np.asarray(lon, dtype=float), np.asarray(lat, dtype=float))
+
+
+@cached_by_files("centroids_csv")
+def load_lsoa_centroids(centroids_csv: str = LSOA_CENTROIDS) -> pd.DataFrame:
+    """LSOA population-weighted centroids: [LSOA21CD, x, y] in British National Grid metres."""
+    df = pd.read_csv(centroids_csv, usecols=lambda c: c in ("LSOA21CD", "x", "y"))
+    return df[["LSOA21CD", "x", "y"]].astype({"x": float, "y": float})
+
+
+def agency_points(agencies: pd.DataFrame, centroids: pd.DataFrame) -> pd.DataFrame:
+    """
+    Location and rating weight of each agency of a postcode-level CQC frame (see
+    CQCPostCodeLADMapping.geocode_agencies): its own coordinates when the export has them,
+    else the centroid of its postcode's LSOA. Agencies with neither are dropped.
+    Returns [x, y, weight, located_by].
+    """
+    from location_geocoder import coordinate_columns
+
+    x = np.full(len(agencies), np.nan)
+    y = np.full(len(agencies), np.nan)
+    located_by = np.full(len(agencies), None, dtype=object)
+    coords = coordinate_columns(agencies)
+    if coords is not None:
+        lat = pd.to_numeric(agencies[coords[0]], errors="coerce").to_numpy()
+        lon = pd.to_numeric(agencies[coords[1]], errors="coerce").to_numpy()
+        has = np.isfinite(lat) & np.isfinite(lon)
+        x[has], y[has] = to_bng(lat[has], lon[has])
+        located_by[has] = "coordinates"
+    if "lsoa21cd" in agencies.columns:
+        by_code = centroids.set_index("LSOA21CD")[["x", "y"]]
+        pos = by_code.index.get_indexer(agencies["lsoa21cd"].astype(object))
+        fill = np.isnan(x) & (pos >= 0)
+        x[fill] = by_code["x"].to_numpy()[pos[fill]]
+        y[fill] = by_code["y"].to_numpy()[pos[fill]]
+        located_by[fill] = "lsoa_centroid"
+
+    rating = agencies["CQC_Rating"] if "CQC_Rating" in agencies.columns else pd.Series(None, index=agencies.index)
+    weight = rating.astype(object).map(RATING_WEIGHTS).fillna(RATING_WEIGHTS["Not Rated"]).to_numpy(dtype=float)
+    located = ~np.isnan(x)
+    return pd.DataFrame({"x": x[located], "y": y[located], "weight": weight[located],
+                         "located_by": located_by[located]})
+
+
+def catchment_columns(radii_km=CATCHMENT_RADII_KM, weighted: bool = True) -> list:
+    """Column names of catchment_supply for the given radii."""
+    cols = [f"agencies_within_{r:g}km" for r in radii_km]
+    if weighted:
+        cols += [f"weighted_agencies_within_{r:g}km" for r in radii_km]
+    return cols
+
+
+@instrumented()
+def catchment_supply(agencies: pd.DataFrame, centroids: pd.DataFrame = None, radii_km=CATCHMENT_RADII_KM,
+                     weighted: bool = True) -> pd.DataFrame:
+    """
+    Agencies around every LSOA's population-weighted centroid, per radius:
+    [LSOA21CD, agencies_within_<r>km..., weighted_agencies_within_<r>km... (rating-weighted,
+    see RATING_WEIGHTS)]. agencies is a postcode-level CQC frame (see agency_points).
+    """
+    centroids = load_lsoa_centroids() if centroids is None else centroids
+    points = agency_points(agencies, centroids)
+    targets = centroids[["x", "y"]].to_numpy()
+    radii_m = np.asarray(radii_km, dtype=float) * 1000
+    xy = points[["x", "y"]].to_numpy()
+
+    out = pd.DataFrame({"LSOA21CD": centroids["LSOA21CD"].to_numpy()})
+    counts = grid_counts(targets, xy, radii_m)
+    columns = catchment_columns(radii_km, weighted)
+    for k in range(len(radii_km)):
+        out[columns[k]] = counts[:, k]
+    if weighted:
+        weighted_counts = grid_counts(targets, xy, radii_m, points["weight"].to_numpy())
+        for k in range(len(radii_km)):
+            out[columns[len(radii_km) + k]] = weighted_counts[:, k]
+    return compact_frame(out, count_cols=columns[:len(radii_km)])
+
+
+def brute_force_counts(targets: np.ndarray, points: np.ndarray, radii) -> np.ndarray:
+    """O(n * m) reference for grid_counts (small inputs only)."""
+    d_sq = ((targets[:, None, :] - points[None, :, :]) ** 2).sum(axis=2)
+    return np.stack([(d_sq <= r ** 2).sum(axis=1) for r in radii], axis=1).astype(float)
+
+
+def synthetic_benchmark(n_lsoas: int = 35_000, n_agencies: int = 10_000, radii_km=CATCHMENT_RADII_KM,
+                        seed: int = 0) -> dict:
+    """
+    Time grid_counts on synthetic points clustered like English towns (a few hundred
+    Gaussian clusters over a 500 x 600 km box), and check a sample against brute force.
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.uniform([100_000, 50_000], [600_000, 650_000], size=(300, 2))
+
+    def clustered(n):
+        return centres[rng.integers(0, len(centres), n)] + rng.normal(0, 8_000, size=(n, 2))
+
+    targets, points = clustered(n_lsoas), clustered(n_agencies)
+    radii_m = np.asarray(radii_km, dtype=float) * 1000
+    start = time.perf_counter()
+    counts = grid_counts(targets, points, radii_m)
+    seconds = time.perf_counter() - start
+    sample = rng.choice(n_lsoas, size=min(500, n_lsoas), replace=False)
+    return {"lsoas": n_lsoas, "agencies": n_agencies, "radii_km": list(radii_km), "seconds": round(seconds, 3),
+            "matches_brute_force": bool(np.array_equal(counts[sample], brute_force_counts(targets[sample], points,
+                                                                                          radii_m)))}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Count agencies within catchment radii of every LSOA.")
+    parser.add_argument("agencies_csv", nargs="?", help="Postcode-level CQC file (default: the current export's)")
+    parser.add_argument("--radii", type=float, nargs="+", default=list(CATCHMENT_RADII_KM), help="Radii in km")
+    parser.add_argument("--benchmark", action="store_true", help="Time the engine on synthetic points instead")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        print(synthetic_benchmark(radii_km=args.radii))
+    else:
+        from CQCPostCodeLADMapping import output_paths
+        agencies_csv = args.agencies_csv or output_paths(HOMECARE_AGENCIES)["postcodes"]
+        start = time.perf_counter()
+        supply = catchment_supply(pd.read_csv(agencies_csv), radii_km=args.radii)
+        print(f"{len(supply)} LSOAs in {time.perf_counter() - start:.2f} s")
+        print(supply.describe().round(1).to_string())
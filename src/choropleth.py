@@ -0,0 +1,228 @@
+import json
+
+import numpy as np
+import pandas as pd
+import folium
+from branca.colormap import StepColormap
+from branca.element import MacroElement
+from branca.utilities import color_brewer
+from folium.plugins import VectorGridProtobuf
+from folium.utilities import JsCode
+from jinja2 import Template
+
+from instrumentation import instrumented
+from geojson_payload import DELTA_MEMBER
+
+# =============================
+# Single-layer choropleth
+# =============================
+# folium.Choropleth plus one folium.GeoJson per feature for the tooltip serialises
+# every geometry twice and looks each area up in the frame with a linear scan.
+# Here the metric is joined onto the feature properties in one pass and a single
+# GeoJson layer carries fill colour, border and tooltip.
+
+TOOLTIP_PROP = "tooltip"
+
+
+def join_metric_to_features(geojson_data: dict, df: pd.DataFrame, key_col: str, geojson_prop: str,
+                            metric_col: str) -> tuple:
+    """
+    Join df[metric_col] onto the GeoJSON features by df[key_col] == properties[geojson_prop].
+
+    Returns (feature_collection, values): a new FeatureCollection whose features carry
+    only the join key, the metric value and a "name: value" tooltip string in their
+    properties, and the joined values as a float array aligned with the features (NaN
+    where unmatched). Geometries are shared with geojson_data, not copied.
+    """
+    features = geojson_data["features"]
+    names = pd.Series([f["properties"].get(geojson_prop) for f in features], dtype=object)
+    lookup = df.drop_duplicates(subset=key_col).set_index(key_col)[metric_col]
+    values = pd.to_numeric(names.map(lookup), errors="coerce")
+
+    tooltips = names.fillna("").astype(str) + ": " + values.fillna(0).map("{:.2f}".format)
+    # float32 metrics widen to float with extra digits (12.3 -> 12.300000190734863): keep the short form
+    properties = values.astype(str).astype(float) if values.dtype == np.float32 else values
+
+    joined = [
+        {
+            "type": "Feature",
+            "id": str(i),
+            "properties": {geojson_prop: name, metric_col: None if pd.isna(value) else float(value),
+                           TOOLTIP_PROP: tooltip},
+            "geometry": feature["geometry"],
+        }
+        for i, (feature, name, value, tooltip) in enumerate(zip(features, names, properties, tooltips))
+    ]
+    feature_collection = {"type": "FeatureCollection", "features": joined}
+    if DELTA_MEMBER in geojson_data:
+        feature_collection[DELTA_MEMBER] = geojson_data[DELTA_MEMBER]
+    return feature_collection, values.to_numpy(dtype=float)
+
+
+def step_colormap(values: np.ndarray, fill_color: str = "Reds", bins: int = 6, legend_name: str = ""):
+    """
+    Binned ColorBrewer colormap over the non-NaN values (same binning as folium.Choropleth).
+    Returns (colormap, bin_edges, colors).
+    """
+    real_values = values[~np.isnan(values)]
+    if real_values.size == 0:
+        real_values = np.array([0.0])
+    _, bin_edges = np.histogram(real_values, bins=bins)
+    colors = color_brewer(fill_color, n=len(bin_edges) - 1)
+    colormap = StepColormap(colors, index=bin_edges, vmin=bin_edges[0], vmax=bin_edges[-1], caption=legend_name)
+    return colormap, bin_edges, colors
+
+
+def fill_colors(values: np.ndarray, bin_edges: np.ndarray, colors: list, nan_fill_color: str = "black") -> np.ndarray:
+    """Vectorised value -> bin colour lookup; NaN values get nan_fill_color."""
+    edges = bin_edges.astype(float).copy()
+    # Make the last bin right-inclusive, as folium.Choropleth does
+    edges[-1] = np.nextafter(edges[-1], np.inf)
+    idx = np.clip(np.digitize(values, edges, right=False) - 1, 0, len(colors) - 1)
+    out = np.asarray(colors, dtype=object)[idx]
+    out[np.isnan(values)] = nan_fill_color
+    return out
+
+
+def delta_decoder(precision: int) -> JsCode:
+    """
+    Leaflet coordsToLatLng option decoding delta-encoded rings: an [x, y, 0] position
+    starts a ring, each [dx, dy] after it is a step, all in units of 10^-precision degrees.
+    Leaflet converts the coordinates of a feature in order, so a running position suffices.
+    """
+    return JsCode(f"""(function () {{
+        var x = 0, y = 0;
+        return function (c) {{
+            if (c.length > 2) {{ x = c[0]; y = c[1]; }} else {{ x += c[0]; y += c[1]; }}
+            return L.latLng(y / {10 ** precision}, x / {10 ** precision});
+        }};
+    }})()""")
+
+
+@instrumented()
+def add_choropleth(m: folium.Map, geojson_data: dict, df: pd.DataFrame, key_col: str, geojson_prop: str,
+                   metric_col: str, legend_name: str = None, fill_color: str = "Reds", fill_opacity: float = 0.7,
+                   line_opacity: float = 0.2, nan_fill_color: str = "black", bins: int = 6) -> folium.GeoJson:
+    """
+    Add a choropleth of df[metric_col] with a hover tooltip to the map, as a single GeoJson layer.
+
+    key_col: area name column in df; geojson_prop: matching property in the features.
+    geojson_data may be delta-encoded (see src/geojson_payload.py); it is decoded in the browser.
+    """
+    legend_name = metric_col if legend_name is None else legend_name
+    feature_collection, values = join_metric_to_features(geojson_data, df, key_col, geojson_prop, metric_col)
+    colormap, bin_edges, colors = step_colormap(values, fill_color=fill_color, bins=bins, legend_name=legend_name)
+    feature_fill = dict(zip((f["id"] for f in feature_collection["features"]),
+                            fill_colors(values, bin_edges, colors, nan_fill_color)))
+    options = {}
+    if DELTA_MEMBER in feature_collection:
+        options["coordsToLatLng"] = delta_decoder(feature_collection[DELTA_MEMBER])
+
+    layer = folium.GeoJson(
+        feature_collection,
+        name="choropleth",
+        style_function=lambda feature: {
+            "fillColor": feature_fill[feature["id"]],
+            "fillOpacity": fill_opacity,
+            "color": "black",
+            "weight": 0.5,
+            "opacity": line_opacity,
+        },
+        highlight_function=lambda feature: {"weight": 2, "opacity": 1},
+        tooltip=folium.GeoJsonTooltip(fields=[TOOLTIP_PROP], labels=False),
+        **options,
+    )
+    layer.add_to(m)
+    colormap.add_to(m)
+    return layer
+
+
+
+# =============================
+# Vector-tile choropleth
+# =============================
+# Same colouring, but the geometry comes from the local tile server (src/tile_server.py)
+# one viewport at a time. Only an area key -> [fill colour, tooltip] table is embedded in
+# the page; the tiles are styled from it client-side.
+
+class _VectorTileLookup(MacroElement):
+    """Area key -> [fill colour, tooltip] table shared by the style function and the tooltip."""
+
+    _template = Template("""
+        {% macro script(this, kwargs) -%}
+        var {{ this.get_name() }} = {{ this.lookup }};
+        {%- endmacro %}
+    """)
+
+    def __init__(self, lookup: dict):
+        super().__init__()
+        self._name = "VectorTileLookup"
+        self.lookup = json.dumps(lookup)
+
+
+class _VectorTileTooltip(MacroElement):
+    """Hover tooltip and highlight for a VectorGrid layer."""
+
+    _template = Template("""
+        {% macro script(this, kwargs) -%}
+        {{ this.layer.get_name() }}.on("mouseover", function (e) {
+            var entry = {{ this.lookup.get_name() }}[e.layer.properties[{{ this.key_prop }}]];
+            if (!entry) { return; }
+            {{ this.layer.get_name() }}.setFeatureStyle(e.layer.properties.code, {
+                fill: true, fillColor: entry[0], fillOpacity: {{ this.fill_opacity }}, color: "black",
+                weight: 2, opacity: 1});
+            {{ this.layer.get_name() }}.bindTooltip(entry[1], {sticky: true}).openTooltip(e.latlng);
+        });
+        {{ this.layer.get_name() }}.on("mouseout", function (e) {
+            {{ this.layer.get_name() }}.resetFeatureStyle(e.layer.properties.code);
+            {{ this.layer.get_name() }}.closeTooltip().unbindTooltip();
+        });
+        {%- endmacro %}
+    """)
+
+    def __init__(self, layer, lookup: _VectorTileLookup, key_prop: str, fill_opacity: float):
+        super().__init__()
+        self.layer, self.lookup, self.fill_opacity = layer, lookup, fill_opacity
+        self.key_prop = json.dumps(key_prop)
+
+
+@instrumented()
+def add_vector_choropleth(m: folium.Map, tile_url: str, layer_name: str, df: pd.DataFrame, key_col: str,
+                          metric_col: str, legend_name: str = None, fill_color: str = "Reds",
+                          fill_opacity: float = 0.7, line_opacity: float = 0.2, nan_fill_color: str = "black",
+                          bins: int = 6, max_native_zoom: int = None, key_prop: str = "name") -> VectorGridProtobuf:
+    """
+    Add a choropleth of df[metric_col] drawn from vector tiles (see src/vector_tiles.py).
+
+    tile_url: {z}/{x}/{y} template of the tiles; layer_name: MVT layer inside them;
+    key_col: area column in df matched against the tile feature property key_prop.
+    Tiles past max_native_zoom are overzoomed from the deepest level built.
+    """
+    legend_name = metric_col if legend_name is None else legend_name
+    data = df.drop_duplicates(subset=key_col)
+    values = pd.to_numeric(data[metric_col], errors="coerce").to_numpy(dtype=float)
+    colormap, bin_edges, colors = step_colormap(values, fill_color=fill_color, bins=bins, legend_name=legend_name)
+    names = data[key_col].astype(str).to_numpy()
+    lookup = _VectorTileLookup({
+        name: [color, f"{name}: {0 if np.isnan(value) else value:.2f}"]
+        for name, value, color in zip(names, values, fill_colors(values, bin_edges, colors, nan_fill_color))
+    })
+    m.add_child(lookup)
+
+    options = f"""{{
+        "interactive": true,
+        "maxNativeZoom": {json.dumps(max_native_zoom)},
+        "getFeatureId": function (f) {{ return f.properties.code; }},
+        "vectorTileLayerStyles": {{
+            {json.dumps(layer_name)}: function (properties) {{
+                var entry = {lookup.get_name()}[properties[{json.dumps(key_prop)}]];
+                return {{fill: true, fillColor: entry ? entry[0] : {json.dumps(nan_fill_color)},
+                         fillOpacity: {fill_opacity}, color: "black", weight: 0.5, opacity: {line_opacity}}};
+            }}
+        }}
+    }}"""
+    layer = VectorGridProtobuf(tile_url, "choropleth", options)
+    layer.add_to(m)
+    m.add_child(_VectorTileTooltip(layer, lookup, key_prop, fill_opacity))
+    colormap.add_to(m)
+    return layer
@@ -17,8 +17,13 @@ LAD_GEOJSON = f"{BASE_DIR}/LAD_MAY_2025_UK_BGC_V2_1110015208521213948.geojson"
 REGION_GEOJSON = f"{BASE_DIR}/European_Electoral_Regions_Dec_2017_UK_BSC_2022_2476479127562833087.geojson"
 # COUNTY_GEOJSON = f"{BASE_DIR}/Counties_December_2024_Boundaries_EN_BFC_-3795571296904775948.geojson"
 COUNTY_GEOJSON = f"{BASE_DIR}/Counties_and_Unitary_Authorities_December_2023_Boundaries_UK_BSC_4952317392296043005.geojson"
+LAD_SHAPEFILE = f"{BASE_DIR}/Local_Authority_Districts_(May_2025)_Boundaries_UK_BSC_(V2)/Local_Authority_Districts_(May_2025)_Boundaries_UK_BSC_(V2).shp"
 LAD_POP_CSV = f"{BASE_DIR}/PopulationStatsByLADDetail.csv"
 LAD_POP_CSV_AGG = f"{BASE_DIR}/PopulationStatsByLADDetail_aggregated.csv"
+# LSOA-level census population (written by src/populationLADFix.py)
+LSOA_POP = f"{BASE_DIR}/PopulationStatsByLADDetail_lsoa.parquet"
+# ONS LSOA (Dec 2021) population-weighted centroids: LSOA21CD, x, y (British National Grid)
+LSOA_CENTROIDS = f"{BASE_DIR}/LSOA_Dec_2021_PWC_for_England_and_Wales.csv"
 LAD_TO_REGION_MAPPING = f"{BASE_DIR}/Local_Authority_District_to_Region_(December_2023)_Lookup_in_England.csv"
 LAD_TO_COUNTY_MAPPING = f"{BASE_DIR}/Local_Authority_District_to_County_and_Unitary_Authority_(April_2023)_Lookup_in_EW.csv"
 MASTER_MAPPING = f"{BASE_DIR}/Ward_to_Local_Authority_District_to_County_to_Region_to_Country_(May_2023)_Lookup_in_United_Kingdom.csv"
@@ -27,6 +32,48 @@ POSTCODE_MAPPING = f"{BASE_DIR}/PCD_OA21_LSOA21_MSOA21_LAD_MAY25_UK_LU.csv"
 # HOMECARE_AGENCIES = f"{BASE_DIR}/HomeCareAgencies_data (08-09-2025)(ALL_RATINGS).csv"
 HOMECARE_AGENCIES = f"{BASE_DIR}/HomeCareAgencies_data (08-09-2025)(ALL_CQC_RATINGS).csv"
 HOMECARE_AGENCIES_BY_LAD = f"{BASE_DIR}/HomeCareAgencies_data (08-09-2025)(ALL_CQC_RATINGS)_LAD_CQC_counts.csv"
+# Precomputed LAD/County/Region/Country x metric table (built by src/metrics_cube.py)
+METRICS_CUBE = f"{BASE_DIR}/metrics_cube.parquet"
+# Dated LAD x rating counts of every CQC export (src/snapshot_store.py), one partition per snapshot
+SNAPSHOT_DIR = f"{BASE_DIR}/snapshots"
+# Prepared dashboard state for fast cold starts (written by src/dashboard_state.py)
+DASHBOARD_STATE = f"{BASE_DIR}/dashboard_state.pkl"
+# Threads reading the startup inputs concurrently when the prepared state is stale (src/dashboard_state.py)
+STARTUP_WORKERS = 4
+# Centroids, label points, bounding boxes and areas per map area (built by src/area_index.py)
+AREA_INDEX = f"{BASE_DIR}/area_index.parquet"
+# Typed columnar copies of the CSV inputs (built by src/catalog.py): dataset name -> source file
+CATALOG_DIR = f"{BASE_DIR}/catalog"
+DATASETS = {
+    "lad_population": LAD_POP_CSV_AGG,
+    "cqc_lad_counts": HOMECARE_AGENCIES_BY_LAD,
+    "lad_to_region": LAD_TO_REGION_MAPPING,
+    "lad_to_county": LAD_TO_COUNTY_MAPPING,
+    "master_mapping": MASTER_MAPPING,
+    "lsoa_to_ward_lad": WARD_TO_LAD_MAPPING,
+    "postcode_directory": POSTCODE_MAPPING,
+}
+# Simplified boundaries per level and tolerance (built by src/simplify_geometry.py)
+SIMPLIFIED_DIR = f"{BASE_DIR}/simplified"
+# Simplification tolerance in metres (British National Grid) by minimum map zoom level
+SIMPLIFY_TOLERANCES = {0: 2000, 7: 500, 9: 100, 11: 25}
+# Map payload shaping (src/geojson_payload.py): coordinate decimals (5 ~ 1 m) and integer delta encoding
+PAYLOAD_PRECISION = 5
+PAYLOAD_DELTA = False
+# Drill-down geometry store (src/drilldown.py): child boundaries partitioned by parent area,
+# simplified for this map zoom
+DRILLDOWN_DIR = f"{BASE_DIR}/drilldown"
+DRILLDOWN_ZOOM = 7
+# Catchment radii (km) around each LSOA's population-weighted centroid (src/catchment.py)
+CATCHMENT_RADII_KM = (2, 5, 10)
+# Boundary vector tiles (built by src/vector_tiles.py, served by src/tile_server.py)
+TILES_DIR = f"{BASE_DIR}/tiles"
+VECTOR_TILE_ZOOMS = (4, 10)
+VECTOR_TILE_EXTENT = 4096
+TILE_SERVER_HOST = "127.0.0.1"
+TILE_SERVER_PORT = 8765
+# Per-stage timings of dashboard reruns, one JSON line per run (src/instrumentation.py); None disables
+STAGE_LOG = os.path.join(os.path.dirname(__file__), "../logs/dashboard_stages.jsonl")
 # =============================
 # Map settings
 # =============================
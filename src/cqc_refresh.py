@@ -0,0 +1,172 @@
+import argparse
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+from config import POSTCODE_MAPPING, HOMECARE_AGENCIES
+from CQCPostCodeLADMapping import (POSTCODE_LOOKUP_COLS, geocode_agencies, rating_counts, lad_outputs_from_counts,
+                                   counts_from_lad_outputs, output_paths)
+from location_geocoder import resolve_unmatched
+from snapshot_store import append_lad_outputs
+
+# =============================
+# Incremental CQC snapshot refresh
+# =============================
+# A new CQC export is diffed against the previous (already geocoded) one by agency key.
+# Only new agencies and agencies whose postcode changed go through the postcode lookup,
+# and the stored LAD x rating counts are updated with +1/-1 deltas, so the cost of a
+# refresh follows the churn between snapshots rather than the size of the register.
+
+# Preferred agency identifiers, in order; Name + Postcode is the fallback
+AGENCY_KEY_CANDIDATES = [["Location ID"], ["Location_ID"], ["CQC_ID"]]
+FALLBACK_AGENCY_KEY = ["Name", "Postcode"]
+
+# Geocoded columns carried over from the previous snapshot for unchanged agencies
+# (geocode_method: 'postcode', 'location' or NaN, as written by resolve_unmatched)
+GEO_COLS = POSTCODE_LOOKUP_COLS + ["geocode_method"]
+
+
+def agency_key(cqc: pd.DataFrame) -> list:
+    """Columns identifying an agency across snapshots."""
+    for candidate in AGENCY_KEY_CANDIDATES:
+        if all(c in cqc.columns for c in candidate):
+            return candidate
+    return FALLBACK_AGENCY_KEY
+
+
+def _with_row_key(df: pd.DataFrame, key: list) -> pd.DataFrame:
+    """Add a unique '_key' column: the agency key plus an occurrence number for duplicate keys."""
+    df = df.copy()
+    parts = [df[c].astype("string").str.upper().str.strip().fillna("") for c in key]
+    base = parts[0].str.cat(parts[1:], sep="|") if len(parts) > 1 else parts[0]
+    df["_key"] = base + "#" + df.groupby(base.to_numpy()).cumcount().astype(str)
+    return df
+
+
+def diff_snapshots(previous_geo: pd.DataFrame, new_cqc: pd.DataFrame, key: list = None) -> dict:
+    """
+    Classify agencies between two snapshots.
+
+    Returns a dict of frames, all with a '_key' column. From previous_geo: 'removed',
+    'moved_old', 'changed_old' and 'unchanged_old' (everything not removed or moved).
+    From new_cqc: 'added', 'moved' and 'changed_new'. Moved agencies have a different
+    postcode; changed agencies keep their postcode but have a different rating.
+    """
+    key = agency_key(new_cqc) if key is None else key
+    old = _with_row_key(previous_geo, key)
+    new = _with_row_key(new_cqc, key)
+
+    old_pc = old["Postcode"].astype("string").str.upper().str.replace(r"\s+", "", regex=True)
+    new_pc = new["Postcode"].astype("string").str.upper().str.replace(r"\s+", "", regex=True)
+    old_state = pd.DataFrame({"_key": old["_key"], "pc_old": old_pc, "rating_old": old["CQC_Rating"]})
+    new_state = pd.DataFrame({"_key": new["_key"], "pc_new": new_pc, "rating_new": new["CQC_Rating"]})
+    joined = old_state.merge(new_state, on="_key", how="outer", indicator=True)
+
+    both = joined["_merge"] == "both"
+    moved = both & (joined["pc_old"].fillna("") != joined["pc_new"].fillna(""))
+    rerated = both & ~moved & (joined["rating_old"].fillna("") != joined["rating_new"].fillna(""))
+
+    removed_keys = joined.loc[joined["_merge"] == "left_only", "_key"]
+    added_keys = joined.loc[joined["_merge"] == "right_only", "_key"]
+    moved_keys = joined.loc[moved, "_key"]
+    rerated_keys = joined.loc[rerated, "_key"]
+
+    return {
+        "removed": old[old["_key"].isin(removed_keys)],
+        "moved_old": old[old["_key"].isin(moved_keys)],
+        "changed_old": old[old["_key"].isin(rerated_keys)],
+        "added": new[new["_key"].isin(added_keys)],
+        "moved": new[new["_key"].isin(moved_keys)],
+        "changed_new": new[new["_key"].isin(rerated_keys)],
+        "unchanged_old": old[~old["_key"].isin(removed_keys) & ~old["_key"].isin(moved_keys)],
+    }
+
+
+def incremental_refresh(new_csv: str, previous_csv: str, mapping_csv: str = POSTCODE_MAPPING) -> dict:
+    """
+    Refresh the geocoded agencies and LAD aggregates for new_csv, starting from the saved
+    outputs of previous_csv (its *_postcodes and *_LAD_CQC_counts files).
+
+    Returns the new frames and a summary of the churn; nothing is written.
+    """
+    previous_paths = output_paths(previous_csv)
+    previous_geo = pd.read_csv(previous_paths["postcodes"])
+    if "geocode_method" not in previous_geo.columns:
+        # Outputs from before the location fallback: every matched agency was matched by postcode
+        previous_geo["geocode_method"] = previous_geo["ladnm"].notna().map({True: "postcode", False: None})
+    previous_counts = counts_from_lad_outputs(pd.read_csv(previous_paths["lad_cqc"]))
+    new_cqc = pd.read_csv(new_csv)
+
+    diff = diff_snapshots(previous_geo, new_cqc)
+
+    # Only new and moved agencies need the postcode directory
+    to_geocode = pd.concat([diff["added"], diff["moved"]], ignore_index=True)
+    new_cols = list(new_cqc.columns)
+    recovered = 0
+    if len(to_geocode):
+        if not os.path.exists(mapping_csv):
+            # Without it the new and moved agencies would get no LAD and drop out of the counts
+            raise FileNotFoundError(f"Postcode directory {mapping_csv} is needed to geocode "
+                                    f"{len(to_geocode)} new or moved agencies")
+        geocoded = geocode_agencies(to_geocode[new_cols + ["_key"]], mapping_csv)
+        # Unknown postcodes fall back to the agency coordinates, as in the full pipeline
+        geocoded, fallback_report = resolve_unmatched(geocoded)
+        recovered = fallback_report["recovered"]
+    else:
+        geocoded = to_geocode.reindex(columns=new_cols + ["_key"] + GEO_COLS)
+
+    # Agencies that stayed put keep their previous geography; take the other fields from the new export
+    kept_geo = diff["unchanged_old"].reindex(columns=["_key"] + GEO_COLS)
+    kept = _with_row_key(new_cqc, agency_key(new_cqc)).merge(kept_geo, on="_key", how="inner")
+    new_geo = pd.concat([kept, geocoded], ignore_index=True)
+
+    # Count deltas: remove the old state of every touched agency, add its new state
+    old_touched = pd.concat([diff["removed"], diff["moved_old"], diff["changed_old"]], ignore_index=True)
+    rerated_new = diff["changed_new"].merge(kept_geo, on="_key", how="left")
+    new_touched = pd.concat([geocoded, rerated_new], ignore_index=True)
+    counts = previous_counts.sub(rating_counts(old_touched), fill_value=0)
+    counts = counts.add(rating_counts(new_touched), fill_value=0).astype("int64")
+
+    agg_lad, agg_lad_cqc = lad_outputs_from_counts(counts)
+    summary = {
+        "previous_agencies": len(previous_geo),
+        "new_agencies": len(new_cqc),
+        "added": len(diff["added"]),
+        "removed": len(diff["removed"]),
+        "moved": len(diff["moved"]),
+        "rerated": len(diff["changed_new"]),
+        "geocoded": len(to_geocode),
+        "recovered_by_location": recovered,
+    }
+    return {
+        "cqc_geo": new_geo.drop(columns="_key")[list(new_cqc.columns) + GEO_COLS],
+        "agg_lad": agg_lad,
+        "agg_lad_cqc": agg_lad_cqc,
+        "summary": summary,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally refresh CQC LAD aggregates from a new snapshot.")
+    parser.add_argument("new_csv", help="New CQC export")
+    parser.add_argument("--previous", default=HOMECARE_AGENCIES,
+                        help="Previous CQC export whose *_postcodes / *_LAD_CQC_counts outputs exist")
+    parser.add_argument("--snapshot", action="store_true",
+                        help="Also store the new LAD x rating counts in the snapshot store")
+    parser.add_argument("--snapshot-date", help="Snapshot date (default: the (dd-mm-yyyy) date in the file name)")
+    args = parser.parse_args()
+
+    result = incremental_refresh(args.new_csv, args.previous)
+    print("Churn:", result["summary"])
+
+    paths = output_paths(args.new_csv)
+    result["cqc_geo"].to_csv(paths["postcodes"], index=False)
+    result["agg_lad"].to_csv(paths["lad"], index=False)
+    result["agg_lad_cqc"].to_csv(paths["lad_cqc"], index=False)
+    print("Saved postcode-level, LAD-level, and LAD-CQC-level aggregates.")
+    if args.snapshot:
+        meta = append_lad_outputs(str(paths["lad_cqc"]), args.snapshot_date, overwrite=True)
+        print(f"Stored snapshot: {meta['agencies']} agencies in {meta['lads']} LADs")
@@ -0,0 +1,169 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from config import LAD_GEOJSON, REGION_GEOJSON, COUNTY_GEOJSON, LAD_SHAPEFILE, SIMPLIFIED_DIR, SIMPLIFY_TOLERANCES
+from analysis import add_over80_ratio
+from age_bands import AGE_COLUMNS, band_population, parse_band, per_10k, prefix_sums
+from hierarchy import load_hierarchy, lookup_ids
+from data_cache import cached_by_files
+from frame_schema import compact_frame
+import catalog
+from instrumentation import describe_output, instrumented, stage
+
+# =============================
+# Shared definitions
+# =============================
+AGE_GROUPS = {
+    "70plus": ["Aged 70 to 74 years", "Aged 75 to 79 years", "Aged 80 to 84 years", "Aged 85 years and over"],
+    "75plus": ["Aged 75 to 79 years", "Aged 80 to 84 years", "Aged 85 years and over"],
+    "80plus": ["Aged 80 to 84 years", "Aged 85 years and over"],
+    "85plus": ["Aged 85 years and over"]
+}
+# The same groups as age bands (src/age_bands.py), which is how they are computed
+AGE_GROUP_BANDS = {"70plus": "70+", "75plus": "75+", "80plus": "80+", "85plus": "85+"}
+POPULATION_COLS = [f"Population_{g}" for g in AGE_GROUPS]
+RATING_COLS = ["Good", "Outstanding", "Requires Improvement", "Inadequate"]
+
+# Per map level: boundary file, key column in the data and matching GeoJSON property.
+# boundary_source is what src/simplify_geometry.py and src/vector_tiles.py build from; code_prop is
+# the area code property carried into the vector tiles.
+LEVELS = {
+    "Regions": {"geojson_path": REGION_GEOJSON, "boundary_source": REGION_GEOJSON,
+                "key_col": "Region", "geojson_prop": "eer17nm", "code_prop": "eer17cd", "slug": "regions"},
+    "Counties": {"geojson_path": COUNTY_GEOJSON, "boundary_source": COUNTY_GEOJSON,
+                 "key_col": "County", "geojson_prop": "CTYUA23NM", "code_prop": "CTYUA23CD",
+                 "slug": "counties"},
+    "Local Authority Districts": {"geojson_path": LAD_GEOJSON, "boundary_source": LAD_SHAPEFILE,
+                                  "key_col": "LAD25NM", "geojson_prop": "LAD25NM", "code_prop": "LAD25CD",
+                                  "slug": "lads"},
+}
+
+# Metrics offered by the dashboards: column -> display name
+METRIC_DICT = {
+    "Total": "Total Population",
+    "Population_70plus": "Population 70+",
+    "Population_75plus": "Population 75+",
+    "Population_80plus": "Population 80+",
+    "Population_85plus": "Population 85+",
+    "num_agencies": "Number of Homecare Agencies",
+    "agencies_per_10k_70": "Agencies per 10k (70+)",
+    "agencies_per_10k_75": "Agencies per 10k (75+)",
+    "agencies_per_10k_80": "Agencies per 10k (80+)",
+    "agencies_per_10k_85": "Agencies per 10k (85+)",
+    "Good": "Agencies Rated Good",
+    "Outstanding": "Agencies Rated Outstanding",
+    "Requires Improvement": "Agencies Requires Improvement",
+    "Inadequate": "Agencies Rated Inadequate",
+    "Not Rated": "Agencies Not Rated",
+    "Good_pct": "% Agencies Good",
+    "Outstanding_pct": "% Agencies Outstanding",
+    "Requires Improvement_pct": "% Agencies Requires Improvement",
+    "Inadequate_pct": "% Agencies Inadequate",
+    "Unrated_pct": "% Agencies Not Rated"
+}
+
+# GeoJSON names that differ from the ONS lookup names, per property
+GEOJSON_NAME_FIXES = {
+    "eer17nm": {"Eastern": "East of England"},
+}
+
+
+# =============================
+# Cached loaders
+# =============================
+# All loaders below return shared objects: callers must .copy() before mutating.
+
+@cached_by_files("pop_path", "cqc_path", "lookup_path")
+def _lad_metrics(pop_path: str, cqc_path: str, lookup_path: str, pop_dataset: str, cqc_dataset: str) -> pd.DataFrame:
+    """load_lad_metrics body, memoised per version of the catalogued inputs and the LAD lookup."""
+    hierarchy = load_hierarchy()
+    lad_df = add_over80_ratio(catalog.load(pop_dataset).copy())
+    with stage("resolve_lad_codes"):
+        # Resolve LADs to ONS codes (the population file uses some short names, see
+        # hierarchy.LAD_NAME_ALIASES) and use the lookup names from here on
+        lad_ids = lookup_ids(hierarchy, "LAD", names=lad_df["LAD23NM"])
+        known = lad_ids >= 0
+        lad_df.insert(0, "LAD23CD", np.where(known, hierarchy["LAD"]["codes"][lad_ids], None))
+        lad_df["LAD23NM"] = np.where(known, hierarchy["LAD"]["names"][lad_ids], lad_df["LAD23NM"])
+
+    # Load CQC home care agency counts by LAD, joined on the LAD code
+    # (counts only: the per-LAD *_pct columns are recomputed per level downstream)
+    count_cols = [c for c in catalog.schema(cqc_dataset) if not c.endswith("_pct")]
+    cqc_counts = catalog.load(cqc_dataset, columns=count_cols)
+    with stage("merge_cqc_counts") as record:
+        cqc_ids = lookup_ids(hierarchy, "LAD", names=cqc_counts["ladnm"])
+        cqc_counts = cqc_counts[cqc_ids >= 0].assign(LAD23CD=hierarchy["LAD"]["codes"][cqc_ids[cqc_ids >= 0]])
+        lad_df = lad_df.merge(cqc_counts, on="LAD23CD", how="left")
+        record.update(describe_output(lad_df))
+
+    # Fill LADs with no agencies with 0
+    cqc_count_cols = [c for c in count_cols if c != "ladnm"]
+    lad_df[cqc_count_cols] = lad_df[cqc_count_cols].fillna(0)
+    lad_df["num_agencies"] = lad_df["Total_Agencies"]
+
+    # Every group from one running total over the age columns
+    prefix = prefix_sums(lad_df[AGE_COLUMNS].to_numpy(dtype=float))
+    for group_name, band in AGE_GROUP_BANDS.items():
+        population = band_population(prefix, *parse_band(band))
+        lad_df[f"Population_{group_name}"] = population
+        # Named as in the metric selector, e.g. 'agencies_per_10k_70'
+        lad_df[f"agencies_per_10k_{group_name[:2]}"] = per_10k(lad_df["num_agencies"], population)
+
+    return compact_frame(lad_df, count_cols=cqc_count_cols + ["num_agencies"] + POPULATION_COLS)
+
+
+@instrumented()
+def load_lad_metrics(pop_dataset: str = "lad_population", cqc_dataset: str = "cqc_lad_counts") -> pd.DataFrame:
+    """
+    Load LAD population and CQC agency counts (catalog datasets) and derive the per-LAD
+    metrics (age-group populations and agencies per 10k).
+    """
+    return _lad_metrics(catalog.ensure(pop_dataset), catalog.ensure(cqc_dataset), catalog.ensure("master_mapping"),
+                        pop_dataset, cqc_dataset)
+
+
+@instrumented()
+@cached_by_files("geojson_path")
+def load_geojson(geojson_path: str) -> dict:
+    """Parse a boundary GeoJSON and normalise area names to the ONS lookup names."""
+    with open(geojson_path, "r") as f:
+        geojson_data = json.load(f)
+
+    for prop, fixes in GEOJSON_NAME_FIXES.items():
+        for feature in geojson_data["features"]:
+            name = feature["properties"].get(prop)
+            if name in fixes:
+                feature["properties"][prop] = fixes[name]
+    return geojson_data
+
+
+def tolerance_for_zoom(zoom: float) -> int:
+    """Simplification tolerance (metres) to use at a map zoom level, see SIMPLIFY_TOLERANCES."""
+    min_zooms = [z for z in sorted(SIMPLIFY_TOLERANCES) if z <= zoom]
+    return SIMPLIFY_TOLERANCES[min_zooms[-1] if min_zooms else min(SIMPLIFY_TOLERANCES)]
+
+
+def simplified_path(level: str, tolerance: int, fmt: str = "geojson") -> str:
+    """Path of the simplified boundaries of a level ("geojson" or "topojson")."""
+    return os.path.join(SIMPLIFIED_DIR, f"{LEVELS[level]['slug']}_{tolerance}m.{fmt}")
+
+
+def level_geojson_path(level: str, zoom: float = None) -> str:
+    """
+    Boundary file of a map level: with a zoom level, the simplified boundaries for that
+    zoom when they have been built; otherwise (or without zoom) the full-resolution file.
+    """
+    if zoom is not None:
+        path = simplified_path(level, tolerance_for_zoom(zoom))
+        if os.path.exists(path):
+            return path
+    return LEVELS[level]["geojson_path"]
+
+
+@instrumented()
+def load_level_geojson(level: str, zoom: float = None) -> dict:
+    """Parsed GeoJSON for a map level ("Regions", "Counties", "Local Authority Districts"), see level_geojson_path."""
+    return load_geojson(level_geojson_path(level, zoom))
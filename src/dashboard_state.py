@@ -0,0 +1,249 @@
+import os
+import pickle
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+from config import BASE_DIR, DASHBOARD_STATE, DATASETS, PAYLOAD_PRECISION, PAYLOAD_DELTA, STARTUP_WORKERS, ZOOM_START
+from dashboard_data import LEVELS, level_geojson_path, load_lad_metrics, simplified_path, tolerance_for_zoom
+from data_cache import cached_by_files, cached_file_sha256
+from hierarchy import load_hierarchy
+from metrics_cube import CUBE_VERSION, load_metrics_cube
+from age_bands import build_band_index
+from area_index import AREA_INDEX_VERSION, area_lookup, load_area_index
+from geojson_payload import load_level_payload
+from instrumentation import stage
+import catalog
+
+# =============================
+# Prepared dashboard state
+# =============================
+# Everything the dashboards compute before their first paint (LAD metrics, the metrics
+# cube, the LAD -> County -> Region -> Country rollup index, the age-band running totals,
+# the zoom-to-area lookups and the national-view map payloads) in one pickle, written by the pipeline:
+#
+#   python src/dashboard_state.py
+#
+# A cold start then reads one file instead of converting the CSV catalog, building the
+# hierarchy and parsing the boundaries. The file starts with a small header (format and
+# library versions, size and SHA-256 of every input) checked before the state itself is
+# unpickled; if any input changed, the accessors below fall back to the live loaders.
+# The file is trusted pickle data from our own pipeline: never point this at anything else.
+
+STATE_VERSION = 3
+# Levels the rollup index needs for LAD -> County / Region / Country
+ROLLUP_LEVELS = ["LAD", "County", "Region", "Country"]
+# Catalog datasets behind the LAD metrics, the cube and the hierarchy
+STATE_DATASETS = ["lad_population", "cqc_lad_counts", "master_mapping", "lsoa_to_ward_lad", "lad_to_county"]
+
+
+def _versions() -> dict:
+    """Format versions the state depends on; any difference makes a state file stale."""
+    return {"state": STATE_VERSION, "cube": CUBE_VERSION, "area_index": AREA_INDEX_VERSION,
+            "payload": [PAYLOAD_PRECISION, PAYLOAD_DELTA], "pandas": pd.__version__}
+
+
+def _payload_levels() -> list:
+    return [level for level in LEVELS if os.path.exists(level_geojson_path(level, ZOOM_START))]
+
+
+def state_sources() -> list:
+    """Input files the state is derived from."""
+    paths = [DATASETS[name] for name in STATE_DATASETS]
+    paths += [spec["boundary_source"] for spec in LEVELS.values()]
+    paths += [level_geojson_path(level, ZOOM_START) for level in _payload_levels()]
+    return list(dict.fromkeys(os.path.relpath(path, BASE_DIR) for path in paths))
+
+
+def _source_record(relpath: str):
+    path = os.path.join(BASE_DIR, relpath)
+    if not os.path.exists(path):
+        return None
+    return [os.path.getsize(path), cached_file_sha256(path)]
+
+
+def build_state() -> dict:
+    """Compute the prepared state with the live loaders."""
+    hierarchy = load_hierarchy()
+    lad_metrics = load_lad_metrics()
+    return {
+        "lad_metrics": lad_metrics,
+        "metrics_cube": load_metrics_cube(),
+        "hierarchy": {level: hierarchy[level] for level in ROLLUP_LEVELS},
+        "age_bands": build_band_index(lad_metrics, hierarchy),
+        "areas": {level: area_lookup(level) for level in LEVELS},
+        "payloads": {level: {"source": os.path.relpath(level_geojson_path(level, ZOOM_START), BASE_DIR),
+                             "geojson": load_level_payload(level, ZOOM_START)}
+                     for level in _payload_levels()},
+    }
+
+
+def write_state(state: dict, state_path: str = DASHBOARD_STATE) -> str:
+    """Write the header and the state as two consecutive pickles (atomically replaced)."""
+    header = {"versions": _versions(), "built_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+              "sources": {relpath: _source_record(relpath) for relpath in state_sources()}}
+    tmp_path = f"{state_path}.tmp"
+    with open(tmp_path, "wb") as f:
+        pickle.dump(header, f, protocol=pickle.HIGHEST_PROTOCOL)
+        pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, state_path)
+    return state_path
+
+
+@cached_by_files("state_path")
+def _read_header(state_path: str) -> dict:
+    with open(state_path, "rb") as f:
+        return pickle.load(f)
+
+
+@cached_by_files("state_path")
+def _read_state(state_path: str) -> dict:
+    with stage("dashboard_state.restore") as record, open(state_path, "rb") as f:
+        pickle.load(f)
+        state = pickle.load(f)
+        record["bytes"] = os.path.getsize(state_path)
+    return state
+
+
+def read_state_header(state_path: str = DASHBOARD_STATE):
+    """(header, None), or (None, reason) when the state file is missing or cannot be read."""
+    if not os.path.exists(state_path):
+        return None, None
+    try:
+        return _read_header(state_path), None
+    except (OSError, pickle.UnpicklingError, EOFError, ValueError, KeyError, IndexError, AttributeError,
+            ImportError) as e:
+        return None, f"Ignoring unreadable dashboard state {state_path}: {e}"
+
+
+def is_state_current(state_path: str = DASHBOARD_STATE) -> bool:
+    """True when the state file exists, matches the current format versions and every input is unchanged."""
+    header, _ = read_state_header(state_path)
+    if header is None:
+        return False
+    return header["versions"] == _versions() and all(
+        _source_record(relpath) == record for relpath, record in header["sources"].items())
+
+
+def load_state(state_path: str = DASHBOARD_STATE):
+    """The prepared state if it is current, else None. Shared: do not mutate."""
+    return _read_state(state_path) if is_state_current(state_path) else None
+
+
+# =============================
+# Accessors (prepared state, or the live loaders)
+# =============================
+def prepared_lad_metrics() -> pd.DataFrame:
+    """load_lad_metrics(), from the prepared state when current."""
+    state = load_state()
+    return state["lad_metrics"] if state else load_lad_metrics()
+
+
+def prepared_metrics_cube() -> pd.DataFrame:
+    """load_metrics_cube(), from the prepared state when current."""
+    state = load_state()
+    return state["metrics_cube"] if state else load_metrics_cube()
+
+
+def prepared_hierarchy() -> dict:
+    """The LAD and upper levels of load_hierarchy(), enough for hierarchy.rollup_frame."""
+    state = load_state()
+    return state["hierarchy"] if state else load_hierarchy()
+
+
+def prepared_band_index() -> dict:
+    """age_bands.build_band_index() of the LAD metrics, from the prepared state when current."""
+    state = load_state()
+    # Live: a few array rollups over the (cached) LAD metrics
+    return state["age_bands"] if state else build_band_index(load_lad_metrics())
+
+
+def prepared_areas(level: str) -> dict:
+    """area_lookup(level), from the prepared state when current."""
+    state = load_state()
+    return state["areas"][level] if state else area_lookup(level)
+
+
+def prepared_payload(level: str, zoom: float = None) -> dict:
+    """load_level_payload(level, zoom); the national-view payloads come from the prepared state when current."""
+    state = load_state()
+    payload = state["payloads"].get(level) if state else None
+    if payload and payload["source"] == os.path.relpath(level_geojson_path(level, zoom), BASE_DIR):
+        return payload["geojson"]
+    return load_level_payload(level, zoom)
+
+
+# =============================
+# Concurrent startup
+# =============================
+# Without a current state file, a cold start converts the catalog CSVs, parses the map
+# boundaries and reads (or builds) the area index. Those inputs do not depend on each
+# other, so they are read on a thread pool: file reads, Arrow CSV parsing and the GEOS /
+# GDAL calls release the GIL and overlap. The steps that join them (hierarchy, LAD
+# metrics, cube) then run from the warm caches. With a current state file there is one
+# file to read and nothing to overlap.
+
+def run_concurrently(tasks: dict, workers: int = STARTUP_WORKERS) -> dict:
+    """
+    Run independent zero-argument callables on a thread pool and join them.
+    Returns name -> (result, seconds); the first exception is re-raised.
+    """
+    def timed(func):
+        start = time.perf_counter()
+        result = func()
+        return result, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="startup") as pool:
+        futures = {name: pool.submit(timed, func) for name, func in tasks.items()}
+        return {name: future.result() for name, future in futures.items()}
+
+
+def startup_reads(zoom: float = ZOOM_START) -> dict:
+    """The independent input reads of a cold start: catalog datasets, map payloads, area index."""
+    tasks = {f"catalog.{name}": partial(catalog.ensure, name) for name in STATE_DATASETS}
+    tasks.update({f"payload.{level}": partial(load_level_payload, level, zoom)
+                  for level in LEVELS if os.path.exists(level_geojson_path(level, zoom))})
+    tasks["area_index"] = load_area_index
+    return tasks
+
+
+def load_startup(zoom: float = ZOOM_START, workers: int = STARTUP_WORKERS) -> dict:
+    """
+    Everything a dashboard reads before its first paint, with the independent reads of a
+    stale state issued concurrently: {"lad_metrics", "metrics_cube", "warning"} (payloads,
+    area lookups and the hierarchy are left in the caches behind the prepared_* accessors).
+    warning says why an existing state file was ignored (unreadable), else None.
+    """
+    with stage("startup") as record:
+        _, warning = read_state_header()
+        if not is_state_current():
+            start = time.perf_counter()
+            timings = {name: seconds for name, (_, seconds) in run_concurrently(startup_reads(zoom), workers).items()}
+            # Wall time of the pool against the slowest and the summed reads
+            record.update(concurrent_s=round(time.perf_counter() - start, 4),
+                          slowest_s=round(max(timings.values()), 4), serial_s=round(sum(timings.values()), 4))
+        return {"lad_metrics": prepared_lad_metrics(), "metrics_cube": prepared_metrics_cube(), "warning": warning}
+
+
+def build_national_boundaries() -> list:
+    """Build the simplified national-view boundaries that are missing (their payloads are small to restore)."""
+    from simplify_geometry import build_simplified_level  # geopandas: pipeline only
+    tolerance = tolerance_for_zoom(ZOOM_START)
+    missing = [level for level in LEVELS if not os.path.exists(simplified_path(level, tolerance))]
+    return [out for level in missing for out in build_simplified_level(level, [tolerance])]
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    for out in build_national_boundaries():
+        print(f"Built {out['geojson']}")
+    path = write_state(build_state())
+    print(f"Wrote {path} ({os.path.getsize(path) / 1e6:.2f} MB) in {time.perf_counter() - start:.1f} s")
+    start = time.perf_counter()
+    _read_state(path)
+    print(f"Restore: {time.perf_counter() - start:.3f} s")
@@ -0,0 +1,119 @@
+import hashlib
+import inspect
+import os
+import threading
+from functools import wraps
+
+# =============================
+# Process-wide cache for prepared data
+# =============================
+# Streamlit re-executes the app scripts on every widget change, but modules
+# imported from src/ stay loaded for the lifetime of the server process. Keeping
+# the cache here shares prepared frames and parsed geometries across reruns and
+# across sessions. Entries are keyed by the input files' path, mtime and size, so
+# replacing a file on disk makes the next call reload it.
+
+_CACHE = {}
+_LOCK = threading.Lock()
+
+
+def file_signature(path, use_hash=False):
+    """
+    Return a tuple identifying the current version of a file on disk.
+
+    By default the signature is (path, mtime_ns, size), which is cheap to compute.
+    With use_hash=True a SHA-256 of the content is used instead of the mtime, for
+    files that get copied around with reset timestamps.
+    """
+    path = os.path.abspath(path)
+    stat = os.stat(path)
+    if use_hash:
+        return path, file_sha256(path), stat.st_size
+    return path, stat.st_mtime_ns, stat.st_size
+
+
+def file_sha256(path, block_size=1 << 20):
+    """SHA-256 hex digest of a file, read in blocks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def cached_by_files(*path_args):
+    """
+    Decorator caching a loader's result by the signatures of its input files.
+
+    path_args names the parameters holding file paths. Every other argument
+    must be hashable and becomes part of the key as well. The cached object is
+    shared between callers: treat it as read-only and .copy() before mutating.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            key_parts = []
+            for name, value in bound.arguments.items():
+                if name in path_args:
+                    key_parts.append((name, file_signature(value)))
+                else:
+                    key_parts.append((name, value))
+            key = (func.__module__, func.__qualname__, tuple(key_parts))
+
+            with _LOCK:
+                if key in _CACHE:
+                    return _CACHE[key]
+            value = func(*args, **kwargs)
+            with _LOCK:
+                # Drop stale versions of the same call so old data can be freed
+                stale = [k for k in _CACHE if k[:2] == key[:2] and _same_paths(k, key, path_args)]
+                for k in stale:
+                    del _CACHE[k]
+                _CACHE[key] = value
+            return value
+
+        wrapper.cache_key_paths = path_args
+        return wrapper
+    return decorator
+
+
+@cached_by_files("path")
+def cached_file_sha256(path) -> str:
+    """file_sha256, memoised per file version (path, mtime, size): hashes each version once."""
+    return file_sha256(path)
+
+
+def _same_paths(old_key, new_key, path_args):
+    """True when two cache keys refer to the same call arguments (ignoring file versions)."""
+    old = {n: (v[0] if n in path_args else v) for n, v in old_key[2]}
+    new = {n: (v[0] if n in path_args else v) for n, v in new_key[2]}
+    return old == new
+
+
+def invalidate(path=None):
+    """
+    Drop cached entries.
+
+    path: if given, only entries that depend on this file are removed,
+    otherwise the whole cache is cleared. Returns the number of entries dropped.
+    """
+    with _LOCK:
+        if path is None:
+            dropped = len(_CACHE)
+            _CACHE.clear()
+            return dropped
+        path = os.path.abspath(path)
+        stale = [k for k in _CACHE if any(isinstance(v, tuple) and v and v[0] == path for _, v in k[2])]
+        for k in stale:
+            del _CACHE[k]
+        return len(stale)
+
+
+def cache_info():
+    """Return a list of (loader, arguments) for the entries currently cached."""
+    with _LOCK:
+        return [(f"{k[0]}.{k[1]}", dict(k[2])) for k in _CACHE]
@@ -0,0 +1,173 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+from config import DRILLDOWN_DIR, DRILLDOWN_ZOOM, PAYLOAD_PRECISION, PAYLOAD_DELTA
+from dashboard_data import LEVELS, level_geojson_path, load_geojson, simplified_path, tolerance_for_zoom
+from data_cache import cached_by_files, cached_file_sha256
+from geojson_payload import shape_geojson
+from hierarchy import load_hierarchy, lookup_ids
+from metrics_cube import DASHBOARD_LEVELS
+from instrumentation import instrumented
+
+# =============================
+# Drill-down geometry store
+# =============================
+# Region -> Counties -> Local Authority Districts. The child boundaries of every parent
+# area are written to their own map payload (shaped as in src/geojson_payload.py), under
+#
+#   DRILLDOWN_DIR/<child level slug>/<parent ONS code>.geojson
+#
+# with manifest.json recording, per child level, the source boundary file (and its hash)
+# and each parent's name, code, file and child count. Children are assigned to parents with
+# the LAD -> County -> Region lookups (src/hierarchy.py), so a drill-down view reads and
+# draws the few dozen areas of one parent instead of every area of the level.
+
+DRILLDOWN_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+# Dashboard level -> the level it drills into
+CHILD_LEVELS = {"Regions": "Counties", "Counties": "Local Authority Districts"}
+DRILL_ORDER = ["Regions", "Counties", "Local Authority Districts"]
+
+
+def manifest_path(store_dir: str = DRILLDOWN_DIR) -> str:
+    return os.path.join(store_dir, MANIFEST_NAME)
+
+
+def read_manifest(store_dir: str = DRILLDOWN_DIR) -> dict:
+    """Store manifest: child level -> {"version", "source", "source_sha256", "parents": {name: entry}}."""
+    try:
+        with open(manifest_path(store_dir)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def parent_names(child_level: str, features: list, hierarchy: dict) -> list:
+    """Parent area name (one level up in DRILL_ORDER) of each child feature, None where unknown."""
+    spec = LEVELS[child_level]
+    child = DASHBOARD_LEVELS[child_level]
+    parent = DASHBOARD_LEVELS[DRILL_ORDER[DRILL_ORDER.index(child_level) - 1]]
+    ids = lookup_ids(hierarchy, child, codes=[f["properties"].get(spec["code_prop"]) for f in features])
+    if child == "LAD":
+        # Boundaries newer than the lookups: fall back to the LAD names (and aliases)
+        by_name = lookup_ids(hierarchy, "LAD", names=[f["properties"].get(spec["geojson_prop"]) for f in features])
+        ids[ids < 0] = by_name[ids < 0]
+    parent_ids = hierarchy[child]["parent"][ids.clip(0)]
+    return [hierarchy[parent]["names"][p] if i >= 0 and p >= 0 else None for i, p in zip(ids, parent_ids)]
+
+
+def _boundary_source(child_level: str, zoom: float) -> str:
+    """Simplified boundaries of a level for the drill-down zoom, built if missing."""
+    path = simplified_path(child_level, tolerance_for_zoom(zoom))
+    if not os.path.exists(path):
+        from simplify_geometry import build_simplified_level  # geopandas: build only
+        build_simplified_level(child_level, [tolerance_for_zoom(zoom)])
+    return path
+
+
+def build_child_level(child_level: str, zoom: float = DRILLDOWN_ZOOM, store_dir: str = DRILLDOWN_DIR,
+                      precision: int = PAYLOAD_PRECISION, delta: bool = PAYLOAD_DELTA) -> dict:
+    """Write the per-parent payloads of one child level; returns its manifest entry."""
+    source = _boundary_source(child_level, zoom)
+    hierarchy = load_hierarchy()
+    parent_level = DRILL_ORDER[DRILL_ORDER.index(child_level) - 1]
+    parent_codes = dict(zip(hierarchy[DASHBOARD_LEVELS[parent_level]]["names"],
+                            hierarchy[DASHBOARD_LEVELS[parent_level]]["codes"]))
+
+    features = load_geojson(source)["features"]
+    partitions = {}
+    for feature, parent in zip(features, parent_names(child_level, features, hierarchy)):
+        if parent is not None:
+            partitions.setdefault(parent, []).append(feature)
+
+    level_dir = os.path.join(store_dir, LEVELS[child_level]["slug"])
+    os.makedirs(level_dir, exist_ok=True)
+    parents = {}
+    for parent, children in partitions.items():
+        code = parent_codes[parent]
+        path = os.path.join(level_dir, f"{code}.geojson")
+        payload = shape_geojson({"type": "FeatureCollection", "features": children},
+                                LEVELS[child_level]["geojson_prop"], precision, delta)
+        with open(f"{path}.tmp", "w") as f:
+            json.dump(payload, f)
+        os.replace(f"{path}.tmp", path)
+        parents[parent] = {"code": code, "file": os.path.relpath(path, store_dir), "children": len(children)}
+    return {"version": DRILLDOWN_VERSION, "source": os.path.abspath(source), "source_sha256": cached_file_sha256(source),
+            "precision": precision, "delta": delta, "parents": parents,
+            "unassigned": len(features) - sum(len(c) for c in partitions.values())}
+
+
+def build_drilldown_store(zoom: float = DRILLDOWN_ZOOM, store_dir: str = DRILLDOWN_DIR) -> dict:
+    """Build the partitions of every child level and write the manifest."""
+    manifest = {level: build_child_level(level, zoom, store_dir) for level in CHILD_LEVELS.values()}
+    tmp_path = f"{manifest_path(store_dir)}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(tmp_path, manifest_path(store_dir))
+    return manifest
+
+
+@cached_by_files("manifest_file")
+def _read_manifest_file(manifest_file: str) -> dict:
+    with open(manifest_file) as f:
+        return json.load(f)
+
+
+def _level_entry(child_level: str, store_dir: str):
+    """Manifest entry of a child level if it is current (format, payload settings and source unchanged)."""
+    path = manifest_path(store_dir)
+    if not os.path.exists(path):
+        return None
+    entry = _read_manifest_file(path).get(child_level)
+    if (entry is None or entry["version"] != DRILLDOWN_VERSION or not os.path.exists(entry["source"])
+            or [entry["precision"], entry["delta"]] != [PAYLOAD_PRECISION, PAYLOAD_DELTA]):
+        return None
+    return entry if cached_file_sha256(entry["source"]) == entry["source_sha256"] else None
+
+
+def drilldown_available(store_dir: str = DRILLDOWN_DIR) -> bool:
+    """True when every child level has been built from the current boundaries."""
+    return all(_level_entry(level, store_dir) for level in CHILD_LEVELS.values())
+
+
+@cached_by_files("path")
+def _read_partition(path: str) -> dict:
+    with open(path) as f:
+        return json.load(f)
+
+
+@instrumented()
+def load_children(parent_level: str, parent: str, store_dir: str = DRILLDOWN_DIR) -> dict:
+    """
+    Map payload of the child areas of one parent ("Regions"/"Counties" and an area name):
+    only that parent's partition is read. Empty collection for a parent without children.
+    Shared: do not mutate.
+    """
+    entry = _level_entry(CHILD_LEVELS[parent_level], store_dir)
+    if entry is None:
+        raise FileNotFoundError(f"Drill-down store missing or stale under {store_dir}: run src/drilldown.py")
+    partition = entry["parents"].get(parent)
+    if partition is None:
+        return {"type": "FeatureCollection", "features": []}
+    return _read_partition(os.path.join(store_dir, partition["file"]))
+
+
+def child_keys(payload: dict, level: str) -> list:
+    """Area names (the level's join key) of a drill-down payload."""
+    prop = LEVELS[level]["geojson_prop"]
+    return [feature["properties"][prop] for feature in payload["features"]]
+
+
+if __name__ == "__main__":
+    manifest = build_drilldown_store()
+    for level, entry in manifest.items():
+        sizes = pd.Series({p: e["children"] for p, e in entry["parents"].items()})
+        full = len(load_geojson(level_geojson_path(level, DRILLDOWN_ZOOM))["features"])
+        print(f"{level:<26} {full:>4} areas in {len(sizes):>3} partitions: "
+              f"median {sizes.median():.0f}, max {sizes.max()} per parent; {entry['unassigned']} unassigned")
+    print(f"Wrote {manifest_path()}")
@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+
+# =============================
+# Shared dtype policy
+# =============================
+# Every frame the dashboards keep in memory (cached per process, shared by all sessions)
+# goes through compact_frame() before it is returned:
+#   - text columns (area names and codes, ratings)  -> category
+#   - count columns (listed by the caller)          -> int32, when whole and within range
+#   - other integer columns                         -> int32, when within range
+#   - other floats (ratios, percentages, rates)     -> float32
+# float32 keeps ~7 significant digits, far more than the maps and tables show. Sums are
+# taken in float64/int64 (hierarchy.rollup, pandas reductions) before narrowing, so
+# narrowing never overflows an aggregate.
+
+INT32_MIN, INT32_MAX = np.iinfo(np.int32).min, np.iinfo(np.int32).max
+
+
+def _fits_int32(values: np.ndarray) -> bool:
+    return values.size == 0 or (values.min() >= INT32_MIN and values.max() <= INT32_MAX)
+
+
+def compact_frame(df: pd.DataFrame, count_cols=()) -> pd.DataFrame:
+    """
+    A copy of df with the dtype policy applied. count_cols are float columns holding counts
+    (float only because of a merge or fillna): they become int32 when every value is whole.
+    """
+    count_cols = set(count_cols)
+    out = {}
+    for col in df.columns:
+        series = df[col]
+        dtype = series.dtype
+        if isinstance(dtype, pd.CategoricalDtype):
+            out[col] = series
+        elif pd.api.types.is_string_dtype(dtype) or dtype == object:
+            out[col] = series.astype("category")
+        elif pd.api.types.is_bool_dtype(dtype):
+            out[col] = series
+        elif pd.api.types.is_integer_dtype(dtype):
+            values = series.to_numpy()
+            out[col] = series.astype(np.int32) if _fits_int32(values) else series
+        elif pd.api.types.is_float_dtype(dtype):
+            values = series.to_numpy(dtype=float)
+            whole = col in count_cols and np.isfinite(values).all() and (values == np.round(values)).all()
+            out[col] = series.astype(np.int32) if whole and _fits_int32(values) else series.astype(np.float32)
+        else:
+            out[col] = series
+    return pd.DataFrame(out, index=df.index)
+
+
+def memory_report(frames: dict) -> pd.DataFrame:
+    """Rows, columns and deep memory of named frames, with the bytes taken by each dtype."""
+    rows = []
+    for name, df in frames.items():
+        usage = df.memory_usage(index=True, deep=True)
+        by_dtype = usage.drop("Index").groupby(df.dtypes.astype(str)).sum()
+        rows.append({"frame": name, "rows": len(df), "columns": df.shape[1], "bytes": int(usage.sum()),
+                     **{f"{dtype}_bytes": int(b) for dtype, b in by_dtype.items()}})
+    report = pd.DataFrame(rows)
+    byte_cols = [c for c in report.columns if c.endswith("_bytes")]
+    report[byte_cols] = report[byte_cols].fillna(0).astype(np.int64)
+    return report
+
+
+if __name__ == "__main__":
+    # Imported here: the loaders themselves import this module
+    from dashboard_data import load_lad_metrics
+    from metrics_cube import load_metrics_cube, cube_level
+
+    lad_df = load_lad_metrics()
+    cube = load_metrics_cube()
+    frames = {"lad_metrics": lad_df, "metrics_cube": cube}
+    frames.update({f"cube_level({level})": cube_level(cube, level) for level in ["County", "Region"]})
+    print(memory_report(frames).to_string(index=False))
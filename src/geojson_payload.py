@@ -0,0 +1,141 @@
+import argparse
+import json
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+from config import PAYLOAD_PRECISION, PAYLOAD_DELTA, ZOOM_START
+from dashboard_data import LEVELS, level_geojson_path, load_geojson
+from data_cache import cached_by_files
+from instrumentation import instrumented
+
+# =============================
+# Map payload shaping
+# =============================
+# Everything in the GeoJSON handed to add_choropleth is serialised into the page st_folium
+# sends on every rerun. The boundary files carry ~10 properties per area (codes, names in
+# Welsh, BNG easting/northing, GlobalID...) and coordinates with 14-15 decimals, none of
+# which the map uses. The payload keeps only the join key, with coordinates rounded to
+# PAYLOAD_PRECISION decimals (5 decimals is ~1 m, below what the simplified boundaries
+# resolve) and repeated vertices dropped.
+#
+# With delta=True coordinates are also sent as integers (x 10^precision), each ring starting
+# from an absolute [x, y, 0] position followed by [dx, dy] steps, which add_choropleth
+# decodes client-side. Shaped payloads are cached per level, zoom band and source file version.
+
+POLYGON_TYPES = ("Polygon", "MultiPolygon")
+# Top-level member marking a delta-encoded FeatureCollection; its value is the coordinate decimals
+DELTA_MEMBER = "delta_precision"
+
+
+def _quantise_ring(ring: list, precision: int):
+    """Ring rounded to precision decimals without repeated vertices, or None if it collapses."""
+    coords = np.round(np.asarray(ring, dtype=float)[:, :2], precision)
+    keep = np.ones(len(coords), dtype=bool)
+    keep[1:] = (np.diff(coords, axis=0) != 0).any(axis=1)
+    coords = coords[keep]
+    return coords if len(coords) >= 4 else None
+
+
+def _quantise_polygon(rings: list, precision: int) -> list:
+    """Rings of one polygon; holes that collapse are dropped, [] if the exterior collapses."""
+    out = []
+    for i, ring in enumerate(rings):
+        coords = _quantise_ring(ring, precision)
+        if coords is None:
+            if i == 0:
+                return []
+            continue
+        out.append(coords)
+    return out
+
+
+def _delta_ring(coords: np.ndarray, precision: int) -> list:
+    ints = np.round(coords * 10 ** precision).astype(np.int64)
+    return [[int(ints[0, 0]), int(ints[0, 1]), 0]] + np.diff(ints, axis=0).tolist()
+
+
+def shape_geometry(geometry: dict, precision: int = PAYLOAD_PRECISION, delta: bool = False) -> dict:
+    """Polygon / MultiPolygon geometry quantised (and optionally delta-encoded); other types unchanged."""
+    if geometry is None or geometry["type"] not in POLYGON_TYPES:
+        return geometry
+    polygons = [geometry["coordinates"]] if geometry["type"] == "Polygon" else geometry["coordinates"]
+    shaped = [p for p in (_quantise_polygon(rings, precision) for rings in polygons) if p]
+    if not shaped:
+        # Smaller than the quantisation step: keep it rounded rather than lose the area
+        shaped = [[np.round(np.asarray(ring, dtype=float)[:, :2], precision) for ring in rings]
+                  for rings in polygons]
+    encode = (lambda c: _delta_ring(c, precision)) if delta else (lambda c: c.tolist())
+    coordinates = [[encode(ring) for ring in rings] for rings in shaped]
+    if geometry["type"] == "Polygon":
+        return {"type": "Polygon", "coordinates": coordinates[0]}
+    return {"type": "MultiPolygon", "coordinates": coordinates}
+
+
+def shape_geojson(geojson_data: dict, key_prop: str, precision: int = PAYLOAD_PRECISION,
+                  delta: bool = False) -> dict:
+    """
+    New FeatureCollection keeping only properties[key_prop] of each feature, with quantised
+    geometries. Delta-encoded collections are marked with DELTA_MEMBER = precision.
+    """
+    shaped = {
+        "type": "FeatureCollection",
+        "features": [
+            {
+                "type": "Feature",
+                "properties": {key_prop: feature["properties"].get(key_prop)},
+                "geometry": shape_geometry(feature["geometry"], precision, delta),
+            }
+            for feature in geojson_data["features"]
+        ],
+    }
+    if delta:
+        shaped[DELTA_MEMBER] = precision
+    return shaped
+
+
+@cached_by_files("geojson_path")
+def _shaped_geojson(geojson_path: str, key_prop: str, precision: int, delta: bool) -> dict:
+    return shape_geojson(load_geojson(geojson_path), key_prop, precision, delta)
+
+
+@instrumented()
+def load_level_payload(level: str, zoom: float = None, precision: int = PAYLOAD_PRECISION,
+                       delta: bool = PAYLOAD_DELTA) -> dict:
+    """
+    Map payload of a level: the boundaries load_level_geojson would return, reduced to the
+    join key (LEVELS[level]["geojson_prop"]) and quantised. Shared: do not mutate.
+    """
+    return _shaped_geojson(level_geojson_path(level, zoom), LEVELS[level]["geojson_prop"], precision, delta)
+
+
+def json_bytes(geojson_data: dict) -> int:
+    """Size of a GeoJSON as embedded in the page (json.dumps with default separators, like folium)."""
+    return len(json.dumps(geojson_data))
+
+
+def payload_report(zoom: float = ZOOM_START, precision: int = PAYLOAD_PRECISION, levels=None) -> pd.DataFrame:
+    """Per level: serialised bytes of the boundaries before shaping, shaped, and shaped + delta-encoded."""
+    rows = []
+    for level in levels or LEVELS:
+        source = load_geojson(level_geojson_path(level, zoom))
+        before = json_bytes(source)
+        shaped = json_bytes(load_level_payload(level, zoom, precision, delta=False))
+        delta = json_bytes(load_level_payload(level, zoom, precision, delta=True))
+        rows.append({"level": level, "features": len(source["features"]), "bytes_before": before,
+                     "bytes_shaped": shaped, "bytes_delta": delta,
+                     "shaped_pct": round(100 * shaped / before, 1), "delta_pct": round(100 * delta / before, 1)})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Report map payload sizes before and after shaping.")
+    parser.add_argument("--zoom", type=float, default=ZOOM_START, help="Map zoom (picks the simplified boundaries)")
+    parser.add_argument("--precision", type=int, default=PAYLOAD_PRECISION, help="Coordinate decimals")
+    args = parser.parse_args()
+
+    levels = [level for level in LEVELS if Path(level_geojson_path(level, args.zoom)).exists()]
+    print(payload_report(args.zoom, args.precision, levels).to_string(index=False))
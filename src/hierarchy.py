@@ -0,0 +1,172 @@
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+from data_cache import cached_by_files
+import catalog
+
+# =============================
+# Geography hierarchy index
+# =============================
+# LSOA -> Ward -> LAD -> County -> Region -> Country, built once from the ONS lookups.
+# Every level gets dense integer ids (0..n-1, in ONS code order) and a parent array
+# (parent[id] = id of the area one level up), so a rollup is a chain of array lookups
+# plus np.bincount instead of mapping names through dicts and grouping strings.
+#
+# Counties are upper-tier local authorities (the CTYUA boundaries the dashboards draw):
+# a LAD's county is its UTLA, or the LAD itself where there is no upper tier.
+
+HIERARCHY_LEVELS = ["LSOA", "Ward", "LAD", "County", "Region", "Country"]
+
+# Level -> (code column, name column) in the lookups
+LEVEL_COLUMNS = {
+    "LSOA": ("LSOA21CD", "LSOA21NM"),
+    "Ward": ("WD23CD", "WD23NM"),
+    "LAD": ("LAD23CD", "LAD23NM"),
+    "County": ("UTLA23CD", "UTLA23NM"),
+    "Region": ("RGN23CD", "RGN23NM"),
+    "Country": ("CTRY23CD", "CTRY23NM"),
+}
+
+# LAD names used by some inputs (population file) vs. the ONS lookup names
+LAD_NAME_ALIASES = {
+    "Herefordshire": "Herefordshire, County of",
+    "Bristol": "Bristol, City of",
+    "Kingston upon Hull": "Kingston upon Hull, City of",
+}
+
+
+def _encode(codes: pd.Series, names: pd.Series):
+    """Dense ids for the unique codes. Returns (level dict without parent, id per input row)."""
+    ids, uniques = pd.factorize(codes, sort=True)
+    level_names = pd.Series(names.to_numpy(), index=ids).groupby(level=0).first()
+    return {
+        "codes": np.asarray(uniques, dtype=object),
+        "names": level_names.reindex(range(len(uniques))).to_numpy(dtype=object),
+        "code_index": pd.Index(np.asarray(uniques, dtype=object)),
+    }, ids
+
+
+@cached_by_files("master_path", "lsoa_path", "county_path")
+def _build_hierarchy(master_path: str, lsoa_path: str, county_path: str) -> dict:
+    """Hierarchy from the catalogued lookups, memoised per version of the three files."""
+    master = catalog.load("master_mapping", columns=["WD23CD", "WD23NM", "LAD23CD", "LAD23NM", "RGN23CD",
+                                                     "RGN23NM", "CTRY23CD", "CTRY23NM"])
+    lsoa = catalog.load("lsoa_to_ward_lad", columns=["LSOA21CD", "LSOA21NM", "WD23CD"])
+    county = catalog.load("lad_to_county", columns=["LTLA23CD", "UTLA23CD", "UTLA23NM"])
+
+    # One row per LAD with every ancestor; LADs without an upper tier are their own county
+    lads = master.drop_duplicates("LAD23CD").merge(county, left_on="LAD23CD", right_on="LTLA23CD", how="left")
+    lads["UTLA23CD"] = lads["UTLA23CD"].fillna(lads["LAD23CD"])
+    lads["UTLA23NM"] = lads["UTLA23NM"].fillna(lads["LAD23NM"])
+
+    index = {}
+    index["Country"], _ = _encode(lads["CTRY23CD"], lads["CTRY23NM"])
+    index["Region"], _ = _encode(lads["RGN23CD"], lads["RGN23NM"])
+    index["County"], _ = _encode(lads["UTLA23CD"], lads["UTLA23NM"])
+    index["LAD"], _ = _encode(lads["LAD23CD"], lads["LAD23NM"])
+    index["Ward"], _ = _encode(master["WD23CD"], master["WD23NM"])
+    index["LSOA"], _ = _encode(lsoa["LSOA21CD"], lsoa["LSOA21NM"])
+
+    def parents(child_level, child_codes, parent_level, parent_codes):
+        parent = np.full(len(index[child_level]["codes"]), -1, dtype=np.int32)
+        child_ids = index[child_level]["code_index"].get_indexer(child_codes)
+        parent[child_ids] = index[parent_level]["code_index"].get_indexer(parent_codes)
+        return parent
+
+    index["LSOA"]["parent"] = parents("LSOA", lsoa["LSOA21CD"], "Ward", lsoa["WD23CD"])
+    index["Ward"]["parent"] = parents("Ward", master["WD23CD"], "LAD", master["LAD23CD"])
+    index["LAD"]["parent"] = parents("LAD", lads["LAD23CD"], "County", lads["UTLA23CD"])
+    # Regions and counties never straddle a parent, so one row per child is enough
+    index["County"]["parent"] = parents("County", lads["UTLA23CD"], "Region", lads["RGN23CD"])
+    index["Region"]["parent"] = parents("Region", lads["RGN23CD"], "Country", lads["CTRY23CD"])
+    index["Country"]["parent"] = np.full(len(index["Country"]["codes"]), -1, dtype=np.int32)
+
+    # LAD name -> id, including the aliases used by some inputs
+    lad_names = pd.Series(np.arange(len(index["LAD"]["names"]), dtype=np.int32), index=index["LAD"]["names"])
+    aliases = pd.Series({alias: lad_names[name] for alias, name in LAD_NAME_ALIASES.items() if name in lad_names})
+    index["LAD"]["name_lookup"] = pd.concat([lad_names, aliases.astype(np.int32)])
+    return index
+
+
+def load_hierarchy() -> dict:
+    """
+    The geography index: level -> {"codes", "names", "parent", "code_index"} where codes
+    and names are indexed by id and parent holds the id one level up (-1 at the top or
+    where the lookups have no parent). Shared object: do not mutate.
+    """
+    return _build_hierarchy(catalog.ensure("master_mapping"), catalog.ensure("lsoa_to_ward_lad"),
+                            catalog.ensure("lad_to_county"))
+
+
+def lookup_ids(hierarchy: dict, level: str, codes=None, names=None) -> np.ndarray:
+    """Ids for ONS codes (or, for LADs, names/aliases); -1 where unknown."""
+    if codes is not None:
+        return hierarchy[level]["code_index"].get_indexer(pd.Index(np.asarray(codes, dtype=object))).astype(np.int32)
+    if level != "LAD":
+        raise ValueError("Name lookup is only supported for LADs; use ONS codes")
+    ids = pd.Index(np.asarray(names, dtype=object)).map(hierarchy["LAD"]["name_lookup"])
+    return np.asarray(pd.Series(ids).fillna(-1), dtype=np.int32)
+
+
+def ancestor_ids(hierarchy: dict, from_level: str, to_level: str, ids: np.ndarray) -> np.ndarray:
+    """Map ids at from_level to the ids of their ancestors at to_level (-1 propagates)."""
+    start, stop = HIERARCHY_LEVELS.index(from_level), HIERARCHY_LEVELS.index(to_level)
+    if stop < start:
+        raise ValueError(f"{to_level} is below {from_level} in the hierarchy")
+    ids = np.asarray(ids, dtype=np.int32)
+    for level in HIERARCHY_LEVELS[start:stop]:
+        parent = hierarchy[level]["parent"]
+        ids = np.where(ids >= 0, parent[np.maximum(ids, 0)], -1)
+    return ids
+
+
+def rollup(hierarchy: dict, values: np.ndarray, ids: np.ndarray, from_level: str, to_level: str):
+    """
+    Sum values (n rows, 1-D or 2-D) attached to from_level ids up to to_level.
+    Returns (totals, counts): totals has one row per to_level id, counts the number of
+    contributing rows (0 for areas with no input). Rows with unknown ids are ignored and
+    NaN values count as 0, as in a pandas groupby sum.
+    """
+    target = ancestor_ids(hierarchy, from_level, to_level, ids)
+    known = target >= 0
+    target = target[known]
+    values = np.nan_to_num(np.asarray(values, dtype=float)[known])
+    n_areas = len(hierarchy[to_level]["codes"])
+
+    counts = np.bincount(target, minlength=n_areas)
+    if values.ndim == 1:
+        return np.bincount(target, weights=values, minlength=n_areas), counts
+    totals = np.zeros((n_areas, values.shape[1]))
+    for j in range(values.shape[1]):
+        totals[:, j] = np.bincount(target, weights=values[:, j], minlength=n_areas)
+    return totals, counts
+
+
+def lad_ids_for(hierarchy: dict, lad_df: pd.DataFrame, lad_col: str = "LAD23NM") -> np.ndarray:
+    """LAD ids of a LAD-level frame: by LAD23CD when present, else by name."""
+    if "LAD23CD" in lad_df.columns:
+        return lookup_ids(hierarchy, "LAD", codes=lad_df["LAD23CD"])
+    return lookup_ids(hierarchy, "LAD", names=lad_df[lad_col])
+
+
+def rollup_frame(lad_df: pd.DataFrame, level: str, columns: list, key_col: str = None,
+                 hierarchy: dict = None, lad_col: str = "LAD23NM") -> pd.DataFrame:
+    """
+    Sum LAD columns up to a hierarchy level. Returns one row per area with at least one
+    LAD in lad_df: [key_col (area name, default the level), *columns], in ONS code order.
+    """
+    hierarchy = load_hierarchy() if hierarchy is None else hierarchy
+    columns = list(dict.fromkeys(columns))
+    totals, counts = rollup(hierarchy, lad_df[columns].to_numpy(dtype=float), lad_ids_for(hierarchy, lad_df, lad_col),
+                            "LAD", level)
+    present = counts > 0
+    out = pd.DataFrame(totals[present], columns=columns)
+    for col in columns:
+        if pd.api.types.is_integer_dtype(lad_df[col]):
+            out[col] = out[col].astype(lad_df[col].dtype)
+    out.insert(0, key_col or level, hierarchy[level]["names"][present])
+    return out
@@ -0,0 +1,180 @@
+import json
+import os
+import sys
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+from pathlib import Path
+
+import pandas as pd
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+from config import STAGE_LOG
+
+# =============================
+# Per-stage instrumentation
+# =============================
+# A dashboard rerun is one "run": start_run() at the top of the script, finish_run() at
+# the end. Loaders and rendering steps wrapped in stage() / @instrumented record their
+# wall time, process memory (RSS) delta and output size into the current thread's run
+# (Streamlit runs each session in its own thread). finish_run() appends the run as one
+# JSON line to STAGE_LOG. Outside a run, stages cost one attribute lookup.
+#
+# RSS is process-wide, so with several sessions rendering at once a stage's memory delta
+# includes the other sessions' allocations. Serialised sizes of GeoJSON and folium maps
+# cost a full serialisation, so they are only measured in detail mode (debug panel on).
+
+_STATE = threading.local()
+
+
+def _rss_bytes():
+    """Resident set size of this process, or None where /proc is not available."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        return None
+
+
+def current_run():
+    """The run being recorded on this thread, or None."""
+    return getattr(_STATE, "run", None)
+
+
+def start_run(name: str, detail: bool = False, **context) -> dict:
+    """Start recording a run on this thread (replacing any unfinished one)."""
+    _STATE.run = {
+        "run_id": uuid.uuid4().hex[:12],
+        "name": name,
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "detail": detail,
+        "context": dict(context),
+        "stages": [],
+        "_start": time.perf_counter(),
+        "_depth": 0,
+    }
+    return _STATE.run
+
+
+def describe_output(obj, detail: bool = False) -> dict:
+    """Rows and bytes of a stage's output (in-memory size for frames, serialised size otherwise)."""
+    if isinstance(obj, tuple) and obj:
+        obj = obj[0]
+    if isinstance(obj, pd.DataFrame):
+        return {"rows": len(obj), "bytes": int(obj.memory_usage(index=True, deep=True).sum())}
+    if isinstance(obj, (str, bytes)):
+        return {"bytes": len(obj)}
+    if isinstance(obj, dict) and "features" in obj:
+        out = {"rows": len(obj["features"])}
+        if detail:
+            out["bytes"] = len(json.dumps(obj))
+        return out
+    if isinstance(obj, dict):
+        return {"rows": len(obj)}
+    if detail and getattr(obj, "_name", None) == "Map":  # folium map: the HTML st_folium sends
+        return {"bytes": len(obj.get_root().render())}
+    return {}
+
+
+@contextmanager
+def stage(name: str):
+    """
+    Record a stage of the current run. Yields the stage record: callers may add output
+    sizes with record.update(describe_output(result, record["detail"])).
+    """
+    run = current_run()
+    if run is None:
+        yield {"detail": False}
+        return
+    record = {"stage": name, "depth": run["_depth"], "detail": run["detail"]}
+    # Listed when entered, so a stage precedes the stages nested in it
+    run["stages"].append(record)
+    run["_depth"] += 1
+    rss_before = _rss_bytes()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        end = time.perf_counter()
+        rss_after = _rss_bytes()
+        run["_depth"] -= 1
+        record["start_s"] = round(start - run["_start"], 4)
+        record["seconds"] = round(end - start, 4)
+        record["rss_delta_bytes"] = rss_after - rss_before if rss_before is not None else None
+        del record["detail"]
+
+
+def instrumented(name: str = None):
+    """Decorator recording every call of a function as a stage, with its return value's size."""
+    def decorator(func):
+        stage_name = name or func.__qualname__
+
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            if current_run() is None:
+                return func(*args, **kwargs)
+            with stage(stage_name) as record:
+                result = func(*args, **kwargs)
+                record.update(describe_output(result, record["detail"]))
+            return result
+        return wrapper
+    return decorator
+
+
+def finish_run(log_path: str = STAGE_LOG, **context) -> dict:
+    """
+    Stop recording, append the run to the JSON-lines log (if log_path) and return it:
+    {"run_id", "name", "started_at", "total_s", "context", "stages": [...] in start order}.
+    Stages still open (the run finished from inside one) are dropped.
+    """
+    run = current_run()
+    if run is None:
+        return None
+    _STATE.run = None
+    run["context"].update(context)
+    run["total_s"] = round(time.perf_counter() - run.pop("_start"), 4)
+    run["stages"] = [r for r in run["stages"] if "seconds" in r]
+    run.pop("_depth")
+    if log_path:
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(log_path)), exist_ok=True)
+            with open(log_path, "a") as f:
+                f.write(json.dumps(run, default=str) + "\n")
+        except OSError as e:
+            print(f"Could not write stage log {log_path}: {e}")
+    return run
+
+
+def stages_frame(run: dict) -> pd.DataFrame:
+    """A run's stages as a table for the debug panel (nested stages indented)."""
+    rows = [{
+        "stage": "  " * r["depth"] + r["stage"],
+        "seconds": r["seconds"],
+        "rss_delta_mb": None if r.get("rss_delta_bytes") is None else round(r["rss_delta_bytes"] / 1e6, 2),
+        "rows": r.get("rows"),
+        "bytes": r.get("bytes"),
+    } for r in run["stages"]]
+    return pd.DataFrame(rows, columns=["stage", "seconds", "rss_delta_mb", "rows", "bytes"])
+
+
+def read_stage_log(log_path: str = STAGE_LOG) -> pd.DataFrame:
+    """Every logged stage as one row (run_id, name, started_at, context..., stage fields)."""
+    rows = []
+    with open(log_path) as f:
+        for line in f:
+            run = json.loads(line)
+            for record in run["stages"]:
+                rows.append({"run_id": run["run_id"], "name": run["name"], "started_at": run["started_at"],
+                             **run["context"], **record})
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    # Slowest stages across the logged dashboard runs
+    log = read_stage_log()
+    summary = (log.groupby(["name", "stage"])["seconds"]
+                  .agg(runs="count", median="median", p95=lambda s: s.quantile(0.95), max="max")
+                  .sort_values("p95", ascending=False))
+    print(summary.round(4).to_string())
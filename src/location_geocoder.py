@@ -0,0 +1,121 @@
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from pyproj import Transformer
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+from config import LAD_SHAPEFILE
+from data_cache import cached_by_files
+
+# =============================
+# Point-in-polygon fallback geocoder
+# =============================
+# Agencies whose postcode is not in the postcode directory (terminated, new or mistyped
+# postcodes) are resolved from their coordinates instead: one STRtree is bulk-built
+# over the LAD boundaries and all points are queried in a single vectorised call.
+
+BOUNDARY_CRS = "EPSG:27700"
+# (latitude, longitude) column pairs recognised in CQC exports, in order of preference
+COORDINATE_COLUMNS = [("Latitude", "Longitude"), ("latitude", "longitude"), ("Location Latitude", "Location Longitude"),
+                      ("lat", "long"), ("LAT", "LONG")]
+
+_TO_BNG = Transformer.from_crs("EPSG:4326", BOUNDARY_CRS, always_xy=True)
+
+
+@cached_by_files("shapefile")
+def load_lad_index(shapefile: str = LAD_SHAPEFILE) -> dict:
+    """LAD boundaries (British National Grid) with an STRtree over them: {"tree", "codes", "names"}."""
+    gdf = gpd.read_file(shapefile, columns=["LAD25CD", "LAD25NM"])
+    if gdf.crs is not None and gdf.crs != BOUNDARY_CRS:
+        gdf = gdf.to_crs(BOUNDARY_CRS)
+    geometries = shapely.make_valid(gdf.geometry.values)
+    return {
+        "tree": shapely.STRtree(geometries),
+        "codes": gdf["LAD25CD"].to_numpy(dtype=object),
+        "names": gdf["LAD25NM"].to_numpy(dtype=object),
+    }
+
+
+def coordinate_columns(df: pd.DataFrame):
+    """The (latitude, longitude) columns of a frame, or None if it has no coordinates."""
+    for lat_col, lon_col in COORDINATE_COLUMNS:
+        if lat_col in df.columns and lon_col in df.columns:
+            return lat_col, lon_col
+    return None
+
+
+def points_to_lads(lat: np.ndarray, lon: np.ndarray, lad_index: dict = None) -> np.ndarray:
+    """
+    Position in lad_index of the LAD containing each WGS84 point; -1 for points outside
+    every LAD or with missing coordinates. Points on a shared border get the first match.
+    """
+    lad_index = load_lad_index() if lad_index is None else lad_index
+    lat = np.asarray(lat, dtype=float)
+    lon = np.asarray(lon, dtype=float)
+    result = np.full(len(lat), -1, dtype=np.int64)
+
+    valid = np.flatnonzero(np.isfinite(lat) & np.isfinite(lon))
+    if valid.size == 0:
+        return result
+    x, y = _TO_BNG.transform(lon[valid], lat[valid])
+    points = shapely.points(x, y)
+    point_idx, lad_idx = lad_index["tree"].query(points, predicate="intersects")
+
+    # Keep the first LAD per point
+    first = np.unique(point_idx, return_index=True)[1]
+    result[valid[point_idx[first]]] = lad_idx[first]
+    return result
+
+
+def resolve_unmatched(cqc_geo: pd.DataFrame, lad_index: dict = None):
+    """
+    Fill ladcd/ladnm for agencies the postcode join left without a LAD, using their
+    coordinates. Adds a 'geocode_method' column ('postcode', 'location' or NaN).
+
+    Returns (cqc_geo, report) where report counts the agencies recovered and the LAD
+    coverage before and after. Without coordinate columns nothing is recovered.
+    """
+    cqc_geo = cqc_geo.copy()
+    matched = cqc_geo["ladnm"].notna()
+    cqc_geo["geocode_method"] = np.where(matched, "postcode", None)
+    report = {
+        "agencies": len(cqc_geo),
+        "matched_by_postcode": int(matched.sum()),
+        "unmatched": int((~matched).sum()),
+        "with_coordinates": 0,
+        "recovered": 0,
+    }
+
+    coords = coordinate_columns(cqc_geo)
+    report["coordinate_columns"] = list(coords) if coords else None
+    unmatched = np.flatnonzero(~matched.to_numpy())
+    if coords is not None and unmatched.size:
+        lat = pd.to_numeric(cqc_geo[coords[0]].iloc[unmatched], errors="coerce").to_numpy()
+        lon = pd.to_numeric(cqc_geo[coords[1]].iloc[unmatched], errors="coerce").to_numpy()
+        report["with_coordinates"] = int((np.isfinite(lat) & np.isfinite(lon)).sum())
+
+        lad_index = load_lad_index() if lad_index is None else lad_index
+        start = time.perf_counter()
+        lad_pos = points_to_lads(lat, lon, lad_index)
+        elapsed = time.perf_counter() - start
+
+        hit = lad_pos >= 0
+        rows = cqc_geo.index[unmatched[hit]]
+        for col in ("ladcd", "ladnm"):
+            if isinstance(cqc_geo[col].dtype, pd.CategoricalDtype):
+                cqc_geo[col] = cqc_geo[col].astype(object)
+        cqc_geo.loc[rows, "ladcd"] = lad_index["codes"][lad_pos[hit]]
+        cqc_geo.loc[rows, "ladnm"] = lad_index["names"][lad_pos[hit]]
+        cqc_geo.loc[rows, "geocode_method"] = "location"
+        report["recovered"] = int(hit.sum())
+        report["points_per_second"] = round(report["with_coordinates"] / elapsed) if elapsed > 0 else None
+
+    total = max(report["agencies"], 1)
+    report["coverage_before_pct"] = round(100 * report["matched_by_postcode"] / total, 2)
+    report["coverage_after_pct"] = round(100 * (report["matched_by_postcode"] + report["recovered"]) / total, 2)
+    return cqc_geo, report
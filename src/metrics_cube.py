@@ -0,0 +1,149 @@
+import json
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+from config import HOMECARE_AGENCIES_BY_LAD, LAD_POP_CSV_AGG, LAD_TO_COUNTY_MAPPING, MASTER_MAPPING, METRICS_CUBE
+from analysis import aggregate_lad_metrics
+from dashboard_data import METRIC_DICT, POPULATION_COLS, RATING_COLS, load_lad_metrics
+from data_cache import cached_by_files, cached_file_sha256
+from instrumentation import instrumented
+from frame_schema import compact_frame
+
+# =============================
+# Metrics cube: one row per (level, area), one column per metric
+# =============================
+# Bump when the cube layout or the metric definitions change, so old files get rebuilt
+CUBE_VERSION = 3
+CUBE_METADATA_KEY = b"metrics_cube"
+
+CUBE_LEVELS = ["LAD", "County", "Region", "Country"]
+
+# Dashboard map level -> cube level
+DASHBOARD_LEVELS = {
+    "Regions": "Region",
+    "Counties": "County",
+    "Local Authority Districts": "LAD",
+}
+
+CUBE_SOURCES = {
+    "population": LAD_POP_CSV_AGG,
+    "cqc_counts": HOMECARE_AGENCIES_BY_LAD,
+    "lad_to_county": LAD_TO_COUNTY_MAPPING,
+    "master_mapping": MASTER_MAPPING,
+}
+
+
+def source_hashes(sources: dict = CUBE_SOURCES) -> dict:
+    """Content hashes of the cube's input files, keyed by source name."""
+    return {name: cached_file_sha256(path) for name, path in sources.items()}
+
+
+def build_metrics_cube() -> pd.DataFrame:
+    """
+    Compute every metric in METRIC_DICT for every LAD, County, Region and Country.
+    Returns a long frame with columns ['level', 'area', <metrics>].
+    """
+    lad_df = load_lad_metrics()
+    metric_cols = list(METRIC_DICT)
+
+    frames = []
+    for level_name in CUBE_LEVELS:
+        agg_df = aggregate_lad_metrics(
+            lad_df,
+            level_name=level_name,
+            population_cols=POPULATION_COLS,
+            rating_cols=RATING_COLS,
+            agency_col="num_agencies"
+        )
+        agg_df = agg_df.rename(columns={level_name: "area"})
+        agg_df.insert(0, "level", level_name)
+        frames.append(agg_df[["level", "area"] + metric_cols])
+
+    cube = pd.concat(frames, ignore_index=True)
+    cube["level"] = pd.Categorical(cube["level"], categories=CUBE_LEVELS)
+    return compact_frame(cube)
+
+
+def write_metrics_cube(cube: pd.DataFrame, cube_path: str = METRICS_CUBE) -> str:
+    """Write the cube as Parquet, recording the format version and input hashes in the schema metadata."""
+    table = pa.Table.from_pandas(cube, preserve_index=False)
+    metadata = dict(table.schema.metadata or {})
+    metadata[CUBE_METADATA_KEY] = json.dumps({"version": CUBE_VERSION, "sources": source_hashes()}).encode()
+    table = table.replace_schema_metadata(metadata)
+
+    # Write to a temp file first so a running dashboard never reads a half-written cube; a
+    # unique one, as sessions rebuilding a stale cube (or the offline build) may write at once
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(cube_path), prefix=f"{os.path.basename(cube_path)}.",
+                                    suffix=".tmp")
+    os.close(fd)
+    try:
+        pq.write_table(table, tmp_path)
+        os.replace(tmp_path, cube_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return cube_path
+
+
+@cached_by_files("cube_path")
+def _read_metrics_cube(cube_path: str):
+    """Read the cube and its build metadata."""
+    table = pq.read_table(cube_path)
+    meta = json.loads(table.schema.metadata[CUBE_METADATA_KEY])
+    return table.to_pandas(), meta
+
+
+def is_cube_current(cube_path: str = METRICS_CUBE) -> bool:
+    """True when the cube file exists and was built from the current inputs with the current CUBE_VERSION."""
+    if not os.path.exists(cube_path):
+        return False
+    _, meta = _read_metrics_cube(cube_path)
+    return meta.get("version") == CUBE_VERSION and meta.get("sources") == source_hashes()
+
+
+@instrumented()
+def load_metrics_cube(cube_path: str = METRICS_CUBE, rebuild_if_stale: bool = True) -> pd.DataFrame:
+    """
+    Load the precomputed cube (shared object: copy before mutating).
+
+    If the file is missing or was built from different inputs, it is rebuilt
+    (and written back when the data folder is writable) unless rebuild_if_stale=False,
+    in which case a ValueError is raised.
+    """
+    if is_cube_current(cube_path):
+        cube, _ = _read_metrics_cube(cube_path)
+        return cube
+    if not rebuild_if_stale:
+        raise ValueError(f"Metrics cube at {cube_path} is missing or stale; run src/metrics_cube.py")
+
+    cube = build_metrics_cube()
+    try:
+        write_metrics_cube(cube, cube_path)
+    except OSError as e:
+        print(f"Could not write metrics cube to {cube_path}: {e}")
+    return cube
+
+
+def cube_level(cube: pd.DataFrame, level_name: str, key_col: str = None) -> pd.DataFrame:
+    """
+    Rows of one level ("LAD", "County", "Region", "Country") with the area column
+    renamed to key_col (defaults to the level name).
+    """
+    df = cube[cube["level"] == level_name].drop(columns="level").reset_index(drop=True)
+    if isinstance(df["area"].dtype, pd.CategoricalDtype):
+        df["area"] = df["area"].cat.remove_unused_categories()
+    return df.rename(columns={"area": key_col or level_name})
+
+
+if __name__ == "__main__":
+    cube = build_metrics_cube()
+    path = write_metrics_cube(cube)
+    print(f"Saved metrics cube ({len(cube)} rows x {len(METRIC_DICT)} metrics) to {path}")
+    print(cube["level"].value_counts().reindex(CUBE_LEVELS))
@@ -3,7 +3,76 @@ import sys
 from pathlib import Path
 
 sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
-from config import CITIES_GEOJSON, LAD_GEOJSON, REGION_GEOJSON, COUNTY_GEOJSON, LAD_POP_CSV, MASTER_MAPPING
+from config import CITIES_GEOJSON, LAD_GEOJSON, REGION_GEOJSON, COUNTY_GEOJSON, LAD_POP_CSV, MASTER_MAPPING, WARD_TO_LAD_MAPPING
+import catalog
+
+# Census 'Area' values look like "lsoa2021:E01000001 : City of London 001A" (OA rows may have no name)
+AREA_PATTERN = r"^\s*(?P<GeoType>[^:]+?)\s*:\s*(?P<Code>[^:\s]+)\s*(?::\s*(?P<Name>.*?))?\s*$"
+# Rows of the census file parsed at a time
+CENSUS_CHUNKSIZE = 100_000
+
+
+def parse_area(area: pd.Series) -> pd.DataFrame:
+    """Split the census 'Area' column into GeoType, Code and Name with one vectorised regex."""
+    parts = area.astype("string").str.extract(AREA_PATTERN)
+    parts["GeoType"] = parts["GeoType"].str.lower()
+    return parts
+
+
+def ingest_census_population(raw_csv_path: str, lookup_csv: str = WARD_TO_LAD_MAPPING, geo_type: str = "lsoa",
+                             oa_to_lsoa: pd.Series = None, skiprows: int = 5,
+                             chunksize: int = CENSUS_CHUNKSIZE):
+    """
+    Stream a census age-band file and aggregate it to LSOA and LAD.
+
+    Each chunk is parsed with parse_area, filtered to rows whose GeoType starts with
+    geo_type ("lsoa" or "oa") and summed per LSOA right away, so memory stays bounded by
+    the number of LSOAs rather than the number of input rows. OA rows need oa_to_lsoa
+    (a Series mapping OA21CD -> LSOA21CD).
+
+    Returns (lsoa_df, lad_df): population columns as int32 per LSOA21CD (with ward and
+    LAD codes/names from lookup_csv, as categoricals) and per LAD23NM.
+    """
+    if geo_type == "oa" and oa_to_lsoa is None:
+        raise ValueError("oa_to_lsoa mapping is required to aggregate OA rows to LSOA")
+
+    partials = []
+    pop_cols = None
+    for chunk in pd.read_csv(raw_csv_path, skiprows=skiprows, chunksize=chunksize):
+        if pop_cols is None:
+            pop_cols = [c for c in chunk.columns if 'Aged' in c or c == 'Total']
+        area = parse_area(chunk.iloc[:, 0])
+        keep = area["GeoType"].str.startswith(geo_type).fillna(False).to_numpy()
+        if not keep.any():
+            continue
+        codes = area.loc[keep, "Code"]
+        if geo_type == "oa":
+            codes = codes.map(oa_to_lsoa)
+        values = chunk.loc[keep, pop_cols].apply(pd.to_numeric, errors="coerce").fillna(0)
+        partials.append(values.groupby(codes.to_numpy()).sum())
+
+    if not partials:
+        raise ValueError(f"No '{geo_type}' rows found in {raw_csv_path}")
+
+    lsoa_df = pd.concat(partials).groupby(level=0).sum().astype("int32")
+    lsoa_df.index.name = "LSOA21CD"
+
+    lookup_cols = ["LSOA21CD", "LSOA21NM", "WD23CD", "WD23NM", "LAD23CD", "LAD23NM"]
+    lookup_dataset = catalog.dataset_for_source(lookup_csv)
+    if lookup_dataset is not None:
+        lookup = catalog.load(lookup_dataset, columns=lookup_cols)
+    else:
+        lookup = pd.read_csv(lookup_csv, usecols=lookup_cols)
+    lsoa_df = lookup.merge(lsoa_df.reset_index(), on="LSOA21CD", how="right")
+    unmatched = lsoa_df["LAD23NM"].isna().sum()
+    if unmatched:
+        print(f"{unmatched} LSOAs not found in {Path(lookup_csv).name}")
+    for col in ["LSOA21CD", "LSOA21NM", "WD23CD", "WD23NM", "LAD23CD", "LAD23NM"]:
+        lsoa_df[col] = lsoa_df[col].astype("category")
+
+    lad_df = lsoa_df.groupby("LAD23NM", observed=True)[pop_cols].sum().reset_index()
+    lad_df["LAD23NM"] = lad_df["LAD23NM"].astype(str)
+    return lsoa_df, lad_df
 
 
 def load_master_mapping(mapping_csv_path: str) -> pd.DataFrame:
@@ -52,20 +121,9 @@ def aggregate_lad_population(raw_csv_path: str, output_dir: str = "data") -> str
     Aggregate LAD-level population from a raw CSV and save it to a new file
     with '_aggregated' suffix. OA rows are ignored.
     """
-    # Load raw CSV (skip headers if needed)
-    df = pd.read_csv(raw_csv_path, skiprows=5)  # adjust skiprows as required
-
-    # Keep only LSOA rows
-    df = df[df['Area'].str.startswith('lsoa2021:')].copy()
-
-    # Extract LAD name from 'Area' column
-    df['LAD25NM'] = df['Area'].apply(lambda x: x.split(':')[-1].strip().split()[0])
-
-    # Columns to aggregate
-    pop_cols = [c for c in df.columns if 'Aged' in c or c == 'Total']
-
-    # Aggregate by LAD
-    agg_df = df.groupby('LAD25NM')[pop_cols].sum().reset_index()
+    # LSOA rows only, LAD taken from the ONS LSOA -> LAD lookup
+    _, agg_df = ingest_census_population(raw_csv_path)
+    agg_df = agg_df.rename(columns={"LAD23NM": "LAD25NM"})
 
     # Ensure output directory exists
     Path(output_dir).mkdir(parents=True, exist_ok=True)
@@ -79,8 +137,9 @@ def aggregate_lad_population(raw_csv_path: str, output_dir: str = "data") -> str
 
 def load_population(csv_path):
     """Load population CSV and return cleaned DataFrame."""
-    df = pd.read_csv(LAD_POP_CSV, skiprows=5)  # skip header rows if needed
-    df['LADU2023'] = df['Area'].apply(lambda x: x.split(':')[-1].split()[0])
+    df = pd.read_csv(csv_path, skiprows=5)  # skip header rows if needed
+    area = parse_area(df['Area'])
+    df['LADU2023'] = area['Name'].str.split(n=1).str[0]
     return df
 
 def aggregate_by_LAD(df):
@@ -89,15 +148,17 @@ def aggregate_by_LAD(df):
     agg_df = df.groupby('LAD25NM')[pop_cols].sum().reset_index()
     return agg_df
 
-# Usage
-mapping_df = load_master_mapping(MASTER_MAPPING)
-aggregated_csv = aggregate_lad_population(LAD_POP_CSV, output_dir="aggregated")
-lad_agg = aggregate_population_by_level(aggregated_csv, mapping_df, level="LAD")
-county_agg = aggregate_population_by_level(aggregated_csv, mapping_df, level="County")
-region_agg = aggregate_population_by_level(aggregated_csv, mapping_df, level="Region")
 
-lad_agg.to_csv(LAD_POP_CSV + 'lad_agg', index=False)
-county_agg.to_csv(LAD_POP_CSV + 'county_agg', index=False)
-region_agg.to_csv(LAD_POP_CSV + 'region_agg', index=False)
+if __name__ == "__main__":
+    # Usage
+    mapping_df = load_master_mapping(MASTER_MAPPING)
+    aggregated_csv = aggregate_lad_population(LAD_POP_CSV, output_dir="aggregated")
+    lad_agg = aggregate_population_by_level(aggregated_csv, mapping_df, level="LAD")
+    county_agg = aggregate_population_by_level(aggregated_csv, mapping_df, level="County")
+    region_agg = aggregate_population_by_level(aggregated_csv, mapping_df, level="Region")
+
+    lad_agg.to_csv(LAD_POP_CSV + 'lad_agg', index=False)
+    county_agg.to_csv(LAD_POP_CSV + 'county_agg', index=False)
+    region_agg.to_csv(LAD_POP_CSV + 'region_agg', index=False)
 
-print("Aggregated LAD CSV saved at:", lad_agg)
\ No newline at end of file
+    print("Aggregated LAD CSV saved at:", lad_agg)
@@ -4,6 +4,8 @@ import pandas as pd
 import folium
 from streamlit_folium import st_folium
 import json
+import sys
+from pathlib import Path
 
 # =============================
 # 1. Sample Data
@@ -16,23 +18,17 @@ region_df = pd.DataFrame({
 # =============================
 # 2. Load GeoJSON
 # =============================
-geojson_path = "/Users/obozkan/Library/Mobile Documents/com~apple~CloudDocs/__Python/geo_analysis/data/Regions_December_2024_Boundaries_EN_BUC_4744747487989771477.geojson"
-with open(geojson_path) as f:
-    geojson_data = json.load(f)
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+from dashboard_data import LEVELS, load_level_geojson
+from area_index import area_lookup, area_bounds
 
-# Precompute region centroids for zooming
-centroids = {}
-for feature in geojson_data["features"]:
-    name = feature["properties"]["RGN24NM"]
-    # approximate centroid from bounding box
-    coords = feature["geometry"]["coordinates"]
-    # handle MultiPolygon vs Polygon
-    if feature["geometry"]["type"] == "MultiPolygon":
-        all_coords = [pt for polygon in coords for ring in polygon for pt in ring]
-    else:
-        all_coords = [pt for ring in coords for pt in ring]
-    lons, lats = zip(*all_coords)
-    centroids[name] = [sum(lats)/len(lats), sum(lons)/len(lons)]
+geojson_data = load_level_geojson("Regions")
+region_prop = LEVELS["Regions"]["geojson_prop"]
+
+# Label points (always inside the region) and bounding boxes, computed once per boundary
+# file version (src/area_index.py)
+regions = area_lookup("Regions")
+centroids = {name: [entry["label_lat"], entry["label_lon"]] for name, entry in regions.items()}
 
 # =============================
 # 3. Streamlit Layout
@@ -56,7 +52,8 @@ with col2:
 with col1:
     # Center map on selected region
     center = centroids[selected_region]
-    m = folium.Map(location=center, zoom_start=7)  # set zoom here
+    m = folium.Map(location=center, zoom_start=7)
+    m.fit_bounds(area_bounds(regions[selected_region]))
 
     # Add choropleth for all regions
     folium.Choropleth(
@@ -64,7 +61,7 @@ with col1:
         name="choropleth",
         data=region_df,
         columns=["Region", "companies_per_1k"],
-        key_on="feature.properties.RGN24NM",
+        key_on=f"feature.properties.{region_prop}",
         fill_color="Reds",
         fill_opacity=0.6,
         line_opacity=0.3,
@@ -73,7 +70,7 @@ with col1:
 
     # Highlight selected region
     for feature in geojson_data["features"]:
-        name = feature["properties"]["RGN24NM"]
+        name = feature["properties"][region_prop]
         folium.GeoJson(
             feature,
             style_function=lambda f, n=name: {
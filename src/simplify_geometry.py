@@ -0,0 +1,133 @@
+import json
+import os
+import sys
+from pathlib import Path
+
+import geopandas as gpd
+import shapely
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+from config import SIMPLIFIED_DIR, SIMPLIFY_TOLERANCES
+from dashboard_data import LEVELS, simplified_path
+
+# =============================
+# Multi-resolution boundaries
+# =============================
+# Simplification runs in British National Grid so tolerances are in metres.
+# coverage_simplify simplifies the shared edges of neighbouring areas once, so the
+# simplified polygons still tile without gaps or overlaps.
+PROJECTED_CRS = "EPSG:27700"
+OUTPUT_CRS = "EPSG:4326"
+
+
+def load_boundaries(level: str) -> gpd.GeoDataFrame:
+    """Read the boundary source of a level (GeoJSON or shapefile) in British National Grid."""
+    gdf = gpd.read_file(LEVELS[level]["boundary_source"])
+    gdf["geometry"] = shapely.make_valid(gdf.geometry.values)
+    return gdf.to_crs(PROJECTED_CRS)
+
+
+def simplify_coverage(gdf: gpd.GeoDataFrame, tolerance: float) -> gpd.GeoDataFrame:
+    """
+    Topology-preserving simplification of a polygon coverage.
+
+    Falls back to per-polygon simplify(preserve_topology=True) when the shapely/GEOS
+    build has no coverage_simplify or the input is not a clean coverage (in that
+    case neighbouring borders may no longer line up exactly).
+    """
+    out = gdf.copy()
+    try:
+        out["geometry"] = shapely.coverage_simplify(gdf.geometry.values, tolerance)
+    except (AttributeError, shapely.errors.GEOSException) as e:
+        print(f"coverage_simplify unavailable ({e}); simplifying polygons independently")
+        out["geometry"] = gdf.geometry.simplify(tolerance, preserve_topology=True)
+    return out
+
+
+def drop_small_parts(gdf: gpd.GeoDataFrame, min_area: float) -> gpd.GeoDataFrame:
+    """
+    Remove polygon parts (mostly small islands) below min_area, keeping at least
+    the largest part of every area. Whole parts are dropped, so shared borders are untouched.
+    """
+    parts = gdf.geometry.explode(index_parts=True)
+    areas = parts.area
+    largest = areas.groupby(level=0).transform("max")
+    keep = (areas >= min_area) | (areas == largest)
+    out = gdf.copy()
+    out["geometry"] = parts[keep].groupby(level=0).agg(lambda g: shapely.union_all(g.values)
+                                                       if len(g) > 1 else g.iloc[0])
+    return out
+
+
+def write_geojson(gdf: gpd.GeoDataFrame, path: str, precision: int = 6):
+    """Write GeoJSON with coordinates rounded to `precision` decimals (6 dp is ~0.1 m)."""
+    if os.path.exists(path):
+        os.remove(path)
+    gdf.to_file(path, driver="GeoJSON", engine="pyogrio", COORDINATE_PRECISION=precision)
+
+
+def write_topojson(gdf: gpd.GeoDataFrame, path: str, level: str) -> bool:
+    """Write a TopoJSON version (needs the optional 'topojson' package). Returns False if skipped."""
+    try:
+        import topojson
+    except ImportError:
+        print("topojson package not installed; skipping", path)
+        return False
+    topology = topojson.Topology(gdf, object_name=LEVELS[level]["slug"], prequantize=1e6)
+    with open(path, "w") as f:
+        f.write(topology.to_json())
+    return True
+
+
+def build_simplified_level(level: str, tolerances=None) -> list:
+    """
+    Build the simplified GeoJSON/TopoJSON files of one level for every tolerance.
+    Returns a list of dicts describing the outputs.
+    """
+    tolerances = sorted(set(SIMPLIFY_TOLERANCES.values())) if tolerances is None else tolerances
+    boundaries = load_boundaries(level)
+    n_coords = int(shapely.get_num_coordinates(boundaries.geometry.values).sum())
+    os.makedirs(SIMPLIFIED_DIR, exist_ok=True)
+
+    outputs = []
+    for tolerance in tolerances:
+        simplified = simplify_coverage(boundaries, tolerance)
+        # Parts smaller than a tolerance-sized square are below what the map can show at that zoom
+        simplified = drop_small_parts(simplified, tolerance ** 2).to_crs(OUTPUT_CRS)
+
+        geojson_path = simplified_path(level, tolerance, "geojson")
+        write_geojson(simplified, geojson_path)
+
+        topojson_path = simplified_path(level, tolerance, "topojson")
+        if not write_topojson(simplified, topojson_path, level):
+            topojson_path = None
+
+        outputs.append({
+            "level": level,
+            "tolerance_m": tolerance,
+            "coords_in": n_coords,
+            "coords_out": int(shapely.get_num_coordinates(simplified.geometry.values).sum()),
+            "geojson": geojson_path,
+            "geojson_bytes": os.path.getsize(geojson_path),
+            "topojson": topojson_path,
+            "topojson_bytes": os.path.getsize(topojson_path) if topojson_path else None,
+        })
+    return outputs
+
+
+def build_all_simplified(levels=None, tolerances=None) -> list:
+    """Build simplified boundaries for every dashboard level and write a manifest."""
+    outputs = []
+    for level in levels or LEVELS:
+        outputs.extend(build_simplified_level(level, tolerances))
+    with open(os.path.join(SIMPLIFIED_DIR, "manifest.json"), "w") as f:
+        json.dump(outputs, f, indent=2)
+    return outputs
+
+
+if __name__ == "__main__":
+    for out in build_all_simplified():
+        print(f"{out['level']:<26} {out['tolerance_m']:>5} m  "
+              f"coords {out['coords_in']:>7} -> {out['coords_out']:>7}  "
+              f"GeoJSON {out['geojson_bytes'] / 1e6:6.2f} MB  "
+              f"TopoJSON {(out['topojson_bytes'] or 0) / 1e6:6.2f} MB")
@@ -0,0 +1,281 @@
+import argparse
+import json
+import os
+import re
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as pads
+import pyarrow.parquet as pq
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+from config import SNAPSHOT_DIR, HOMECARE_AGENCIES_BY_LAD
+from dashboard_data import POPULATION_COLS, RATING_COLS, load_lad_metrics
+from analysis import aggregate_lad_metrics
+from hierarchy import load_hierarchy, lookup_ids
+from data_cache import cached_by_files
+from instrumentation import instrumented
+
+# =============================
+# CQC snapshot store
+# =============================
+# Every dated CQC export is kept as one time slice of LAD x rating counts in a
+# hive-partitioned Parquet dataset (SNAPSHOT_DIR/snapshot_date=YYYY-MM-DD/counts.parquet,
+# long format: ladnm, CQC_Rating, agencies). snapshots.json lists the slices.
+# Queries read only the partitions they ask for and recompute the dashboard metrics per
+# slice with aggregate_lad_metrics, so trends use the same definitions as the maps.
+#
+#   python src/snapshot_store.py add "data/HomeCareAgencies_data (08-09-2025)(ALL_CQC_RATINGS)_LAD_CQC_counts.csv"
+#   python src/snapshot_store.py trend Good_pct --level Region
+
+MANIFEST_NAME = "snapshots.json"
+PARTITION_FIELD = "snapshot_date"
+# Export file names carry the snapshot date as (dd-mm-yyyy)
+FILENAME_DATE = re.compile(r"\((\d{2})-(\d{2})-(\d{4})\)")
+
+_COUNTS_SCHEMA = pa.schema([
+    ("ladnm", pa.dictionary(pa.int32(), pa.string())),
+    ("CQC_Rating", pa.dictionary(pa.int8(), pa.string())),
+    ("agencies", pa.int32()),
+])
+_MANIFEST_LOCK = threading.Lock()
+
+
+def manifest_path(store_dir: str = SNAPSHOT_DIR) -> str:
+    return os.path.join(store_dir, MANIFEST_NAME)
+
+
+def read_manifest(store_dir: str = SNAPSHOT_DIR) -> dict:
+    """Snapshot date -> metadata (empty if the store has no snapshots)."""
+    try:
+        with open(manifest_path(store_dir)) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def list_snapshots(store_dir: str = SNAPSHOT_DIR) -> list:
+    """Snapshot dates (ISO strings) in the store, oldest first."""
+    return sorted(read_manifest(store_dir))
+
+
+def date_from_filename(path: str):
+    """ISO date of an export named like '...(08-09-2025)...', or None."""
+    match = FILENAME_DATE.search(os.path.basename(path))
+    if match is None:
+        return None
+    day, month, year = match.groups()
+    return f"{year}-{month}-{day}"
+
+
+def _partition_dir(snapshot_date: str, store_dir: str) -> str:
+    return os.path.join(store_dir, f"{PARTITION_FIELD}={snapshot_date}")
+
+
+def append_snapshot(counts: pd.Series, snapshot_date: str, source: str = None, store_dir: str = SNAPSHOT_DIR,
+                    overwrite: bool = False) -> dict:
+    """
+    Store (ladnm, CQC_Rating) agency counts (see CQCPostCodeLADMapping.rating_counts) as the
+    slice for snapshot_date. Raises ValueError if that date is already stored, unless overwrite.
+    """
+    snapshot_date = pd.Timestamp(snapshot_date).date().isoformat()
+    if snapshot_date in read_manifest(store_dir) and not overwrite:
+        raise ValueError(f"Snapshot {snapshot_date} already stored; pass overwrite=True to replace it")
+
+    frame = counts[counts != 0].rename("agencies").reset_index()
+    frame = frame.sort_values(["ladnm", "CQC_Rating"], ignore_index=True)
+    table = pa.Table.from_pandas(frame.astype({"ladnm": str, "CQC_Rating": str}), preserve_index=False)
+    table = table.cast(_COUNTS_SCHEMA)
+
+    # Written next to the store and renamed, so readers never see a half-written slice
+    partition = _partition_dir(snapshot_date, store_dir)
+    tmp_partition = f"{partition}.tmp"
+    shutil.rmtree(tmp_partition, ignore_errors=True)
+    os.makedirs(tmp_partition)
+    pq.write_table(table, os.path.join(tmp_partition, "counts.parquet"))
+    shutil.rmtree(partition, ignore_errors=True)
+    os.replace(tmp_partition, partition)
+
+    meta = {
+        "source": os.path.abspath(source) if source else None,
+        "agencies": int(frame["agencies"].sum()),
+        "lads": int(frame["ladnm"].nunique()),
+        "stored_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+    }
+    with _MANIFEST_LOCK:
+        manifest = read_manifest(store_dir)
+        manifest[snapshot_date] = meta
+        os.makedirs(store_dir, exist_ok=True)
+        tmp_path = f"{manifest_path(store_dir)}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, manifest_path(store_dir))
+    return meta
+
+
+def append_lad_outputs(lad_cqc_csv: str, snapshot_date: str = None, store_dir: str = SNAPSHOT_DIR,
+                       overwrite: bool = False) -> dict:
+    """Store a saved *_LAD_CQC_counts file; the date defaults to the one in its file name."""
+    snapshot_date = snapshot_date or date_from_filename(lad_cqc_csv)
+    if snapshot_date is None:
+        raise ValueError(f"No (dd-mm-yyyy) date in {lad_cqc_csv!r}; pass the snapshot date explicitly")
+    # Imported here: the mapping pipeline pulls in geopandas, which the dashboards never need
+    from CQCPostCodeLADMapping import counts_from_lad_outputs
+    counts = counts_from_lad_outputs(pd.read_csv(lad_cqc_csv))
+    return append_snapshot(counts, snapshot_date, lad_cqc_csv, store_dir, overwrite)
+
+
+# =============================
+# Queries
+# =============================
+@cached_by_files("manifest")
+def _read_slices(manifest: str, dates: tuple) -> pd.DataFrame:
+    """Long counts of the given snapshots, reading only their partitions."""
+    dataset = pads.dataset(os.path.dirname(manifest), format="parquet",
+                           partitioning=pads.partitioning(pa.schema([(PARTITION_FIELD, pa.string())]),
+                                                          flavor="hive"),
+                           exclude_invalid_files=True)
+    table = dataset.to_table(filter=pads.field(PARTITION_FIELD).isin(list(dates)))
+    return table.to_pandas()
+
+
+def load_counts(dates=None, store_dir: str = SNAPSHOT_DIR) -> pd.DataFrame:
+    """
+    Long frame [snapshot_date, ladnm, CQC_Rating, agencies] of the requested snapshots
+    (all if None). Shared object: copy before mutating.
+    """
+    stored = list_snapshots(store_dir)
+    dates = stored if dates is None else [pd.Timestamp(d).date().isoformat() for d in dates]
+    missing = sorted(set(dates) - set(stored))
+    if missing:
+        raise KeyError(f"Snapshots not in the store: {missing}. Stored: {stored}")
+    if not dates:
+        return pd.DataFrame(columns=[PARTITION_FIELD, "ladnm", "CQC_Rating", "agencies"])
+    return _read_slices(manifest_path(store_dir), tuple(sorted(dates)))
+
+
+def lad_count_array(counts: pd.DataFrame) -> tuple:
+    """
+    Counts of many snapshots as one array in a single pass.
+    Returns (dates, ratings, array[date, LAD id, rating]) with LAD ids from hierarchy.py;
+    LAD names the lookups do not know are dropped.
+    """
+    hierarchy = load_hierarchy()
+    dates, date_idx = np.unique(counts[PARTITION_FIELD].astype(str).to_numpy(), return_inverse=True)
+    ratings, rating_idx = np.unique(counts["CQC_Rating"].astype(str).to_numpy(), return_inverse=True)
+    # Resolve each distinct LAD name once, not once per snapshot row
+    lad_names, name_idx = np.unique(counts["ladnm"].astype(str).to_numpy(), return_inverse=True)
+    lad_idx = lookup_ids(hierarchy, "LAD", names=lad_names)[name_idx]
+
+    known = lad_idx >= 0
+    array = np.zeros((len(dates), len(hierarchy["LAD"]["codes"]), len(ratings)))
+    np.add.at(array, (date_idx[known], lad_idx[known], rating_idx[known]), counts["agencies"].to_numpy()[known])
+    return list(dates), list(ratings), array
+
+
+def snapshot_lad_frame(lad_counts: np.ndarray, ratings: list) -> pd.DataFrame:
+    """
+    LAD frame of one snapshot (lad_counts: [LAD id, rating] slice of lad_count_array) in
+    the layout of load_lad_metrics: current populations, the snapshot's rating counts and
+    num_agencies, ready for aggregate_lad_metrics.
+    """
+    hierarchy = load_hierarchy()
+    lad_df = load_lad_metrics()[["LAD23CD", "LAD23NM", "Total"] + POPULATION_COLS]
+    lad_ids = lookup_ids(hierarchy, "LAD", codes=lad_df["LAD23CD"])
+    lad_df = lad_df[lad_ids >= 0]
+    lad_ids = lad_ids[lad_ids >= 0]
+
+    columns = {"num_agencies": lad_counts[lad_ids].sum(axis=1)}
+    for col in RATING_COLS + ["Not Rated"]:
+        columns[col] = lad_counts[lad_ids, ratings.index(col)] if col in ratings else np.zeros(len(lad_ids))
+    return lad_df.assign(**columns)
+
+
+def metric_frame(dates=None, level: str = "LAD", store_dir: str = SNAPSHOT_DIR) -> pd.DataFrame:
+    """
+    Every dashboard metric per (snapshot_date, area) at a hierarchy level ("LAD", "County",
+    "Region" or "Country"). Long frame [snapshot_date, <level>, <metrics>].
+    """
+    counts = load_counts(dates, store_dir)
+    if counts.empty:
+        return pd.DataFrame(columns=[PARTITION_FIELD, level])
+    snapshot_dates, ratings, array = lad_count_array(counts)
+    frames = []
+    for i, snapshot_date in enumerate(snapshot_dates):
+        agg_df = aggregate_lad_metrics(snapshot_lad_frame(array[i], ratings), level_name=level,
+                                       population_cols=POPULATION_COLS, rating_cols=RATING_COLS)
+        agg_df.insert(0, PARTITION_FIELD, snapshot_date)
+        frames.append(agg_df)
+    return pd.concat(frames, ignore_index=True)
+
+
+@instrumented()
+def metric_series(metric: str, level: str = "LAD", areas=None, start: str = None, end: str = None,
+                  store_dir: str = SNAPSHOT_DIR) -> pd.DataFrame:
+    """
+    Metric X over time for areas Y: one row per snapshot (DatetimeIndex), one column per
+    area. Only the snapshots between start and end (inclusive) are read.
+    """
+    dates = [d for d in list_snapshots(store_dir)
+             if (start is None or d >= pd.Timestamp(start).date().isoformat())
+             and (end is None or d <= pd.Timestamp(end).date().isoformat())]
+    frame = metric_frame(dates, level, store_dir)
+    if areas is not None:
+        frame = frame[frame[level].isin(list(areas))]
+    series = frame.pivot(index=PARTITION_FIELD, columns=level, values=metric)
+    series.index = pd.to_datetime(series.index)
+    series.columns.name = None
+    return series
+
+
+@instrumented()
+def period_change(metric: str, level: str, start: str, end: str, key_col: str = None,
+                  store_dir: str = SNAPSHOT_DIR) -> pd.DataFrame:
+    """
+    Change of a metric between two snapshots, one row per area:
+    [key_col (default the level), start, end, change, change_pct]. Reads the two slices only.
+    Areas missing from one snapshot count as 0 there; change_pct is NaN where start is 0.
+    """
+    start, end = pd.Timestamp(start).date().isoformat(), pd.Timestamp(end).date().isoformat()
+    frame = metric_frame([start, end], level, store_dir)
+    wide = frame.pivot(index=level, columns=PARTITION_FIELD, values=metric).reindex(columns=[start, end])
+    wide = wide.fillna(0)
+    out = pd.DataFrame({
+        key_col or level: wide.index.to_numpy(dtype=object),
+        "start": wide[start].to_numpy(dtype=float),
+        "end": wide[end].to_numpy(dtype=float),
+    })
+    out["change"] = out["end"] - out["start"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        out["change_pct"] = np.where(out["start"] != 0, out["change"] / out["start"] * 100, np.nan)
+    return out
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dated CQC LAD x rating snapshots.")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add = commands.add_parser("add", help="Store a *_LAD_CQC_counts output as a snapshot")
+    add.add_argument("lad_cqc_csv", nargs="?", default=HOMECARE_AGENCIES_BY_LAD)
+    add.add_argument("--date", help="Snapshot date (default: the (dd-mm-yyyy) date in the file name)")
+    add.add_argument("--overwrite", action="store_true")
+    commands.add_parser("list", help="List stored snapshots")
+    trend = commands.add_parser("trend", help="Print a metric over time")
+    trend.add_argument("metric")
+    trend.add_argument("--level", default="Region", choices=["LAD", "County", "Region", "Country"])
+    trend.add_argument("--areas", nargs="+")
+    args = parser.parse_args()
+
+    if args.command == "add":
+        meta = append_lad_outputs(args.lad_cqc_csv, args.date, overwrite=args.overwrite)
+        print(f"Stored {meta['agencies']} agencies in {meta['lads']} LADs from {args.lad_cqc_csv}")
+    elif args.command == "list":
+        for snapshot_date, meta in sorted(read_manifest().items()):
+            print(f"{snapshot_date}  {meta['agencies']:>6} agencies  {meta['lads']:>4} LADs  {meta['source']}")
+    else:
+        print(metric_series(args.metric, args.level, args.areas).astype(float).round(2).to_string())
@@ -0,0 +1,79 @@
+import re
+import sys
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+from config import TILE_SERVER_HOST, TILE_SERVER_PORT
+from dashboard_data import LEVELS
+from vector_tiles import read_tile, tiles_path
+
+# =============================
+# Local vector-tile server
+# =============================
+# Serves /<level slug>/<z>/<x>/<y>.pbf straight from the MBTiles files. Tiles are stored
+# gzipped, so they are sent as-is with Content-Encoding: gzip. Tiles with no boundaries
+# answer 204, which Leaflet.VectorGrid treats as an empty tile.
+
+TILE_URL = re.compile(r"^/(?P<slug>[a-z]+)/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)\.pbf$")
+
+_SERVER = None
+_SERVER_LOCK = threading.Lock()
+
+
+class _TileHandler(BaseHTTPRequestHandler):
+    paths = {spec["slug"]: tiles_path(level) for level, spec in LEVELS.items()}
+
+    def do_GET(self):
+        match = TILE_URL.match(self.path.split("?", 1)[0])
+        if match is None or match["slug"] not in self.paths:
+            self.send_error(404)
+            return
+        try:
+            data = read_tile(self.paths[match["slug"]], int(match["z"]), int(match["x"]), int(match["y"]))
+        except Exception as e:  # missing or unreadable MBTiles file
+            self.send_error(404, str(e))
+            return
+        if data is None:
+            self.send_response(204)
+            self.send_header("Access-Control-Allow-Origin", "*")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-protobuf")
+        self.send_header("Content-Encoding", "gzip")
+        self.send_header("Content-Length", str(len(data)))
+        self.send_header("Cache-Control", "max-age=3600")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def tile_url_template(level: str, host: str = TILE_SERVER_HOST, port: int = TILE_SERVER_PORT) -> str:
+    """Leaflet URL template of a level's tiles on the local server."""
+    return f"http://{host}:{port}/{LEVELS[level]['slug']}/{{z}}/{{x}}/{{y}}.pbf"
+
+
+def start_tile_server(host: str = TILE_SERVER_HOST, port: int = TILE_SERVER_PORT) -> ThreadingHTTPServer:
+    """Start the tile server on a daemon thread (once per process) and return it."""
+    global _SERVER
+    with _SERVER_LOCK:
+        if _SERVER is None:
+            _SERVER = ThreadingHTTPServer((host, port), _TileHandler)
+            _SERVER.daemon_threads = True
+            threading.Thread(target=_SERVER.serve_forever, name="tile-server", daemon=True).start()
+    return _SERVER
+
+
+if __name__ == "__main__":
+    server = start_tile_server()
+    print(f"Serving vector tiles on http://{TILE_SERVER_HOST}:{TILE_SERVER_PORT}/<level>/<z>/<x>/<y>.pbf "
+          f"for {', '.join(_TileHandler.paths)} (Ctrl+C to stop)")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
@@ -0,0 +1,250 @@
+import gzip
+import json
+import os
+import sqlite3
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import shapely
+from shapely.geometry.polygon import orient
+
+sys.path.append(str(Path(__file__).resolve().parent.parent / "src"))
+from config import TILES_DIR, VECTOR_TILE_ZOOMS, VECTOR_TILE_EXTENT
+from dashboard_data import LEVELS, GEOJSON_NAME_FIXES
+
+# =============================
+# Boundary vector tiles (MVT in MBTiles)
+# =============================
+# Each level's boundaries are cut once into Mapbox Vector Tiles (one layer named after
+# the level slug, features carrying only 'code' and 'name') and stored in an MBTiles
+# file. The map then fetches just the tiles of the current viewport from the local tile
+# server (tile_server.py) and colours them client-side, so the HTML no longer grows
+# with the size of the boundary file.
+
+WEB_MERCATOR = "EPSG:3857"
+MERCATOR_HALF_WORLD = 20037508.342789244
+# Extra margin around each tile (in tile units) so borders do not show seams
+TILE_BUFFER = 64
+
+
+def tiles_path(level: str) -> str:
+    """MBTiles file of a map level."""
+    return os.path.join(TILES_DIR, f"{LEVELS[level]['slug']}.mbtiles")
+
+
+# =============================
+# MVT encoding (protobuf wire format, vector_tile.proto v2)
+# =============================
+def _varint(value: int) -> bytes:
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+def _field(number: int, wire_type: int) -> bytes:
+    return _varint((number << 3) | wire_type)
+
+
+def _length_delimited(number: int, payload: bytes) -> bytes:
+    return _field(number, 2) + _varint(len(payload)) + payload
+
+
+def _packed(number: int, values) -> bytes:
+    return _length_delimited(number, b"".join(_varint(v) for v in values))
+
+
+def _zigzag(value: int) -> int:
+    return (value << 1) ^ (value >> 63)
+
+
+def _command(command_id: int, count: int) -> int:
+    return (command_id & 0x7) | (count << 3)
+
+
+def encode_polygon_rings(rings: list) -> list:
+    """
+    MVT geometry commands for a list of rings (integer tile coordinates, exterior rings
+    already clockwise in y-down tile space and holes counter-clockwise).
+    """
+    commands = []
+    cursor_x = cursor_y = 0
+    for ring in rings:
+        # Drop the closing point and repeated vertices created by quantisation
+        ring = ring[:-1]
+        keep = np.ones(len(ring), dtype=bool)
+        keep[1:] = np.any(ring[1:] != ring[:-1], axis=1)
+        ring = ring[keep]
+        if len(ring) < 3:
+            continue
+        deltas = np.diff(np.vstack([[cursor_x, cursor_y], ring]), axis=0)
+        commands.append(_command(1, 1))
+        commands.extend((_zigzag(int(deltas[0, 0])), _zigzag(int(deltas[0, 1]))))
+        commands.append(_command(2, len(ring) - 1))
+        for dx, dy in deltas[1:]:
+            commands.extend((_zigzag(int(dx)), _zigzag(int(dy))))
+        commands.append(_command(7, 1))
+        cursor_x, cursor_y = ring[-1]
+    return commands
+
+
+def encode_layer(name: str, features: list, extent: int = VECTOR_TILE_EXTENT) -> bytes:
+    """
+    One MVT layer. features: (id, properties dict of str -> str, geometry commands).
+    Property keys and values are de-duplicated into the layer tables, as the spec requires.
+    """
+    keys, values = {}, {}
+    encoded = []
+    for feature_id, properties, geometry in features:
+        tags = []
+        for key, value in properties.items():
+            tags.append(keys.setdefault(key, len(keys)))
+            tags.append(values.setdefault(str(value), len(values)))
+        encoded.append(_length_delimited(2, _field(1, 0) + _varint(feature_id) + _packed(2, tags)
+                                         + _field(3, 0) + _varint(3) + _packed(4, geometry)))
+    payload = (_field(15, 0) + _varint(2) + _length_delimited(1, name.encode())
+               + b"".join(encoded)
+               + b"".join(_length_delimited(3, k.encode()) for k in keys)
+               + b"".join(_length_delimited(4, _length_delimited(1, v.encode())) for v in values)
+               + _field(5, 0) + _varint(extent))
+    return _length_delimited(3, payload)
+
+
+# =============================
+# Tiling
+# =============================
+def tile_bounds(z: int, x: int, y: int) -> tuple:
+    """Web Mercator bounds (minx, miny, maxx, maxy) of an XYZ tile."""
+    size = 2 * MERCATOR_HALF_WORLD / (1 << z)
+    minx = -MERCATOR_HALF_WORLD + x * size
+    maxy = MERCATOR_HALF_WORLD - y * size
+    return minx, maxy - size, minx + size, maxy
+
+
+def tile_range(bounds: tuple, z: int) -> tuple:
+    """XYZ tile ranges (x0, x1, y0, y1), inclusive, covering Web Mercator bounds."""
+    size = 2 * MERCATOR_HALF_WORLD / (1 << z)
+    last = (1 << z) - 1
+    x0 = min(max(int((bounds[0] + MERCATOR_HALF_WORLD) // size), 0), last)
+    x1 = min(max(int((bounds[2] + MERCATOR_HALF_WORLD) // size), 0), last)
+    y0 = min(max(int((MERCATOR_HALF_WORLD - bounds[3]) // size), 0), last)
+    y1 = min(max(int((MERCATOR_HALF_WORLD - bounds[1]) // size), 0), last)
+    return x0, x1, y0, y1
+
+
+def _tile_rings(geometry, bounds: tuple, extent: int) -> list:
+    """Rings of a (clipped) polygon geometry in integer tile coordinates (y down)."""
+    minx, miny, maxx, maxy = bounds
+    scale = extent / (maxx - minx)
+    rings = []
+    for polygon in getattr(geometry, "geoms", [geometry]):
+        if polygon.geom_type != "Polygon" or polygon.is_empty:
+            continue
+        # Counter-clockwise exteriors in map space become clockwise once y is flipped
+        polygon = orient(polygon, 1.0)
+        for ring in [polygon.exterior, *polygon.interiors]:
+            coords = np.asarray(ring.coords)
+            tile_xy = np.column_stack([(coords[:, 0] - minx) * scale, (maxy - coords[:, 1]) * scale])
+            rings.append(np.rint(tile_xy).astype(np.int64))
+    return rings
+
+
+def build_level_tiles(level: str, zooms=VECTOR_TILE_ZOOMS, extent: int = VECTOR_TILE_EXTENT) -> dict:
+    """Cut one level's boundaries into vector tiles and write its MBTiles file. Returns a summary."""
+    spec = LEVELS[level]
+    from simplify_geometry import load_boundaries  # geopandas: only needed to build
+    boundaries = load_boundaries(level).to_crs(WEB_MERCATOR)
+    name_prop = spec["geojson_prop"]
+    names = boundaries[name_prop].replace(GEOJSON_NAME_FIXES.get(name_prop, {})).to_numpy(dtype=object)
+    codes = boundaries[spec["code_prop"]].to_numpy(dtype=object)
+    geometries = shapely.make_valid(boundaries.geometry.values)
+
+    os.makedirs(TILES_DIR, exist_ok=True)
+    path = tiles_path(level)
+    tmp_path = f"{path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    db = sqlite3.connect(tmp_path)
+    db.execute("CREATE TABLE metadata (name TEXT, value TEXT)")
+    db.execute("CREATE TABLE tiles (zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_data BLOB)")
+
+    start = time.perf_counter()
+    n_tiles = n_bytes = 0
+    min_zoom, max_zoom = zooms
+    for z in range(min_zoom, max_zoom + 1):
+        tile_size = 2 * MERCATOR_HALF_WORLD / (1 << z)
+        # One tile unit is the finest detail a tile can show at this zoom
+        simplified = shapely.simplify(geometries, tile_size / extent, preserve_topology=True)
+        tree = shapely.STRtree(simplified)
+        x0, x1, y0, y1 = tile_range(shapely.total_bounds(simplified), z)
+        buffer = tile_size * TILE_BUFFER / extent
+
+        rows = []
+        for x in range(x0, x1 + 1):
+            for y in range(y0, y1 + 1):
+                bounds = tile_bounds(z, x, y)
+                clip = (bounds[0] - buffer, bounds[1] - buffer, bounds[2] + buffer, bounds[3] + buffer)
+                hits = tree.query(shapely.box(*clip), predicate="intersects")
+                if hits.size == 0:
+                    continue
+                clipped = shapely.clip_by_rect(simplified[hits], *clip)
+                features = []
+                for i, geometry in zip(hits, clipped):
+                    geometry_commands = encode_polygon_rings(_tile_rings(geometry, bounds, extent))
+                    if geometry_commands:
+                        features.append((int(i) + 1, {"code": codes[i], "name": names[i]}, geometry_commands))
+                if not features:
+                    continue
+                data = gzip.compress(encode_layer(spec["slug"], features, extent))
+                # MBTiles rows are TMS (y up)
+                rows.append((z, x, (1 << z) - 1 - y, data))
+                n_bytes += len(data)
+        db.executemany("INSERT INTO tiles VALUES (?, ?, ?, ?)", rows)
+        n_tiles += len(rows)
+
+    lon_lat = boundaries.to_crs("EPSG:4326").total_bounds
+    metadata = {
+        "name": spec["slug"],
+        "format": "pbf",
+        "minzoom": str(min_zoom),
+        "maxzoom": str(max_zoom),
+        "bounds": ",".join(f"{v:.5f}" for v in lon_lat),
+        "json": json.dumps({"vector_layers": [{"id": spec["slug"], "fields": {"code": "String", "name": "String"},
+                                               "minzoom": min_zoom, "maxzoom": max_zoom}]}),
+    }
+    db.executemany("INSERT INTO metadata VALUES (?, ?)", list(metadata.items()))
+    db.execute("CREATE UNIQUE INDEX tile_index ON tiles (zoom_level, tile_column, tile_row)")
+    db.commit()
+    db.close()
+    os.replace(tmp_path, path)
+    return {"level": level, "path": path, "tiles": n_tiles, "tile_bytes": n_bytes, "zooms": list(zooms),
+            "seconds": round(time.perf_counter() - start, 1)}
+
+
+def read_tile(path: str, z: int, x: int, y: int):
+    """Gzipped MVT bytes of XYZ tile (z, x, y) from an MBTiles file, or None if it has no data."""
+    db = sqlite3.connect(f"file:{path}?mode=ro", uri=True, check_same_thread=False)
+    try:
+        row = db.execute("SELECT tile_data FROM tiles WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?",
+                         (z, x, (1 << z) - 1 - y)).fetchone()
+    finally:
+        db.close()
+    return row[0] if row else None
+
+
+def tiles_available(level: str) -> bool:
+    return os.path.exists(tiles_path(level))
+
+
+if __name__ == "__main__":
+    for level in LEVELS:
+        summary = build_level_tiles(level)
+        print(f"{level:<26} {summary['tiles']:>6} tiles  {summary['tile_bytes'] / 1e6:6.2f} MB  "
+              f"zoom {summary['zooms'][0]}-{summary['zooms'][1]}  ({summary['seconds']} s)")